@@ -1,11 +1,18 @@
 import logging
 import os
-from typing import Optional, List, Tuple, Dict
+import re
+from typing import Any, Optional, List, Tuple, Dict, Callable
 import csv
+import json
+import shutil
+import subprocess
+import tempfile
+import concurrent.futures
+import itertools
 import qt
 import slicer
+import SimpleITK as sitk
 import vtk
-import glob
 from pathlib import Path
 from enum import Enum, auto
 
@@ -17,11 +24,13 @@ from slicer.parameterNodeWrapper import (
 )
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
-# Use segment statistics to compute good default parameters for texture modules.
-import SegmentStatistics
 
 import math  # for ceil
 import VectorToScalarVolume # For extra widget, handling input vector/RGB images.
+from BoneTextureLib import (ResultCache, TextureFeatures, computeIntensityRange, computeTextureFeatures,
+                            maximumNumberOfQuantizedBins, quantizeIntensities, quantizedIntensityParameters,
+                            chooseSlabSize, estimateFeatureMapMemory, estimateFeaturesMemory,
+                            estimateSeparateFeaturesMemory, separatedFeatureFileNames)
 
 from slicer import (
     vtkMRMLScalarVolumeNode, 
@@ -121,9 +130,25 @@ class BoneTextureParameterNode:
     GLRLMFeaturesValue : GLRLMFeaturesParameterNode
     BMFeaturesValue : BMFeaturesParameterNode
     computedTextureFeatureMaps: Dict[str, vtkMRMLDiffusionWeightedVolumeNode] 
+    numberOfWorkers: int = 1
 
 FeatureType = Enum("FeatureType",["GLCM", "GLRLM", "BM"]) 
 
+FeatureNames = {
+    FeatureType.GLCM: ["Energy", "Entropy",
+                       "Correlation", "Inverse Difference Moment",
+                       "Inertia", "Cluster Shade",
+                       "Cluster Prominence", "Haralick Correlation"],
+    FeatureType.GLRLM: ["Short Run Emphasis", "Long Run Emphasis",
+                        "Grey Level Nonuniformity", "Run Length Non-uniformity",
+                        "Low Grey Level Run Emphasis", "High Grey Level Run Emphasis",
+                        "Short Run Low Grey Level Emphasis", "Short Run High Grey Level Emphasis",
+                        "Long Run Low Grey Level Emphasis", "Long Run High Grey Level Emphasis"],
+    FeatureType.BM: ["Bone volume density", "Trabecular thickness",
+                     "Trabecular separation", "Trabecular number",
+                     "Bone surface density"],
+}
+
 #
 # BoneTextureWidget
 #
@@ -152,18 +177,9 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.use_image_mask = False
         self.output_csv = None
 
-        self.CFeatures = ["Energy", "Entropy",
-                          "Correlation", "Inverse Difference Moment",
-                          "Inertia", "Cluster Shade",
-                          "Cluster Prominence", "Haralick Correlation"]
-        self.RLFeatures = ["Short Run Emphasis", "Long Run Emphasis",
-                           "Grey Level Nonuniformity", "Run Length Non-uniformity",
-                           "Low Grey Level Run Emphasis", "High Grey Level Run Emphasis",
-                           "Short Run Low Grey Level Emphasis", "Short Run High Grey Level Emphasis",
-                           "Long Run Low Grey Level Emphasis", "Long Run High Grey Level Emphasis"]
-        self.BMFeatures = ["Bone volume density", "Trabecular thickness", 
-                        "Trabecular separation", "Trabecular number",
-                        "Bone surface density"]
+        self.CFeatures = FeatureNames[FeatureType.GLCM]
+        self.RLFeatures = FeatureNames[FeatureType.GLRLM]
+        self.BMFeatures = FeatureNames[FeatureType.BM]
 
     def setup(self) -> None:
         """Called when the user opens the module the first time and the widget is initialized."""
@@ -545,42 +561,29 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         if not inputDir:
             slicer.util.errorDisplay("Please specify an input directory")
             return
-        input_scans = glob.glob(inputDir + '/Scan_*.*')
-        if not input_scans:
+        input_data = self.logic.findSerializerInputs(inputDir)
+        if not input_data:
             slicer.util.errorDisplay("No cases were found in the selected input directory %s. "
                                         "Please check the required file naming convetion." % inputDir)
         
         display_message = ""
-        display_message += f"{len(input_scans)} input scan(s) were found. "
-        input_data = []
-        mask_count = 0
-        for file in input_scans:
-            filename = Path(file).stem
-            case_id = filename.split('Scan_')[1]
-            
-            #find seg file
-            seg_file = glob.glob(inputDir + f'/Seg_{case_id}.*')
-            if not seg_file:
-                input_data.append((file, None))
-            else:
-                input_data.append((file, seg_file[0]))
-                mask_count += 1
-        
-            inputScan = slicer.util.loadNodeFromFile(file,
-                        'VolumeFile',
-                        {'labelmap': False, 'show': False})
-
-            if inputScan.IsTypeOf('vtkMRMLVectorVolumeNode'):
+        display_message += f"{len(input_data)} input scan(s) were found. "
+        mask_count = sum(1 for _, seg_file in input_data if seg_file)
+        for file, _ in input_data:
+            # Only the header is read, the information is kept by the logic for the computation
+            try:
+                scanInformation = self.logic.readImageInformation(file)
+            except RuntimeError as error:
+                logging.warning("Could not read the header of %s: %s" % (file, error))
+                continue
+
+            if scanInformation['numberOfComponents'] > 1:
                 # Check for vector to scalar conversion
                 if not self.ui.SerializerConvertToScalarCheckBox.isChecked():
                     slicer.util.warningDisplay("Detected an input scan that has a vector pixel type. Please enable the vector to scalar conversion option and select a method to transform the image to a scalar type first.")
-                    slicer.mrmlScene.RemoveNode(inputScan)
                     return
-            
-            # Remove the scan
-            slicer.mrmlScene.RemoveNode(inputScan)
 
-        display_message += f"Corresponding segmentation masks were found for {mask_count}/{len(input_scans)} scans."
+        display_message += f"Corresponding segmentation masks were found for {mask_count}/{len(input_data)} scans."
 
         self.serializer_input_data = input_data
         self.ui.inputsDisplayMessage.setText(display_message)
@@ -596,12 +599,8 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             if not isValid:
                 return
 
-        if self.use_image_mask:
-            minIntensityValue, maxIntensityValue = self.logic.computeLabelStatistics(inputScan, inputSegmentation)
-        else:
-            imageArray = slicer.util.arrayFromVolume(inputScan)
-            minIntensityValue = imageArray.min()
-            maxIntensityValue = imageArray.max()
+        minIntensityValue, maxIntensityValue = self.logic.computeLabelStatistics(
+            inputScan, inputSegmentation if self.use_image_mask else None)
 
         # Set the default number of bins to 32. 
         numBins = 32 
@@ -631,19 +630,7 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         else:
             componentToExtract = 0
 
-        outputVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", slicer.mrmlScene.GetUniqueNameByString(f"ConvertScan"))
-        
-        # run Conversion
-        self.logic.convertInputVectorToScalarVolume(
-            inputScan,
-            outputVolumeNode,
-            conversionMethod,
-            componentToExtract)
-    
-        # Remove original node
-        slicer.mrmlScene.RemoveNode(inputScan)
-
-        return outputVolumeNode
+        return self.logic.convertVectorScanToScalar(inputScan, conversionMethod, componentToExtract)
 
     def onComputeFeatures(self):
 
@@ -727,121 +714,45 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
         output_csv = os.path.join(self.ui.OutputFolderDirectoryPathLineEdit.currentPath,output_csv_filename)
 
-        stepsPerCase = sum((
-            self.ui.GLCMFeaturesCheckBox.isChecked(),
-            self.ui.GLRLMFeaturesCheckBox.isChecked(),
-            self.ui.BMFeaturesCheckBox.isChecked(),
-        ))
+        featureParameters = {}
+        if self.ui.GLCMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.GLCM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLCMFeaturesValue)
+        if self.ui.GLRLMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.GLRLM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLRLMFeaturesValue)
+        if self.ui.BMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.BM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().BMFeaturesValue)
 
         self.ui.ComputeFeaturesProgressBar.value = 0
         self.ui.ComputeFeaturesProgressBar.minimum = 0 
-        self.ui.ComputeFeaturesProgressBar.maximum = len(inputData) * stepsPerCase
+        self.ui.ComputeFeaturesProgressBar.maximum = len(inputData) * len(featureParameters)
         self.ui.ComputeFeaturesProgressBar.visible = True
 
-        with open(output_csv, "w+") as file:
-            cw = csv.writer(file, delimiter=',')
-
-            # Write header information
-            toWrite = ["Case ID"]
-            if self.ui.GLCMFeaturesCheckBox.isChecked():
-                toWrite += self.CFeatures
-            if self.ui.GLRLMFeaturesCheckBox.isChecked():
-                toWrite += self.RLFeatures
-            if self.ui.BMFeaturesCheckBox.isChecked():
-                toWrite += self.BMFeatures
-            cw.writerow(toWrite)
-
-            for input in inputData:
-
-                inputScan, inputLabelMap = input
-                case_id = self.getCaseID(inputScan)
-
-                # Load in the input files
-                inputScan = slicer.util.loadNodeFromFile(inputScan,
-                    'VolumeFile',
-                    {'labelmap': False, 'show': False}
-                )
-                if inputLabelMap:
-                    inputLabelMap = slicer.util.loadNodeFromFile(inputLabelMap,
-                        'VolumeFile',
-                        {'labelmap': True, 'show': False}
-                    )
-
-                #If the scan is a vector image, convert to scalar
-                if inputScan.IsTypeOf('vtkMRMLVectorVolumeNode'):
-                    if not self.ui.SerializerConvertToScalarCheckBox.isChecked():
-                        slicer.util.warningDisplay("Detected an input scan that has a vector pixel type. Skipping texture map computation.")
-                        continue
-                    else:
-                        inputScan = self.SerializerModeVectorToScalarConversion(inputScan)
-
-                isValid = self.logic.inputDataVerification(inputScan, inputLabelMap)
-                if not isValid:
-                    self.ui.ComputeFeaturesProgressBar.visible = False
-                    return
-
-                # This will run async, and populate self.computedFeatures
-                if self.ui.GLCMFeaturesCheckBox.isChecked():
-                    parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLCMFeaturesValue)
-                    GLCMFeaturesNode = self.logic.computeSingleFeature(
-                        inputScan,
-                        parameters,
-                        FeatureType.GLCM,
-                        inputLabelMap,
-                        wait_for_completion= True
-                        )
-                    self.ui.ComputeFeaturesProgressBar.value += 1
-                    GLCMfeatures = [float(value) if value.replace('.','',1).isnumeric() else 'NaN' for value in GLCMFeaturesNode.GetParameterValue(2, 0).split(",")]                       
-
-                if self.ui.GLRLMFeaturesCheckBox.isChecked():
-                    parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLRLMFeaturesValue)
-                    GLRLMFeaturesNode = self.logic.computeSingleFeature(
-                        inputScan,
-                        parameters,
-                        FeatureType.GLRLM,
-                        inputLabelMap,
-                        wait_for_completion=True
-                        )
-                    self.GLRLMnode = GLRLMFeaturesNode
-                    self.ui.ComputeFeaturesProgressBar.value += 1
-                    GLRLMfeatures = [float(value) if value.replace('.','',1).isnumeric() else 'NaN' for value in GLRLMFeaturesNode.GetParameterValue(2, 0).split(",")]   
-      
-                if self.ui.BMFeaturesCheckBox.isChecked():
-                    parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().BMFeaturesValue)
-                    BMFeaturesNode = self.logic.computeSingleFeature(
-                        inputScan,
-                        parameters,
-                        FeatureType.GLRLM,
-                        inputLabelMap,
-                        wait_for_completion=True
-                        )
-                    self.ui.ComputeFeaturesProgressBar.value += 1
-                    BMfeatures = [float(value) if value.replace('.','',1).isnumeric() else 'NaN' for value in BMFeaturesNode.GetParameterValue(2, 0).split(",")]    
-
-                slicer.mrmlScene.RemoveNode(inputScan)
-                slicer.mrmlScene.RemoveNode(inputLabelMap)
-
-                toWrite = [case_id]
-                if self.ui.GLCMFeaturesCheckBox.isChecked():
-                    toWrite += GLCMfeatures
-                if self.ui.GLRLMFeaturesCheckBox.isChecked():
-                    toWrite += GLRLMfeatures
-                if self.ui.BMFeaturesCheckBox.isChecked():
-                    toWrite += BMfeatures
-                cw.writerow(toWrite)
-
-                file.flush()  
-            
-    def onCLINodeCompletedSerializerMode(self, cliMapNode):
-
-        # Update progress bar
-        self.ui.ComputeTextureMapsProgressBar.value += 1
-        outputDifussionWeightedVolumeNode = slicer.mrmlScene.GetNodeByID(cliMapNode.GetParameterValue(0,1))
-        outputDir = self.ui.OutputFolderDirectoryPathLineEdit.currentPath
-        self.exportVolumeToFile(outputDifussionWeightedVolumeNode, outputDir)
-        
-        # clear nodes from slicer
-        slicer.mrmlScene.RemoveNode(outputDifussionWeightedVolumeNode)
+        if self.ui.SerializerConvertToScalarCheckBox.isChecked():
+            convertVectorScan = self.SerializerModeVectorToScalarConversion
+        else:
+            convertVectorScan = None
+
+        def onCaseCompleted():
+            self.ui.ComputeFeaturesProgressBar.value += len(featureParameters)
+
+        self.logic.computeFeaturesSerializerMode(
+            inputData,
+            featureParameters,
+            output_csv,
+            numberOfWorkers=self._parameterNode.numberOfWorkers,
+            convertVectorScan=convertVectorScan,
+            caseCompletedCallback=onCaseCompleted,
+            cacheDirectory=self.logic.getResultCacheDirectory(self.ui.OutputFolderDirectoryPathLineEdit.currentPath),
+            conversionParameters=self.getSerializerConversionParameters())
+
+    def getSerializerConversionParameters(self) -> Optional[dict]:
+        """ Settings of the vector to scalar conversion of the serializer mode, used in the result cache keys."""
+        if not self.ui.SerializerConvertToScalarCheckBox.isChecked():
+            return None
+        return {
+            'conversionMethod': self.ui.vectorToScalarVolumeMethodSelectorComboBox.currentData.name,
+            'componentToExtract': self.ui.SingleComponentSpinBox.value,
+        }
 
     def onColorMapNodeModified(self, cliMapNode, event):
         if not cliMapNode.IsBusy():
@@ -863,18 +774,8 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self.DisplayFeatures()
             self.ui.ComputeFeaturesProgressBar.value += 1
 
-    def exportVolumeToFile(self, volumeNode: vtkMRMLDiffusionWeightedVolumeNode, outputDir: str):
-        if self.ui.separateFeaturesCheckBox.isChecked():
-            parameters = dict()
-            parameters["inputVolume"] = volumeNode
-            parameters["outputFileBaseName"] = os.path.join(outputDir,volumeNode.GetName())
-            slicer.cli.run(slicer.modules.separatevectorimage,
-                        None,
-                        parameters,
-                        wait_for_completion=True)
-        else:
-            output_filename = os.path.join(outputDir, volumeNode.GetName() + ".nrrd")
-            slicer.util.saveNode(volumeNode, output_filename)
+    def exportVolumeToFile(self, volumeNode: vtkMRMLDiffusionWeightedVolumeNode, outputDir: str) -> List[str]:
+        return self.logic.exportTextureMap(volumeNode, outputDir, self.ui.separateFeaturesCheckBox.isChecked())
 
     def DisplayFeatures(self):
         if self.computedFeatures[FeatureType.GLCM.name] is not None:
@@ -890,9 +791,7 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 self.ui.displayFeaturesTableWidget.item(i, 5).setText(self.computedFeatures[FeatureType.BM.name][i])
 
     def getCaseID(self, file):
-        filename = Path(file).stem
-        case_id = filename.split('Scan_')[1]
-        return case_id
+        return self.logic.getCaseID(file)
 
     def onComputeTextureMaps(self):
 
@@ -910,14 +809,24 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         else:
             self.ComputeTextureMapsSingleMode(inputData)
         
+    def getSelectedTextureMapParameters(self) -> Dict[FeatureType, dict]:
+        """ Returns the CLI parameters of the feature families selected for texture map computation """
+        featureParameters = {}
+        if self.ui.GLCMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.GLCM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLCMFeaturesValue)
+        if self.ui.GLRLMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.GLRLM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLRLMFeaturesValue)
+        if self.ui.BMFeaturesCheckBox.isChecked():
+            featureParameters[FeatureType.BM] = self.logic.convertParameterPackToDict(self.logic.getParameterNode().BMFeaturesValue)
+        return featureParameters
+
     def ComputeTextureMapsSingleMode(self, inputData):
-        
+
+        featureParameters = self.getSelectedTextureMapParameters()
+        computeCombinedMap = self.logic.canCombineTextureMaps(featureParameters)
+
         # Setup proress bar
-        numSteps = sum((
-            self.ui.GLCMFeaturesCheckBox.isChecked(),
-            self.ui.GLRLMFeaturesCheckBox.isChecked(),
-            self.ui.BMFeaturesCheckBox.isChecked(),
-        ))
+        numSteps = 1 if computeCombinedMap else len(featureParameters)
         self.ui.ComputeTextureMapsProgressBar.value = 0
         self.ui.ComputeTextureMapsProgressBar.minimum = 0 
         self.ui.ComputeTextureMapsProgressBar.maximum = numSteps
@@ -931,32 +840,21 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self.ui.ComputeTextureMapsProgressBar.visible = False
             return
 
-        if self.ui.GLCMFeaturesCheckBox.isChecked():
-            parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLCMFeaturesValue)
-            GLCMMapNode = self.logic.computeSingleTextureMap(
+        if computeCombinedMap:
+            # All the selected feature maps are computed by a single CLI sharing the input reading
+            combinedMapNode = self.logic.computeCombinedTextureMap(
                 inputScan,
-                parameters,
-                FeatureType.GLCM,
+                featureParameters,
                 inputLabelMap)
-            self.addObserver(GLCMMapNode, slicer.vtkMRMLCommandLineModuleNode().StatusModifiedEvent, self.onColorMapNodeModified)
-
-        if self.ui.GLRLMFeaturesCheckBox.isChecked():
-            parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLRLMFeaturesValue)
-            GLRLMMapNode = self.logic.computeSingleTextureMap(
-                inputScan,
-                parameters,
-                FeatureType.GLRLM,
-                inputLabelMap)
-            self.addObserver(GLRLMMapNode, slicer.vtkMRMLCommandLineModuleNode().StatusModifiedEvent, self.onColorMapNodeModified)
-
-        if self.ui.BMFeaturesCheckBox.isChecked():
-            parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().BMFeaturesValue)
-            BMMapNode = self.logic.computeSingleTextureMap(
-                inputScan,
-                parameters,
-                FeatureType.BM,
-                inputLabelMap)
-            self.addObserver(BMMapNode, slicer.vtkMRMLCommandLineModuleNode().StatusModifiedEvent, self.onColorMapNodeModified)
+            self.addObserver(combinedMapNode, slicer.vtkMRMLCommandLineModuleNode().StatusModifiedEvent, self.onColorMapNodeModified)
+        else:
+            for feature_type, parameters in featureParameters.items():
+                mapNode = self.logic.computeSingleTextureMap(
+                    inputScan,
+                    parameters,
+                    feature_type,
+                    inputLabelMap)
+                self.addObserver(mapNode, slicer.vtkMRMLCommandLineModuleNode().StatusModifiedEvent, self.onColorMapNodeModified)
 
         self.ui.ResultsCollapsibleButton.collapsed = False
         self.ui.DisplayColormapsCollapsibleGroupBox.collapsed = False
@@ -966,95 +864,30 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         if not self.ui.OutputFolderDirectoryPathLineEdit.currentPath:
             slicer.util.errorDisplay("Please specify an output directory for saving results")
             return
-        
-        stepsPerCase = sum((
-            self.ui.GLCMFeaturesCheckBox.isChecked(),
-            self.ui.GLRLMFeaturesCheckBox.isChecked(),
-            self.ui.BMFeaturesCheckBox.isChecked(),
-        ))
+        outputDir = self.ui.OutputFolderDirectoryPathLineEdit.currentPath
 
         self.ui.ComputeTextureMapsProgressBar.value = 0
         self.ui.ComputeTextureMapsProgressBar.minimum = 0 
-        self.ui.ComputeTextureMapsProgressBar.maximum = len(inputData) * stepsPerCase
+        self.ui.ComputeTextureMapsProgressBar.maximum = len(inputData)
         self.ui.ComputeTextureMapsProgressBar.visible = True
 
-        for input in inputData:
-
-            inputScan, inputLabelMap = input
-
-            # Load in the input files
-            inputScan = slicer.util.loadNodeFromFile(inputScan,
-                'VolumeFile',
-                {'labelmap': False, 'show': False},
-            )
-            
-            if inputLabelMap:
-                inputLabelMap = slicer.util.loadNodeFromFile(inputLabelMap,
-                    'VolumeFile',
-                    {'labelmap': True, 'show': False},
-                )
-
-            #If the scan is a vector image, convert to scalar
-            if inputScan.IsTypeOf('vtkMRMLVectorVolumeNode'):
-                if not self.ui.SerializerConvertToScalarCheckBox.isChecked():
-                    slicer.util.warningDisplay("Detected an input scan that has a vector pixel type. Skipping texture map computation.")
-                    continue
-                else:
-                    inputScan = self.SerializerModeVectorToScalarConversion(inputScan)
-                    
-            isValid = self.logic.inputDataVerification(inputScan, inputLabelMap)
-            if not isValid:
-                self.ui.ComputeTextureMapsProgressBar.visible = False
-                return
-
-            # Compute the min and max intensity for the image
-            if inputLabelMap:
-                minIntensityValue, maxIntensityValue = self.logic.computeLabelStatistics(
-                    inputScan=inputScan,
-                    inputLabelMap=inputLabelMap)
-            else:
-                imageArray = slicer.util.arrayFromVolume(inputScan)
-                minIntensityValue = imageArray.min()
-                maxIntensityValue = imageArray.max()
-
-            if self.ui.GLCMFeaturesCheckBox.isChecked():
-                parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLCMFeaturesValue)
-                parameters['pixelIntensityMin'] = minIntensityValue
-                parameters['pixelIntensityMax'] = maxIntensityValue
-                GLCMMapNode = self.logic.computeSingleTextureMap(
-                    inputScan,
-                    parameters,
-                    FeatureType.GLCM,
-                    inputLabelMap, wait_for_completion=True
-                    )
-                self.onCLINodeCompletedSerializerMode(GLCMMapNode)
-    
-            if self.ui.GLRLMFeaturesCheckBox.isChecked():
-                parameters['pixelIntensityMin'] = minIntensityValue
-                parameters['pixelIntensityMax'] = maxIntensityValue
-                parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().GLRLMFeaturesValue)
-                GLRLMMapNode = self.logic.computeSingleTextureMap(
-                    inputScan,
-                    parameters,
-                    FeatureType.GLRLM,
-                    inputLabelMap, wait_for_completion=True
-                    )
-                self.onCLINodeCompletedSerializerMode(GLRLMMapNode)
-            
-            if self.ui.BMFeaturesCheckBox.isChecked():
-                parameters = self.logic.convertParameterPackToDict(self.logic.getParameterNode().BMFeaturesValue)
-                BMMapNode = self.logic.computeSingleTextureMap(
-                    inputScan,
-                    parameters,
-                    FeatureType.BM,
-                    inputLabelMap, wait_for_completion=True
-                    )                            
-                self.onCLINodeCompletedSerializerMode(BMMapNode)
-               
-            # Remove input data from scene
-            slicer.mrmlScene.RemoveNode(inputScan) # inputScan
-            if inputLabelMap:
-                slicer.mrmlScene.RemoveNode(inputLabelMap) #inputLabelMap
+        if self.ui.SerializerConvertToScalarCheckBox.isChecked():
+            convertVectorScan = self.SerializerModeVectorToScalarConversion
+        else:
+            convertVectorScan = None
+
+        def onCaseCompleted():
+            self.ui.ComputeTextureMapsProgressBar.value += 1
+
+        self.logic.computeTextureMapsSerializerMode(
+            inputData,
+            self.getSelectedTextureMapParameters(),
+            outputDir,
+            separateFeatures=self.ui.separateFeaturesCheckBox.isChecked(),
+            convertVectorScan=convertVectorScan,
+            caseCompletedCallback=onCaseCompleted,
+            cacheDirectory=self.logic.getResultCacheDirectory(outputDir),
+            conversionParameters=self.getSerializerConversionParameters())
     
 
         # ----------------- Results Collapsible Button ----------------------- #
@@ -1067,12 +900,10 @@ class BoneTextureWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             return
 
         # Set the selected feature names in the featureCombobox
-        if currentFeatureMapNode.GetDisplayNode().GetInputImageData().GetNumberOfScalarComponents() == 8:
-            self.ui.featureComboBox.addItems(self.CFeatures)
-        elif currentFeatureMapNode.GetDisplayNode().GetInputImageData().GetNumberOfScalarComponents() == 10:
-            self.ui.featureComboBox.addItems(self.RLFeatures)
-        elif currentFeatureMapNode.GetDisplayNode().GetInputImageData().GetNumberOfScalarComponents() == 5:
-            self.ui.featureComboBox.addItems(self.BMFeatures)
+        featureNames = self.logic.getFeatureMapNames(
+            currentFeatureMapNode.GetDisplayNode().GetInputImageData().GetNumberOfScalarComponents())
+        if featureNames:
+            self.ui.featureComboBox.addItems(featureNames)
 
         # Set the feature Set displayed in Slicer to the selected module
         slicer.util.setSliceViewerLayers(background = currentFeatureMapNode.GetID())
@@ -1128,6 +959,9 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
     def __init__(self) -> None:
         """Called when the logic class is instantiated. Can be used for initializing member variables."""
         ScriptedLoadableModuleLogic.__init__(self)
+        # Float copies of the double scans given to the CLIs, with the modified time of the scan
+        # they were made at, by scan node ID (see prepareInputScan)
+        self.preparedScans = {}
 
     def getParameterNode(self):
         return BoneTextureParameterNode(super().getParameterNode())
@@ -1138,36 +972,24 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
                 return False
         return True
 
-    def computeLabelStatistics(self, inputScan, inputLabelMap):
-        """ Use slicer core module to get the min/max intensity value inside the mask.
+    def computeLabelStatistics(self, inputScan, inputLabelMap = None, lowerPercentile = 0.0, upperPercentile = 100.0):
+        """ Get the min/max intensity value inside the mask, from the scan and mask arrays.
+        The first label of the mask (its smallest non-zero value) is used, and the whole scan
+        when there is no mask. Robust bounds are returned for percentiles other than 0 and 100.
         Returns tuple (min, max) with intensity values inside the mask. """
-        # Export lapel map node into a segmentation node
-        segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
-        slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(inputLabelMap, segmentationNode)
-
-        # Compute statistics (may take time)
-        segStatLogic = SegmentStatistics.SegmentStatisticsLogic()
-        segStatLogic.getParameterNode().SetParameter("Segmentation", segmentationNode.GetID())
-        segStatLogic.getParameterNode().SetParameter("ScalarVolume", inputScan.GetID())
-
-        # Disable all plugins
-        for plugin in segStatLogic.plugins:
-          pluginName = plugin.__class__.__name__
-          segStatLogic.getParameterNode().SetParameter(f"{pluginName}.enabled", str(False))
-
-        # Explicitly enable ScalarVolumeSegmentStatistics
-        segStatLogic.getParameterNode().SetParameter("ScalarVolumeSegmentStatisticsPlugin.enabled", str(True))
-        segStatLogic.computeStatistics()
-        stats = segStatLogic.getStatistics()
-
-        # Remove temporary segmentation node
-        slicer.mrmlScene.RemoveNode(segmentationNode)
+        imageArray = slicer.util.arrayFromVolume(inputScan)
+        maskArray = slicer.util.arrayFromVolume(inputLabelMap) if inputLabelMap is not None else None
+        return self.computeArrayStatistics(imageArray, maskArray, lowerPercentile, upperPercentile)
 
-        segmentId = stats["SegmentIDs"][0]
-        minIntensityValue = stats[segmentId, "ScalarVolumeSegmentStatisticsPlugin.min"]
-        maxIntensityValue = stats[segmentId, "ScalarVolumeSegmentStatisticsPlugin.max"]
+    def computeArrayStatistics(self, imageArray, maskArray = None, lowerPercentile = 0.0, upperPercentile = 100.0):
+        """ Same as computeLabelStatistics, from the arrays of the scan and mask.
+        This does not access the scene, so it can be called from worker threads. """
+        if maskArray is None:
+            return computeIntensityRange(imageArray, lowerPercentile=lowerPercentile, upperPercentile=upperPercentile)
 
-        return minIntensityValue, maxIntensityValue
+        firstLabel, _ = computeIntensityRange(maskArray, maskArray)
+        return computeIntensityRange(imageArray, maskArray, int(firstLabel),
+                                     lowerPercentile=lowerPercentile, upperPercentile=upperPercentile)
 
     # ************************************************************************ #
     # ------------------------ Algorithm ------------------------------------- #
@@ -1216,21 +1038,68 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
 
         return feature_dict
     
-    def castVolumeToFloat(self, volume: vtkMRMLScalarVolumeNode):
+    def allowInMemoryTransfer(self, cliModule) -> None:
+        """
+        Let Slicer pass the volumes of a CLI through memory instead of temporary NRRD files.
+        Slicer does so when it runs the CLI in-process, as a shared object module (the default for
+        the BoneTexture CLIs, unless the executable CLIs are preferred in the application settings).
+        """
+        cliModule.logic().SetAllowInMemoryTransfer(True)
 
-        parameters = {}
-        CastScalarVolume_CLI = slicer.modules.castscalarvolume
-        parameters["InputVolume"] = volume
-        parameters["OutputVolume"] = volume
-        parameters["Type"] = 'Float'
-        run_cast_node = slicer.cli.createNode(CastScalarVolume_CLI)
-        run_cast_node.SetName('cast-runnode')
-        run_cast_node = slicer.cli.run(CastScalarVolume_CLI,
-                    node = run_cast_node,
-                    parameters = parameters,
-                    wait_for_completion=True)
-        
-        return volume
+    def castVolumeToFloat(self, volume: vtkMRMLScalarVolumeNode,
+                          outputVolume: Optional[vtkMRMLScalarVolumeNode] = None) -> vtkMRMLScalarVolumeNode:
+        """
+        Cast the image data of the volume to float in memory, into outputVolume or in place when
+        it is not given. Returns the cast volume.
+        """
+        if outputVolume is None:
+            outputVolume = volume
+        cast = vtk.vtkImageCast()
+        cast.SetInputData(volume.GetImageData())
+        cast.SetOutputScalarTypeToFloat()
+        cast.Update()
+        if outputVolume is not volume:
+            outputVolume.CopyOrientation(volume)
+        outputVolume.SetAndObserveImageData(cast.GetOutput())
+        return outputVolume
+
+    def prepareInputScan(self, inputScan: vtkMRMLScalarVolumeNode) -> vtkMRMLScalarVolumeNode:
+        """
+        Returns the volume to give to the CLIs for the scan: the scan itself, or a float copy of it
+        when it is stored as double, which the ITK texture filters do not process.
+        The copy is kept in a hidden node, reused by the feature families and the later runs until
+        the scan node or its image data are modified (see releasePreparedScan).
+        """
+        imageData = inputScan.GetImageData()
+        if imageData is None or imageData.GetScalarType() != vtk.VTK_DOUBLE:
+            return inputScan
+
+        # Forget the copies of the scans removed from the scene
+        for scanID in list(self.preparedScans):
+            if slicer.mrmlScene.GetNodeByID(scanID) is None:
+                slicer.mrmlScene.RemoveNode(self.preparedScans.pop(scanID)[0])
+
+        modifiedTime = max(inputScan.GetMTime(), imageData.GetMTime())
+        preparedScan, preparedTime = self.preparedScans.get(inputScan.GetID(), (None, None))
+        if preparedScan is not None and not slicer.mrmlScene.IsNodePresent(preparedScan):
+            preparedScan = None
+        if preparedScan is not None and preparedTime == modifiedTime:
+            return preparedScan
+        if preparedScan is None:
+            preparedScan = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode',
+                                                              slicer.mrmlScene.GenerateUniqueName(inputScan.GetName() + '_float'))
+            preparedScan.SetHideFromEditors(True)
+            preparedScan.SetSaveWithScene(False)
+        logging.info('Casting %s to Float data type ...' % inputScan.GetName())
+        self.castVolumeToFloat(inputScan, preparedScan)
+        self.preparedScans[inputScan.GetID()] = (preparedScan, modifiedTime)
+        return preparedScan
+
+    def releasePreparedScan(self, inputScan: vtkMRMLScalarVolumeNode) -> None:
+        """ Remove the float copy of the scan made by prepareInputScan, if any. """
+        preparedScan, _ = self.preparedScans.pop(inputScan.GetID(), (None, None))
+        if preparedScan is not None and slicer.mrmlScene.IsNodePresent(preparedScan):
+            slicer.mrmlScene.RemoveNode(preparedScan)
 
     def computeSingleFeature(self,
                              inputScan: vtkMRMLScalarVolumeNode,
@@ -1257,21 +1126,80 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
         else:
             raise ValueError("Invalid 'feature_type' option. Use 'GLCM', 'GLRM' or 'BM'")
         
-        # Cast the inputScan to float if double type. ITK texture features does
-        # not work on double scalar volumes
-        if slicer.util.arrayFromVolume(inputScan).dtype == 'double':
-            logging.info('Casting %s to Float data type ...' % inputScan.GetName())
-            inputScan = self.castVolumeToFloat(inputScan)
+        # ITK texture features does not work on double scalar volumes
+        inputScan = self.prepareInputScan(inputScan)
         
         logging.info('Computing %s Features ...' % feature_type)
         parameters["inputVolume"] = inputScan
         if inputLabelMap:
             parameters["inputMask"] = inputLabelMap
+        self.allowInMemoryTransfer(CLIname)
         run_node = slicer.cli.createNode(CLIname, parameters)
         run_node.SetName(feature_type.name)
         run_node = slicer.cli.run(CLIname, node=run_node, parameters=parameters, wait_for_completion=wait_for_completion)
         return run_node
         
+    def computeFeaturesInProcess(self,
+                                 inputScan: vtkMRMLScalarVolumeNode,
+                                 featureParameters: Dict[FeatureType, dict],
+                                 inputLabelMap: Optional[vtkMRMLLabelMapVolumeNode] = None) -> TextureFeatures:
+        """
+        Computes the scalar features of the given families in the Slicer process, from the
+        voxel arrays of the nodes, without writing temporary volumes or running the CLIs.
+        Args:
+            inputScan: Input Scan
+            featureParameters: dictionary of the CLI parameters of each feature family to compute
+            inputLabelMap: Optional label map specifying an image mask
+        Returns: TextureFeatures holding the values of the computed families
+        """
+        inputArray = slicer.util.arrayFromVolume(inputScan)
+        maskArray = slicer.util.arrayFromVolume(inputLabelMap) if inputLabelMap else None
+        return computeTextureFeatures(
+            inputArray,
+            maskArray,
+            inputScan.GetSpacing(),
+            GLCMParameters=featureParameters.get(FeatureType.GLCM),
+            GLRLMParameters=featureParameters.get(FeatureType.GLRLM),
+            BMParameters=featureParameters.get(FeatureType.BM))
+
+    def computeLabelFeatures(self,
+                             inputScan: vtkMRMLScalarVolumeNode,
+                             inputLabelMap: vtkMRMLLabelMapVolumeNode,
+                             parameters: dict,
+                             feature_type: FeatureType,
+                             labels: Optional[List[int]] = None) -> Dict[int, List]:
+        """
+        Computes the features of several labels of a label map with a single CLI execution.
+        Args:
+            inputScan: Input Scan
+            inputLabelMap: label map holding the regions of interest
+            paramaters: dictionary containing the input parameters required for the cli
+            feature_type: option from Feature Type Enum: GLCM, GM or GLRM
+            labels: labels to compute the features of, every label of the label map if None
+        Returns: dictionary of the feature values of each label
+        """
+        with tempfile.TemporaryDirectory(dir=slicer.app.temporaryPath) as temporaryDir:
+            outputTable = os.path.join(temporaryDir, 'LabelFeatures.csv')
+            parameters = dict(parameters)
+            if labels:
+                parameters['labels'] = ','.join(str(label) for label in labels)
+            else:
+                parameters['allLabels'] = True
+            parameters['outputTable'] = outputTable
+            run_node = self.computeSingleFeature(inputScan, parameters, feature_type, inputLabelMap, wait_for_completion=True)
+            status = run_node.GetStatusString()
+            errorText = run_node.GetErrorText()
+            slicer.mrmlScene.RemoveNode(run_node)
+            if status != 'Completed':
+                raise RuntimeError("%s features computation failed: %s" % (feature_type.name, errorText))
+
+            labelFeatures = {}
+            with open(outputTable, newline='') as tableFile:
+                for row in csv.DictReader(tableFile):
+                    label = int(float(row.pop('Label')))
+                    labelFeatures[label] = [float(value) for value in row.values()]
+        return labelFeatures
+
     # --------------- Computation of the wanted colormaps --------------------- #
     def computeSingleTextureMap(self,
                               inputScan: vtkMRMLScalarVolumeNode, 
@@ -1298,11 +1226,9 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
         else:
             raise ValueError("Invalid 'feature_type' option. Use 'GLCM', 'GLRM' or 'BM'")
         
-        # Cast the inputScan to float if double type. ITK texture features does
-        # not work on double scalar volumes
-        if slicer.util.arrayFromVolume(inputScan).dtype == 'double':
-            logging.info('Casting %s to Float data type ...' % inputScan.GetName())
-            inputScan = self.castVolumeToFloat(inputScan)
+        # ITK texture features does not work on double scalar volumes
+        scanName = inputScan.GetName()
+        inputScan = self.prepareInputScan(inputScan)
         
         parameters["inputVolume"] = inputScan
         if inputLabelMap:
@@ -1314,8 +1240,9 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
         colorNode = slicer.util.getNode('Rainbow')
         displayNode.SetAndObserveColorNodeID(colorNode.GetID())
         volumeNode.SetAndObserveDisplayNodeID(displayNode.GetID())
-        volumeNode.SetName(slicer.mrmlScene.GenerateUniqueName(f"{feature_type.name}_{inputScan.GetName()}"))
+        volumeNode.SetName(slicer.mrmlScene.GenerateUniqueName(f"{feature_type.name}_{scanName}"))
         parameters["outputVolume"] = volumeNode
+        self.allowInMemoryTransfer(CLIname)
         run_node = slicer.cli.createNode(CLIname)
         run_node.SetName(feature_type.name)
         run_node = slicer.cli.run(CLIname,
@@ -1324,6 +1251,1176 @@ class BoneTextureLogic(ScriptedLoadableModuleLogic):
                        wait_for_completion=wait_for_completion)
         return run_node
 
+    def getFeatureMapNames(self, numberOfComponents: int) -> Optional[List[str]]:
+        """
+        Returns the names of the components of a feature map, identified by its number of components.
+        Combined feature maps store the GLCM, GLRLM and BM components in that order.
+        """
+        for numberOfFamilies in range(1, len(FeatureType) + 1):
+            for feature_types in itertools.combinations(FeatureType, numberOfFamilies):
+                if sum(len(FeatureNames[feature_type]) for feature_type in feature_types) == numberOfComponents:
+                    return [name for feature_type in feature_types for name in FeatureNames[feature_type]]
+        return None
+
+    def canCombineTextureMaps(self, featureParameters: Dict[FeatureType, dict]) -> bool:
+        """
+        Returns True when the selected feature maps can be computed by the combined CLI, i.e.
+        when several families are selected with the same neighborhood radius, and GLCM and GLRLM
+        share the same intensity binning.
+        """
+        if len(featureParameters) < 2:
+            return False
+        if len(set(parameters['neighborhoodRadius'] for parameters in featureParameters.values())) > 1:
+            return False
+        if FeatureType.GLCM in featureParameters and FeatureType.GLRLM in featureParameters:
+            for key in ('insideMask', 'binNumber', 'pixelIntensityMin', 'pixelIntensityMax'):
+                if featureParameters[FeatureType.GLCM][key] != featureParameters[FeatureType.GLRLM][key]:
+                    return False
+        return True
+
+    def computeCombinedTextureMap(self,
+                                  inputScan: vtkMRMLScalarVolumeNode,
+                                  featureParameters: Dict[FeatureType, dict],
+                                  inputLabelMap: Optional[vtkMRMLLabelMapVolumeNode] = None,
+                                  wait_for_completion: bool = False) -> vtkMRMLCommandLineModuleNode:
+        """
+        Args:
+            inputScan: Input Scan
+            featureParameters: dictionary of the CLI parameters of each feature family to compute
+            inputLabelMap: Optional label map specifying an image mask
+            wait_for_completion: When True, code execution is paused until the cli execution is complete.
+        Returns: CLI node computing all the feature maps in a single vector volume
+        """
+        CLIname = slicer.modules.computetexturefeaturemaps
+
+        # ITK texture features does not work on double scalar volumes
+        scanName = inputScan.GetName()
+        inputScan = self.prepareInputScan(inputScan)
+
+        feature_types = [feature_type for feature_type in FeatureType if feature_type in featureParameters]
+        parameters = {}
+        for feature_type in feature_types:
+            parameters.update(featureParameters[feature_type])
+        parameters["featureFamilies"] = ",".join(feature_type.name for feature_type in feature_types)
+        parameters["inputVolume"] = inputScan
+        if inputLabelMap:
+            parameters["inputMask"] = inputLabelMap
+        volumeNode = vtkMRMLDiffusionWeightedVolumeNode()
+        slicer.mrmlScene.AddNode(volumeNode)
+        displayNode = slicer.vtkMRMLDiffusionWeightedVolumeDisplayNode()
+        slicer.mrmlScene.AddNode(displayNode)
+        colorNode = slicer.util.getNode('Rainbow')
+        displayNode.SetAndObserveColorNodeID(colorNode.GetID())
+        volumeNode.SetAndObserveDisplayNodeID(displayNode.GetID())
+        mapName = "_".join(feature_type.name for feature_type in feature_types)
+        volumeNode.SetName(slicer.mrmlScene.GenerateUniqueName(f"{mapName}_{scanName}"))
+        parameters["outputVolume"] = volumeNode
+        self.allowInMemoryTransfer(CLIname)
+        run_node = slicer.cli.createNode(CLIname)
+        run_node.SetName(mapName)
+        run_node = slicer.cli.run(CLIname,
+                       node = run_node,
+                       parameters = parameters,
+                       wait_for_completion=wait_for_completion)
+        return run_node
+
+    # ------------------ Parallel computation of a cohort -------------------- #
+
+    def getCaseID(self, file):
+        filename = Path(file).stem
+        case_id = filename.split('Scan_')[1]
+        return case_id
+
+    def getResultCacheDirectory(self, outputDir: str) -> str:
+        """ Directory of the cache of the serializer mode results written in outputDir."""
+        return os.path.join(outputDir, '.BoneTextureCache')
+
+    def getFeatureCLIModule(self, feature_type: FeatureType, textureMap: bool = False):
+        """ Returns the CLI module computing the features (or the feature maps) of the given type."""
+        if feature_type == FeatureType.GLCM:
+            return slicer.modules.computeglcmfeaturemaps if textureMap else slicer.modules.computeglcmfeatures
+        elif feature_type == FeatureType.GLRLM:
+            return slicer.modules.computeglrlmfeaturemaps if textureMap else slicer.modules.computeglrlmfeatures
+        elif feature_type == FeatureType.BM:
+            return slicer.modules.computebmfeaturemaps if textureMap else slicer.modules.computebmfeatures
+        raise ValueError("Invalid 'feature_type' option. Use 'GLCM', 'GLRM' or 'BM'")
+
+    def getCLIParameterDescriptions(self, cliModule) -> Dict[str, Dict[str, str]]:
+        """
+        Returns the parameters declared in the XML description of a CLI module, indexed by name.
+        The descriptions are read once from a temporary CLI node and cached, so that command lines
+        can later be built from worker threads without touching the scene.
+        """
+        if not hasattr(self, '_cliParameterDescriptions'):
+            self._cliParameterDescriptions = {}
+        if cliModule.name in self._cliParameterDescriptions:
+            return self._cliParameterDescriptions[cliModule.name]
+
+        descriptions = {}
+        node = slicer.cli.createNode(cliModule)
+        for group in range(node.GetNumberOfParameterGroups()):
+            for index in range(node.GetNumberOfParametersInGroup(group)):
+                descriptions[node.GetParameterName(group, index)] = {
+                    'tag': node.GetParameterTag(group, index),
+                    'flag': node.GetParameterFlag(group, index),
+                    'longflag': node.GetParameterLongFlag(group, index),
+                    'index': node.GetParameterIndex(group, index),
+                    'channel': node.GetParameterChannel(group, index),
+                }
+        slicer.mrmlScene.RemoveNode(node)
+
+        self._cliParameterDescriptions[cliModule.name] = descriptions
+        return descriptions
+
+    def getCLICommandLine(self, cliModule, parameters: dict, returnParameterFile: Optional[str] = None) -> List[str]:
+        """
+        Build the command line running a CLI module as a separate process.
+        Images and files are given as paths. As with slicer.cli.run, parameters that the
+        CLI does not declare are ignored.
+        """
+        executable = os.path.join(os.path.dirname(cliModule.path), cliModule.name)
+        if os.name == 'nt':
+            executable += '.exe'
+        if not os.path.isfile(executable):
+            raise RuntimeError(f"Could not find the executable of the {cliModule.name} CLI module: {executable}")
+
+        descriptions = self.getCLIParameterDescriptions(cliModule)
+        flags = []
+        positionals = []
+        for name, value in parameters.items():
+            if name not in descriptions or value is None or value == '':
+                continue
+            description = descriptions[name]
+            if description['tag'] == 'boolean':
+                if value:
+                    flags.append('--' + description['longflag'] if description['longflag'] else '-' + description['flag'])
+                continue
+            if description['tag'] == 'integer':
+                value = str(int(round(float(value))))
+            elif isinstance(value, (list, tuple)):
+                value = ','.join(str(v) for v in value)
+            else:
+                value = str(value)
+            if description['index']:
+                positionals.append((int(description['index']), value))
+            elif description['longflag']:
+                flags += ['--' + description['longflag'], value]
+            else:
+                flags += ['-' + description['flag'], value]
+
+        commandLine = [executable] + flags
+        if returnParameterFile:
+            commandLine += ['--returnparameterfile', returnParameterFile]
+        commandLine += [value for _, value in sorted(positionals)]
+        return commandLine
+
+    def runCLIProcess(self, commandLine: List[str], numberOfThreads: Optional[int] = None) -> None:
+        """
+        Run a command line built by getCLICommandLine and wait for it to finish.
+        This does not access the scene, so it can be called from worker threads.
+        """
+        environment = os.environ.copy()
+        if numberOfThreads:
+            environment['ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS'] = str(numberOfThreads)
+        process = subprocess.run(commandLine,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT,
+                                 universal_newlines=True,
+                                 env=environment,
+                                 creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        if process.returncode != 0:
+            raise RuntimeError("%s failed with exit code %d:\n%s" % (
+                os.path.basename(commandLine[0]), process.returncode, process.stdout))
+
+    def readCLIReturnParameters(self, returnParameterFile: str) -> Dict[str, str]:
+        """ Parse the 'name = value' lines written by a CLI in its return parameter file."""
+        values = {}
+        with open(returnParameterFile) as file:
+            for line in file:
+                name, separator, value = line.partition('=')
+                if separator:
+                    values[name.strip()] = value.strip()
+        return values
+
+    def parseFeatureValues(self, outputVector: str) -> List:
+        """ Convert the comma separated 'outputVector' of a features CLI, using 'NaN' for invalid values."""
+        values = []
+        for value in outputVector.split(','):
+            try:
+                value = float(value)
+            except ValueError:
+                value = 'NaN'
+            else:
+                if math.isnan(value):
+                    value = 'NaN'
+            values.append(value)
+        return values
+
+    def prepareSerializerCase(self, scanFile: str, labelMapFile: Optional[str], temporaryDir: str,
+                              convertVectorScan: Optional[Callable] = None) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Load and check one case of the serializer mode.
+        Returns the scan and label map files to give to the CLIs, or None if the case must be skipped.
+        Scans that need a conversion (vector to scalar, double to float) are saved in temporaryDir.
+        """
+        # Most cases can be checked from the image headers, and given as is to the CLIs
+        try:
+            scanInformation = self.readImageInformation(scanFile)
+        except RuntimeError as error:
+            logging.warning("Could not read the header of %s: %s" % (scanFile, error))
+            scanInformation = None
+        if scanInformation:
+            if scanInformation['numberOfComponents'] > 1 and convertVectorScan is None:
+                slicer.util.warningDisplay("Detected an input scan that has a vector pixel type. Skipping %s." % scanFile)
+                return None
+            if scanInformation['numberOfComponents'] == 1 and not scanInformation['isDouble']:
+                try:
+                    if not self.headerDataVerification(scanFile, labelMapFile):
+                        logging.warning("Skipping %s: invalid input data." % scanFile)
+                        return None
+                    return (scanFile, labelMapFile)
+                except RuntimeError as error:
+                    logging.warning("Could not read the header of %s: %s" % (labelMapFile, error))
+
+        inputScan = slicer.util.loadNodeFromFile(scanFile,
+            'VolumeFile',
+            {'labelmap': False, 'show': False}
+        )
+        inputLabelMap = None
+        if labelMapFile:
+            inputLabelMap = slicer.util.loadNodeFromFile(labelMapFile,
+                'VolumeFile',
+                {'labelmap': True, 'show': False}
+            )
+
+        caseFiles = None
+        try:
+            convertedScan = False
+            #If the scan is a vector image, convert to scalar
+            if inputScan.IsTypeOf('vtkMRMLVectorVolumeNode'):
+                if convertVectorScan is None:
+                    slicer.util.warningDisplay("Detected an input scan that has a vector pixel type. Skipping %s." % scanFile)
+                    return None
+                inputScan = convertVectorScan(inputScan)
+                convertedScan = True
+
+            if not self.inputDataVerification(inputScan, inputLabelMap):
+                logging.warning("Skipping %s: invalid input data." % scanFile)
+                return None
+
+            # ITK texture features does not work on double scalar volumes
+            preparedScan = self.prepareInputScan(inputScan)
+            if preparedScan is not inputScan:
+                convertedScan = True
+
+            if convertedScan:
+                convertedScanFile = os.path.join(temporaryDir, "Scan_%s.nrrd" % self.getCaseID(scanFile))
+                slicer.util.saveNode(preparedScan, convertedScanFile)
+                scanFile = convertedScanFile
+            caseFiles = (scanFile, labelMapFile)
+        finally:
+            self.releasePreparedScan(inputScan)
+            slicer.mrmlScene.RemoveNode(inputScan)
+            if inputLabelMap:
+                slicer.mrmlScene.RemoveNode(inputLabelMap)
+
+        return caseFiles
+
+    def getQuantizedScans(self, scanFile: str, featureRuns: Dict[Any, Tuple[FeatureType, dict]],
+                          cache: ResultCache) -> Dict[Any, Tuple[str, dict]]:
+        """
+        Quantize a scan into the histogram bins of the GLCM and GLRLM features to compute.
+        featureRuns gives the feature type and the CLI parameters of the features to compute, under
+        any key, and only the features with a histogram binning are used, each family binning the
+        intensity range its own way.
+        Returns under their key the file of the bin codes and the parameters to give to the CLI
+        with it (see BoneTextureLib.quantizeIntensities). The volumes are stored in the result cache,
+        so that they are computed once per scan content and binning, shared by the features with the
+        same binning and reused by the runs changing the other parameters. The scan is only loaded
+        when a volume is not in the cache.
+        """
+        quantizedScans = {}
+        scanNode = None
+        try:
+            for name, (featureType, parameters) in featureRuns.items():
+                if featureType not in (FeatureType.GLCM, FeatureType.GLRLM) or 'binNumber' not in parameters:
+                    continue
+                # The CLIs get the intensity range as integers (see getCLICommandLine)
+                minimum = int(round(float(parameters['pixelIntensityMin'])))
+                maximum = int(round(float(parameters['pixelIntensityMax'])))
+                numberOfBins = int(round(float(parameters['binNumber'])))
+                if not 1 <= numberOfBins <= maximumNumberOfQuantizedBins:
+                    continue
+                key = cache.key((scanFile,), 'QuantizedScan' + featureType.name, {
+                    'pixelIntensityMin': minimum,
+                    'pixelIntensityMax': maximum,
+                    'binNumber': numberOfBins,
+                })
+                quantizedFile = cache.entryFileName(key, '.nrrd')
+                if not os.path.isfile(quantizedFile):
+                    if scanNode is None:
+                        scanNode = slicer.util.loadNodeFromFile(scanFile, 'VolumeFile', {'labelmap': False, 'show': False})
+                    codes = quantizeIntensities(slicer.util.arrayFromVolume(scanNode), minimum, maximum, numberOfBins,
+                                                featureType.name)
+                    quantizedNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode')
+                    try:
+                        quantizedNode.CopyOrientation(scanNode)
+                        slicer.util.updateVolumeFromArray(quantizedNode, codes)
+                        # Written under another name first, so that an interrupted write is never used
+                        os.makedirs(os.path.dirname(quantizedFile), exist_ok=True)
+                        temporaryFile = quantizedFile[:-len('.nrrd')] + '.tmp.nrrd'
+                        if not slicer.util.saveNode(quantizedNode, temporaryFile):
+                            raise OSError("Could not write %s" % temporaryFile)
+                        os.replace(temporaryFile, quantizedFile)
+                    finally:
+                        slicer.mrmlScene.RemoveNode(quantizedNode)
+                quantizedScans[name] = (quantizedFile, quantizedIntensityParameters(numberOfBins, featureType.name))
+        finally:
+            if scanNode:
+                slicer.mrmlScene.RemoveNode(scanNode)
+        return quantizedScans
+
+    def computeCohortFeatures(self,
+                              inputData: List[Tuple[str, Optional[str]]],
+                              featureRuns: Dict[Any, Tuple[FeatureType, dict]],
+                              writeCase: Callable[[int, Dict[Any, List]], None],
+                              numberOfWorkers: int = 1,
+                              convertVectorScan: Optional[Callable] = None,
+                              caseCompletedCallback: Optional[Callable] = None,
+                              cacheDirectory: Optional[str] = None,
+                              conversionParameters: Optional[dict] = None,
+                              memoryLimit: Optional[int] = None) -> None:
+        """
+        Compute the features of every run of featureRuns, a feature type and its CLI parameters
+        given under any key, for every case of a cohort. Each case is loaded and checked once,
+        whatever its number of runs. writeCase(caseIndex, features) is called with the feature
+        values of each run of a case, under the key of the run, in the order of inputData; it is
+        not called for the skipped cases. The other arguments are described in
+        computeFeaturesSerializerMode.
+        Cases are loaded and checked one at a time on the main thread, then computed in a bounded pool.
+        When memoryLimit is given, in bytes, a case only starts when the estimated memory of its CLI
+        (see BoneTextureLib.estimateFeaturesMemory) fits in the memory left by the running cases.
+        """
+        numberOfWorkers = max(1, numberOfWorkers)
+        threadsPerWorker = max(1, (os.cpu_count() or 1) // numberOfWorkers)
+        temporaryDir = tempfile.mkdtemp(prefix='BoneTexture_', dir=slicer.app.temporaryPath)
+
+        # Cache the CLI descriptions before starting worker threads
+        cliModules = {featureType: self.getFeatureCLIModule(featureType) for featureType, _ in featureRuns.values()}
+        for cliModule in cliModules.values():
+            self.getCLIParameterDescriptions(cliModule)
+
+        cache = ResultCache(cacheDirectory) if cacheDirectory else None
+
+        def getCachedFeatures(scanFile, labelMapFile):
+            """ Returns the cache keys of each run of a case, and the features found in the cache."""
+            cacheKeys = {}
+            cachedFeatures = {}
+            if cache is None:
+                return cacheKeys, cachedFeatures
+            try:
+                for run, (featureType, parameters) in featureRuns.items():
+                    cacheKeys[run] = cache.key((scanFile, labelMapFile),
+                                               'Features' + featureType.name,
+                                               dict(parameters, vectorToScalar=conversionParameters))
+            except OSError as error:
+                logging.warning('Could not compute the cache keys of %s: %s' % (scanFile, error))
+                return {}, cachedFeatures
+            for run, key in cacheKeys.items():
+                values = cache.get(key)
+                if values is not None and len(values) == len(FeatureNames[featureRuns[run][0]]):
+                    cachedFeatures[run] = values
+            return cacheKeys, cachedFeatures
+
+        def computeCase(caseIndex, caseFiles, cacheKeys, cachedFeatures, quantizedScans):
+            scanFile, labelMapFile = caseFiles
+            features = dict(cachedFeatures)
+            for runIndex, (run, (featureType, parameters)) in enumerate(featureRuns.items()):
+                if run in features:
+                    continue
+                parameters = dict(parameters)
+                parameters['inputVolume'] = scanFile
+                if run in quantizedScans:
+                    parameters['inputVolume'], quantizedParameters = quantizedScans[run]
+                    parameters.update(quantizedParameters)
+                parameters['inputMask'] = labelMapFile
+                returnParameterFile = os.path.join(temporaryDir, f"{caseIndex}_{runIndex}_{featureType.name}.params")
+                try:
+                    self.runCLIProcess(
+                        self.getCLICommandLine(cliModules[featureType], parameters, returnParameterFile),
+                        numberOfThreads=threadsPerWorker)
+                    outputVector = self.readCLIReturnParameters(returnParameterFile)['outputVector']
+                    features[run] = self.parseFeatureValues(outputVector)
+                except (RuntimeError, OSError, KeyError) as error:
+                    logging.error('Computing %s features of %s failed: %s' % (featureType.name, scanFile, error))
+                    features[run] = ['NaN'] * len(FeatureNames[featureType])
+                    continue
+                if run in cacheKeys:
+                    try:
+                        cache.put(cacheKeys[run], features[run])
+                    except OSError as error:
+                        logging.warning('Could not cache the %s features of %s: %s' % (featureType.name, scanFile, error))
+            return features
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=numberOfWorkers) as executor:
+                runningCases = {}
+                runningMemory = {}
+                completedCases = {}
+                waitingCase = None
+                nextCaseToSubmit = 0
+                nextCaseToWrite = 0
+                while nextCaseToWrite < len(inputData):
+                    # Keep the pool full
+                    while nextCaseToSubmit < len(inputData) and len(runningCases) < numberOfWorkers:
+                        scanFile, labelMapFile = inputData[nextCaseToSubmit]
+                        if waitingCase is None:
+                            waitingCase = getCachedFeatures(scanFile, labelMapFile)
+                        cacheKeys, cachedFeatures = waitingCase
+                        caseMemory = 0
+                        if memoryLimit and len(cachedFeatures) < len(featureRuns):
+                            memoryInformation = self.readCaseMemoryInformation(scanFile, labelMapFile)
+                            if memoryInformation:
+                                caseMemory = estimateFeaturesMemory(**memoryInformation)
+                            if runningCases and sum(runningMemory.values()) + caseMemory > memoryLimit:
+                                # Wait for running cases to free their memory
+                                break
+                            if caseMemory > memoryLimit:
+                                logging.warning('The features of %s may need %.1f GB, more than the memory limit' % (
+                                    scanFile, caseMemory / 2**30))
+                        waitingCase = None
+                        if len(cachedFeatures) == len(featureRuns):
+                            # Everything was computed by a previous run: the case is not even loaded
+                            completedCases[nextCaseToSubmit] = cachedFeatures
+                            if caseCompletedCallback:
+                                caseCompletedCallback()
+                            nextCaseToSubmit += 1
+                            continue
+                        caseFiles = self.prepareSerializerCase(scanFile, labelMapFile, temporaryDir, convertVectorScan)
+                        if caseFiles is None:
+                            completedCases[nextCaseToSubmit] = None
+                            if caseCompletedCallback:
+                                caseCompletedCallback()
+                        else:
+                            quantizedScans = {}
+                            if cache:
+                                try:
+                                    quantizedScans = self.getQuantizedScans(
+                                        caseFiles[0],
+                                        {run: featureRun for run, featureRun in featureRuns.items()
+                                         if run not in cachedFeatures},
+                                        cache)
+                                except (OSError, RuntimeError, ValueError) as error:
+                                    logging.warning('Could not quantize %s: %s' % (scanFile, error))
+                            future = executor.submit(computeCase, nextCaseToSubmit, caseFiles, cacheKeys,
+                                                     cachedFeatures, quantizedScans)
+                            runningCases[future] = nextCaseToSubmit
+                            runningMemory[future] = caseMemory
+                        nextCaseToSubmit += 1
+
+                    if runningCases:
+                        done, _ = concurrent.futures.wait(runningCases, timeout=0.1,
+                                                          return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            runningMemory.pop(future)
+                            completedCases[runningCases.pop(future)] = future.result()
+                            if caseCompletedCallback:
+                                caseCompletedCallback()
+                    slicer.app.processEvents()
+
+                    # Write the cases completed in order
+                    while nextCaseToWrite in completedCases:
+                        features = completedCases.pop(nextCaseToWrite)
+                        if features is not None:
+                            writeCase(nextCaseToWrite, features)
+                        nextCaseToWrite += 1
+        finally:
+            shutil.rmtree(temporaryDir, ignore_errors=True)
+
+    def computeFeaturesSerializerMode(self,
+                                      inputData: List[Tuple[str, Optional[str]]],
+                                      featureParameters: Dict[FeatureType, dict],
+                                      outputCSV: str,
+                                      numberOfWorkers: int = 1,
+                                      convertVectorScan: Optional[Callable] = None,
+                                      caseCompletedCallback: Optional[Callable] = None,
+                                      cacheDirectory: Optional[str] = None,
+                                      conversionParameters: Optional[dict] = None,
+                                      memoryLimit: Optional[int] = None) -> None:
+        """
+        Compute the texture features of a cohort and write one row per case in outputCSV.
+        Args:
+            inputData: list of (scan file, label map file or None)
+            featureParameters: CLI parameters of each feature type to compute
+            outputCSV: path of the csv file to write
+            numberOfWorkers: number of cases processed at the same time, each one in its own CLI process
+            convertVectorScan: called with a vector volume node to get a scalar volume node.
+                Cases with a vector scan are skipped when not given.
+            caseCompletedCallback: called (on the main thread) each time a case is done
+            cacheDirectory: directory of the result cache. When given, the features of each family are
+                stored there, and the families already computed for the same scan and mask contents and
+                the same parameters are read back instead of being recomputed. The GLCM and GLRLM
+                features are then computed from scans quantized once (see getQuantizedScans).
+            conversionParameters: settings of convertVectorScan, which are part of the cache keys
+            memoryLimit: memory available to the CLIs, in bytes. When given, fewer cases than numberOfWorkers
+                are processed at the same time if their estimated memory does not fit in it.
+        Rows are written in input order as soon as all the previous cases are done.
+        """
+        with open(outputCSV, "w+") as file:
+            cw = csv.writer(file, delimiter=',')
+
+            # Write header information
+            toWrite = ["Case ID"]
+            for featureType in featureParameters:
+                toWrite += FeatureNames[featureType]
+            cw.writerow(toWrite)
+
+            def writeCase(caseIndex, features):
+                toWrite = [self.getCaseID(inputData[caseIndex][0])]
+                for featureType in featureParameters:
+                    toWrite += features[featureType]
+                cw.writerow(toWrite)
+                file.flush()
+
+            self.computeCohortFeatures(
+                inputData,
+                {featureType: (featureType, parameters) for featureType, parameters in featureParameters.items()},
+                writeCase,
+                numberOfWorkers=numberOfWorkers,
+                convertVectorScan=convertVectorScan,
+                caseCompletedCallback=caseCompletedCallback,
+                cacheDirectory=cacheDirectory,
+                conversionParameters=conversionParameters,
+                memoryLimit=memoryLimit)
+
+    def getParameterGrid(self, feature_type: FeatureType, parameterValues: dict) -> List[dict]:
+        """
+        Returns the CLI parameters of every combination of a grid of parameter values of a feature
+        type, e.g. {'binNumber': [16, 32], 'distanceMax': [1, 2, 3]}, in the order of the grid.
+        A single value is a list of one value, and the parameters missing from the grid have the
+        default value of the module. Only the parameters of the features CLI can be swept: the
+        neighborhood radius, which only applies to the texture maps, raises ValueError as well as
+        unknown names.
+        """
+        defaults = self.getDefaultFeatureParameters(feature_type)
+        unknownParameters = set(parameterValues) - set(defaults)
+        if unknownParameters:
+            raise ValueError("Unknown %s parameters: %s" % (feature_type.name, ', '.join(sorted(unknownParameters))))
+        # The command lines leave out the parameters the CLI does not declare, which would give identical runs
+        cliParameters = self.getCLIParameterDescriptions(self.getFeatureCLIModule(feature_type))
+        unusedParameters = set(parameterValues) - set(cliParameters)
+        if unusedParameters:
+            raise ValueError("The %s features do not depend on %s, which can not be swept" % (
+                feature_type.name, ', '.join(sorted(unusedParameters))))
+        names = list(parameterValues)
+        values = [value if isinstance(value, (list, tuple)) else [value] for value in parameterValues.values()]
+        return [dict(defaults, **dict(zip(names, combination))) for combination in itertools.product(*values)]
+
+    def computeFeaturesSweep(self,
+                             inputData: List[Tuple[str, Optional[str]]],
+                             parameterGrids: Dict[FeatureType, dict],
+                             outputCSV: str,
+                             numberOfWorkers: int = 1,
+                             convertVectorScan: Optional[Callable] = None,
+                             caseCompletedCallback: Optional[Callable] = None,
+                             cacheDirectory: Optional[str] = None,
+                             conversionParameters: Optional[dict] = None,
+                             memoryLimit: Optional[int] = None) -> None:
+        """
+        Compute the texture features of a cohort for every combination of a grid of parameter values,
+        e.g. to tune the binning, the intensity range or the run length distances. Each case is
+        loaded and checked once for all the combinations, which share the quantized scans and the
+        result cache of the serializer mode.
+        Args:
+            parameterGrids: values of the swept parameters of each feature type to compute, given
+                as lists of values by parameter name (see getParameterGrid), e.g.
+                {FeatureType.GLCM: {'binNumber': [16, 32]}, FeatureType.GLRLM: {'distanceMax': [1, 2]}}
+            outputCSV: path of the csv file to write, in long format: one row per case, feature type,
+                combination and feature, with the columns Case ID, Feature Type, the swept parameters
+                (empty for the feature types without them), Feature and Value
+            The other arguments are the same as for computeFeaturesSerializerMode.
+        """
+        featureRuns = {}
+        for feature_type, parameterValues in parameterGrids.items():
+            for combination, parameters in enumerate(self.getParameterGrid(feature_type, parameterValues)):
+                featureRuns[(feature_type, combination)] = (feature_type, parameters)
+        sweptParameters = []
+        for parameterValues in parameterGrids.values():
+            sweptParameters += [name for name in parameterValues if name not in sweptParameters]
+
+        with open(outputCSV, "w+") as file:
+            cw = csv.writer(file, delimiter=',')
+            cw.writerow(["Case ID", "Feature Type"] + sweptParameters + ["Feature", "Value"])
+
+            def writeCase(caseIndex, features):
+                caseID = self.getCaseID(inputData[caseIndex][0])
+                for run, (feature_type, parameters) in featureRuns.items():
+                    key = [caseID, feature_type.name] + [
+                        parameters[name] if name in parameterGrids[feature_type] else '' for name in sweptParameters]
+                    for name, value in zip(FeatureNames[feature_type], features[run]):
+                        cw.writerow(key + [name, value])
+                file.flush()
+
+            self.computeCohortFeatures(
+                inputData,
+                featureRuns,
+                writeCase,
+                numberOfWorkers=numberOfWorkers,
+                convertVectorScan=convertVectorScan,
+                caseCompletedCallback=caseCompletedCallback,
+                cacheDirectory=cacheDirectory,
+                conversionParameters=conversionParameters,
+                memoryLimit=memoryLimit)
+
+    def exportTextureMap(self, volumeNode: vtkMRMLDiffusionWeightedVolumeNode, outputDir: str,
+                         separateFeatures: bool = False) -> List[str]:
+        """
+        Save a feature map in outputDir, as a single vector image or as one scalar image per feature.
+        Returns the names of the files written.
+        """
+        if separateFeatures:
+            parameters = dict()
+            parameters["inputVolume"] = volumeNode
+            parameters["outputFileBaseName"] = os.path.join(outputDir,volumeNode.GetName())
+            self.allowInMemoryTransfer(slicer.modules.separatevectorimage)
+            slicer.cli.run(slicer.modules.separatevectorimage,
+                        None,
+                        parameters,
+                        wait_for_completion=True)
+            numberOfComponents = volumeNode.GetImageData().GetNumberOfScalarComponents()
+            return separatedFeatureFileNames(volumeNode.GetName(), numberOfComponents)
+        else:
+            output_filename = os.path.join(outputDir, volumeNode.GetName() + ".nrrd")
+            slicer.util.saveNode(volumeNode, output_filename)
+            return [os.path.basename(output_filename)]
+
+    def convertVectorScanToScalar(self, inputScan, conversionMethod, componentToExtract: int = 0) -> vtkMRMLScalarVolumeNode:
+        """ Replace a vector volume node by its scalar conversion. The input node is removed from the scene."""
+        outputVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", slicer.mrmlScene.GetUniqueNameByString("ConvertScan"))
+        
+        # run Conversion
+        self.convertInputVectorToScalarVolume(
+            inputScan,
+            outputVolumeNode,
+            conversionMethod,
+            componentToExtract)
+    
+        # Remove original node
+        slicer.mrmlScene.RemoveNode(inputScan)
+
+        return outputVolumeNode
+
+    def readCaseIntensityRange(self, scanFile: str, labelMapFile: Optional[str],
+                               intensityPercentiles: Tuple[float, float] = (0.0, 100.0)) -> Tuple[float, float]:
+        """
+        Returns the intensity range of a case of the serializer mode (see computeLabelStatistics),
+        reading its files with SimpleITK. This does not access the scene, so it can be called from
+        worker threads. Raises RuntimeError if a file can not be read.
+        """
+        scanImage = sitk.ReadImage(scanFile)
+        labelMapImage = sitk.ReadImage(labelMapFile) if labelMapFile else None
+        return self.computeArrayStatistics(
+            sitk.GetArrayViewFromImage(scanImage),
+            sitk.GetArrayViewFromImage(labelMapImage) if labelMapImage is not None else None,
+            lowerPercentile=intensityPercentiles[0],
+            upperPercentile=intensityPercentiles[1])
+
+    def computeTextureMapsSerializerMode(self,
+                                         inputData: List[Tuple[str, Optional[str]]],
+                                         featureParameters: Dict[FeatureType, dict],
+                                         outputDir: str,
+                                         separateFeatures: bool = False,
+                                         convertVectorScan: Optional[Callable] = None,
+                                         caseCompletedCallback: Optional[Callable] = None,
+                                         cacheDirectory: Optional[str] = None,
+                                         conversionParameters: Optional[dict] = None,
+                                         intensityPercentiles: Tuple[float, float] = (0.0, 100.0),
+                                         prefetchDepth: int = 1,
+                                         memoryLimit: Optional[int] = None) -> None:
+        """
+        Compute the texture maps of a cohort and save them in outputDir.
+        The arguments are the same as for computeFeaturesSerializerMode. The GLCM and GLRLM intensity
+        range of each case is set between intensityPercentiles of its intensities (inside its mask),
+        e.g. (0.5, 99.5) to ignore outliers. When a cache directory is given,
+        a case is skipped if its maps were already written in outputDir from the same scan and mask
+        contents, with the same parameters.
+        The cases go through a pipeline of stages running at the same time: reading a case and
+        computing its intensity range, computing its maps with the CLIs, and separating the maps into
+        one file per feature. Each stage runs in its own thread, with at most prefetchDepth cases
+        waiting for the next stage, so that the next case is read and the previous maps are written
+        while the maps of a case are computed. The cases needing a conversion (vector or double scans)
+        are converted on the main thread, which is the only one accessing the scene.
+        When memoryLimit is given, in bytes, the maps whose estimated memory (see
+        BoneTextureLib.estimateFeatureMapMemory) does not fit in it are computed by slabs, and the
+        maps of a case are not computed while the maps of the previous case are separated if both
+        do not fit in it together.
+        """
+        featureParameters = {feature_type: dict(parameters) for feature_type, parameters in featureParameters.items()}
+        # The intensity range is computed for each case and shared by GLCM and GLRLM
+        if FeatureType.GLCM in featureParameters and FeatureType.GLRLM in featureParameters:
+            for key in ('pixelIntensityMin', 'pixelIntensityMax'):
+                featureParameters[FeatureType.GLRLM][key] = featureParameters[FeatureType.GLCM][key]
+        combineMaps = self.canCombineTextureMaps(featureParameters)
+        needsIntensityRange = FeatureType.GLCM in featureParameters or FeatureType.GLRLM in featureParameters
+        prefetchDepth = max(1, prefetchDepth)
+
+        cache = ResultCache(cacheDirectory) if cacheDirectory else None
+        cacheParameters = {
+            'featureParameters': {feature_type.name: parameters for feature_type, parameters in featureParameters.items()},
+            'combined': combineMaps,
+            'separateFeatures': separateFeatures,
+            'vectorToScalar': conversionParameters,
+            'intensityPercentiles': list(intensityPercentiles),
+        }
+
+        # The maps computed for each case: (CLI module, map name prefix, feature types, CLI parameters)
+        featureTypes = [feature_type for feature_type in FeatureType if feature_type in featureParameters]
+        if combineMaps:
+            parameters = {}
+            for feature_type in featureTypes:
+                parameters.update(featureParameters[feature_type])
+            parameters['featureFamilies'] = ",".join(feature_type.name for feature_type in featureTypes)
+            maps = [(slicer.modules.computetexturefeaturemaps, "_".join(feature_type.name for feature_type in featureTypes),
+                     featureTypes, parameters)]
+        else:
+            maps = [(self.getFeatureCLIModule(feature_type, textureMap=True), feature_type.name, [feature_type],
+                     featureParameters[feature_type]) for feature_type in featureTypes]
+        # Cache the CLI descriptions before starting worker threads
+        for cliModule, _, _, _ in maps:
+            self.getCLIParameterDescriptions(cliModule)
+        if separateFeatures:
+            self.getCLIParameterDescriptions(slicer.modules.separatevectorimage)
+        temporaryDir = tempfile.mkdtemp(prefix='BoneTexture_', dir=slicer.app.temporaryPath)
+
+        def planCaseMemory(case, memoryInformation):
+            """ Slab size of each map of the case within memoryLimit, and the memory of its computing and writing stages."""
+            size = memoryInformation['size']
+            numberOfVoxels = size[0] * size[1] * size[2]
+            # The next case is read while the maps are computed
+            budget = memoryLimit - numberOfVoxels * (memoryInformation['pixelBytes'] + memoryInformation['labelMapBytes'])
+            case['memory'] = 0
+            case['writeMemory'] = 0
+            for mapIndex, (_, mapName, mapFeatureTypes, parameters) in enumerate(maps):
+                numberOfComponents = sum(len(FeatureNames[feature_type]) for feature_type in mapFeatureTypes)
+                estimateArguments = dict(memoryInformation,
+                                         numberOfComponents=numberOfComponents,
+                                         neighborhoodRadius=parameters['neighborhoodRadius'],
+                                         outputPrecision=parameters.get('outputPrecision', 'float32'),
+                                         computationEngine=parameters.get('computationEngine', 'filter'),
+                                         featureTypes=mapFeatureTypes,
+                                         samplingStride=parameters.get('samplingStride', 1))
+                slabSize = parameters.get('slabSize', 0)
+                if estimateFeatureMapMemory(slabSize=slabSize, **estimateArguments) > budget:
+                    # The coarse and fixed point maps need the whole map at once
+                    canUseSlabs = parameters.get('outputPrecision') != 'fixed16' and not (
+                        parameters.get('samplingStride', 1) > 1 and parameters.get('samplingOutput') == 'coarse')
+                    fittingSlabSize = chooseSlabSize(memoryLimit=budget, **estimateArguments) if canUseSlabs else None
+                    if fittingSlabSize is None:
+                        logging.warning('The %s map of %s may need %.1f GB, more than the memory limit' % (
+                            mapName, case['inputFiles'][0],
+                            estimateFeatureMapMemory(slabSize=slabSize, **estimateArguments) / 2**30))
+                    else:
+                        logging.info('Computing the %s map of %s by slabs of %d slices to fit in the memory limit' % (
+                            mapName, case['inputFiles'][0], fittingSlabSize))
+                        slabSize = fittingSlabSize
+                case['slabSizes'][mapIndex] = slabSize
+                case['memory'] = max(case['memory'], estimateFeatureMapMemory(slabSize=slabSize, **estimateArguments))
+                if separateFeatures:
+                    case['writeMemory'] = max(case['writeMemory'], estimateSeparateFeaturesMemory(size, numberOfComponents))
+
+        def loadCase(case):
+            """ Reading stage: the intensity range of the case."""
+            if needsIntensityRange:
+                try:
+                    case['intensityRange'] = self.readCaseIntensityRange(case['scanFile'], case['labelMapFile'],
+                                                                         intensityPercentiles)
+                except (RuntimeError, ValueError) as error:
+                    logging.error('Could not compute the intensity range of %s: %s' % (case['scanFile'], error))
+                    return None
+            return case
+
+        def computeCase(case):
+            """ Computing stage: the map files of the case, in outputDir or in temporaryDir when they are separated."""
+            case['mapFiles'] = []
+            try:
+                for mapIndex, (cliModule, mapName, mapFeatureTypes, parameters) in enumerate(maps):
+                    parameters = dict(parameters)
+                    if mapIndex in case['slabSizes']:
+                        parameters['slabSize'] = case['slabSizes'][mapIndex]
+                    if 'intensityRange' in case:
+                        parameters['pixelIntensityMin'], parameters['pixelIntensityMax'] = case['intensityRange']
+                    parameters['inputVolume'] = case['scanFile']
+                    parameters['inputMask'] = case['labelMapFile']
+                    mapName = f"{mapName}_{case['scanName']}"
+                    mapFile = os.path.join(temporaryDir if separateFeatures else outputDir, mapName + ".nrrd")
+                    parameters['outputVolume'] = mapFile
+                    self.runCLIProcess(self.getCLICommandLine(cliModule, parameters))
+                    case['mapFiles'].append((mapFile, mapName, mapFeatureTypes))
+            except (RuntimeError, OSError) as error:
+                logging.error('Computing the texture maps of %s failed: %s' % (case['inputFiles'][0], error))
+                return None
+            finally:
+                # The scans converted for the CLIs are not needed anymore
+                if os.path.dirname(case['scanFile']) == temporaryDir:
+                    os.remove(case['scanFile'])
+            return case
+
+        def writeCase(case):
+            """ Writing stage: one file per feature of each map of the case."""
+            outputFiles = []
+            try:
+                for mapFile, mapName, mapFeatureTypes in case['mapFiles']:
+                    self.runCLIProcess(self.getCLICommandLine(slicer.modules.separatevectorimage, {
+                        'inputVolume': mapFile,
+                        'outputFileBaseName': os.path.join(outputDir, mapName),
+                    }))
+                    numberOfComponents = sum(len(FeatureNames[feature_type]) for feature_type in mapFeatureTypes)
+                    outputFiles += separatedFeatureFileNames(mapName, numberOfComponents)
+            except (RuntimeError, OSError) as error:
+                logging.error('Writing the texture maps of %s failed: %s' % (case['inputFiles'][0], error))
+                return None
+            finally:
+                for mapFile, _, _ in case['mapFiles']:
+                    if os.path.isfile(mapFile):
+                        os.remove(mapFile)
+            return outputFiles
+
+        def fitsInMemory(memory, runningMemory):
+            """ Whether a stage needing memory can start beside stages using runningMemory (a stage always starts alone)."""
+            return not memoryLimit or not runningMemory or memory + sum(runningMemory) <= memoryLimit
+
+        def finishCase(case, outputFiles):
+            if case.get('cacheKey') and outputFiles is not None:
+                try:
+                    cache.put(case['cacheKey'], outputFiles)
+                except OSError as error:
+                    logging.warning('Could not cache the texture maps of %s: %s' % (case['inputFiles'][0], error))
+            if caseCompletedCallback:
+                caseCompletedCallback()
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as loadExecutor, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=1) as computeExecutor, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=1) as writeExecutor:
+                loading = {}
+                computing = {}
+                writing = {}
+                casesToCompute = []
+                casesToWrite = []
+                nextCase = 0
+                while nextCase < len(inputData) or loading or computing or writing or casesToCompute or casesToWrite:
+                    # Read ahead of the computation, one case at a time
+                    while nextCase < len(inputData) and len(loading) + len(casesToCompute) < prefetchDepth:
+                        scanFile, labelMapFile = inputData[nextCase]
+                        nextCase += 1
+                        case = {'inputFiles': (scanFile, labelMapFile), 'slabSizes': {}, 'memory': 0, 'writeMemory': 0}
+                        if cache:
+                            try:
+                                case['cacheKey'] = cache.key((scanFile, labelMapFile), 'TextureMaps', cacheParameters)
+                            except OSError as error:
+                                logging.warning('Could not compute the cache key of %s: %s' % (scanFile, error))
+                        if case.get('cacheKey') and cache.getFiles(case['cacheKey'], outputDir):
+                            logging.info('Skipping %s: its texture maps are already in %s' % (scanFile, outputDir))
+                            if caseCompletedCallback:
+                                caseCompletedCallback()
+                            continue
+                        caseFiles = self.prepareSerializerCase(scanFile, labelMapFile, temporaryDir, convertVectorScan)
+                        if caseFiles is None:
+                            finishCase(case, None)
+                            continue
+                        case['scanFile'], case['labelMapFile'] = caseFiles
+                        # Name of the scan node, used in the map names
+                        case['scanName'] = os.path.basename(
+                            slicer.vtkMRMLVolumeArchetypeStorageNode().GetFileNameWithoutExtension(scanFile))
+                        if memoryLimit:
+                            memoryInformation = self.readCaseMemoryInformation(scanFile, labelMapFile)
+                            if memoryInformation:
+                                planCaseMemory(case, memoryInformation)
+                        loading[loadExecutor.submit(loadCase, case)] = case
+
+                    # Compute when the writing stage can take the maps, and the two stages fit in the memory limit
+                    if casesToCompute and not computing and len(casesToWrite) < prefetchDepth and \
+                            fitsInMemory(casesToCompute[0]['memory'], [writingCase['writeMemory'] for writingCase in writing.values()]):
+                        case = casesToCompute.pop(0)
+                        computing[computeExecutor.submit(computeCase, case)] = case
+                    if casesToWrite and not writing and \
+                            fitsInMemory(casesToWrite[0]['writeMemory'], [computingCase['memory'] for computingCase in computing.values()]):
+                        case = casesToWrite.pop(0)
+                        writing[writeExecutor.submit(writeCase, case)] = case
+
+                    runningStages = list(loading) + list(computing) + list(writing)
+                    if runningStages:
+                        concurrent.futures.wait(runningStages, timeout=0.1,
+                                                return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in [future for future in loading if future.done()]:
+                        case = loading.pop(future)
+                        if future.result() is None:
+                            finishCase(case, None)
+                        else:
+                            casesToCompute.append(case)
+                    for future in [future for future in computing if future.done()]:
+                        case = computing.pop(future)
+                        if future.result() is None:
+                            finishCase(case, None)
+                        elif separateFeatures:
+                            casesToWrite.append(case)
+                        else:
+                            finishCase(case, [os.path.basename(mapFile) for mapFile, _, _ in case['mapFiles']])
+                    for future in [future for future in writing if future.done()]:
+                        case = writing.pop(future)
+                        finishCase(case, future.result())
+                    slicer.app.processEvents()
+        finally:
+            shutil.rmtree(temporaryDir, ignore_errors=True)
+
+    # ------------------------ Headless batch processing ------------------------ #
+
+    def findSerializerInputs(self, inputDir: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Returns the cases of an input directory as (scan file, label map file or None).
+        The input data should be named in the folowing way: Scan_"ID".nrrd (for the input scan)
+        and Seg_"ID".nrrd (for the segmentation if it exist)
+        The scans and segmentations are paired from a single listing of the directory.
+        """
+        fileNames = sorted(entry.name for entry in os.scandir(inputDir) if entry.is_file())
+
+        # Index the segmentations by each possible case ID, as in glob('Seg_<ID>.*'):
+        # 'Seg_1.nii.gz' is the segmentation of the cases '1' and '1.nii'
+        segFiles = {}
+        for fileName in fileNames:
+            if not fileName.startswith('Seg_'):
+                continue
+            name = fileName[len('Seg_'):]
+            dot = name.find('.')
+            while dot >= 0:
+                segFiles.setdefault(name[:dot], os.path.join(inputDir, fileName))
+                dot = name.find('.', dot + 1)
+
+        inputData = []
+        for fileName in fileNames:
+            if fileName.startswith('Scan_') and '.' in fileName:
+                scanFile = os.path.join(inputDir, fileName)
+                inputData.append((scanFile, segFiles.get(self.getCaseID(scanFile))))
+        return inputData
+
+    def readImageInformation(self, fileName: str) -> dict:
+        """
+        Read the pixel type, number of components, size, spacing and origin of an image from its
+        header, without loading the voxels. The information is cached on the path, size and
+        modification time of the file, so that the compute steps reuse the discovery reads.
+        Raises RuntimeError if the header can not be read.
+        """
+        if not hasattr(self, '_imageInformation'):
+            self._imageInformation = {}
+        status = os.stat(fileName)
+        cacheKey = (os.path.abspath(fileName), status.st_size, status.st_mtime_ns)
+        if cacheKey in self._imageInformation:
+            return self._imageInformation[cacheKey]
+
+        reader = sitk.ImageFileReader()
+        reader.SetFileName(fileName)
+        reader.ReadImageInformation()
+        pixelType = sitk.GetPixelIDValueAsString(reader.GetPixelID())
+        componentBits = re.search(r'(\d+)-bit', pixelType)
+        information = {
+            'pixelType': pixelType,
+            'componentBytes': int(componentBits.group(1)) // 8 if componentBits else 8,
+            'numberOfComponents': reader.GetNumberOfComponents(),
+            'isDouble': reader.GetPixelID() in (sitk.sitkFloat64, sitk.sitkVectorFloat64),
+            'size': reader.GetSize(),
+            'spacing': reader.GetSpacing(),
+            'origin': reader.GetOrigin(),
+        }
+        self._imageInformation[cacheKey] = information
+        return information
+
+    def readCaseMemoryInformation(self, scanFile: str, labelMapFile: Optional[str] = None) -> Optional[dict]:
+        """
+        Returns the arguments of the memory estimates of BoneTextureLib for a case of the serializer
+        mode, from its headers: the size of the scan, its bytes per voxel as given to the CLIs (the
+        vector and double scans being converted to float), and the bytes per voxel of the label map
+        (0 without label map). Returns None if a header can not be read.
+        """
+        try:
+            scanInformation = self.readImageInformation(scanFile)
+            labelMapInformation = self.readImageInformation(labelMapFile) if labelMapFile else None
+        except RuntimeError as error:
+            logging.warning("Could not read the headers of %s: %s" % (scanFile, error))
+            return None
+        pixelBytes = scanInformation['componentBytes']
+        if scanInformation['numberOfComponents'] > 1 or scanInformation['isDouble']:
+            pixelBytes = 4
+        return {
+            'size': scanInformation['size'],
+            'pixelBytes': pixelBytes,
+            'labelMapBytes': labelMapInformation['componentBytes'] if labelMapInformation else 0,
+        }
+
+    def headerDataVerification(self, scanFile: str, labelMapFile: Optional[str] = None) -> bool:
+        """ Same checks as inputDataVerification, from the image headers (see readImageInformation)."""
+        scanInformation = self.readImageInformation(scanFile)
+        if scanInformation['numberOfComponents'] > 1:
+            logging.warning("%s has a vector pixel type, please transform it to a scalar type first." % scanFile)
+            return False
+        if labelMapFile:
+            labelMapInformation = self.readImageInformation(labelMapFile)
+            if scanInformation['size'] != labelMapInformation['size']:
+                logging.warning("%s and %s must be the same size" % (scanFile, labelMapFile))
+                return False
+            if not self.isClose(scanInformation['spacing'], labelMapInformation['spacing'], 0.0, 1e-04) or \
+                    not self.isClose(scanInformation['origin'], labelMapInformation['origin'], 0.0, 1e-04):
+                logging.warning("%s and %s must overlap: same origin, spacing and orientation" % (scanFile, labelMapFile))
+                return False
+        return True
+
+    def getDefaultFeatureParameters(self, feature_type: FeatureType) -> dict:
+        """ Returns the CLI parameters of a feature type with the default values of the module."""
+        packClass = {
+            FeatureType.GLCM: GLCMFeaturesParameterNode,
+            FeatureType.GLRLM: GLRLMFeaturesParameterNode,
+            FeatureType.BM: BMFeaturesParameterNode,
+        }[feature_type]
+        pack = packClass()
+        return {name: getattr(pack, name) for name in packClass.__annotations__}
+
+    def readBatchParameters(self, parameterFile: str) -> dict:
+        """
+        Read the settings of a batch run from a JSON file such as:
+            {
+                "features": true,
+                "textureMaps": false,
+                "outputCSV": "features.csv",
+                "separateFeatures": false,
+                "intensityPercentiles": [0.5, 99.5],
+                "slabSize": 64,
+                "samplingStride": 1,
+                "computationEngine": "fast",
+                "vectorToScalar": {"conversionMethod": "LUMINANCE", "componentToExtract": 0},
+                "GLCM": {"binNumber": 32, "pixelIntensityMin": 0, "pixelIntensityMax": 4000},
+                "BM": {"threshold": 2000},
+                "sweep": {"GLCM": {"binNumber": [16, 32]}, "GLRLM": {"distanceMax": [1, 2, 3]}},
+                "sweepCSV": "sweep.csv"
+            }
+        Only the feature families given in the file are computed, with the default values of the
+        module for their missing parameters. "intensityPercentiles" sets the intensity range of the
+        texture maps of each case (the full range by default). "slabSize" makes the texture map CLIs
+        process large volumes by slabs of that many slices (the whole volume at once by default).
+        "samplingStride" computes the texture maps every that many voxels along each axis and
+        interpolates them in between, for quick screening runs (every voxel by default).
+        "computationEngine" selects how the texture map CLIs compute the features: "filter" with
+        the ITK filters (default) or "fast" with the engines of the extension.
+        "vectorToScalar" is only needed for vector scans.
+        "sweep" computes the features of every combination of the given parameter values of each
+        family (see computeFeaturesSweep), written in long format in "sweepCSV"; the feature families
+        may then be omitted.
+        Returns the settings, the feature parameters being in 'featureParameters' indexed by FeatureType.
+        """
+        with open(parameterFile) as file:
+            settings = json.load(file)
+
+        featureParameters = {}
+        for feature_type in FeatureType:
+            if feature_type.name not in settings:
+                continue
+            parameters = self.getDefaultFeatureParameters(feature_type)
+            unknownParameters = set(settings[feature_type.name]) - set(parameters)
+            if unknownParameters:
+                raise ValueError("Unknown %s parameters in %s: %s" % (
+                    feature_type.name, parameterFile, ', '.join(sorted(unknownParameters))))
+            parameters.update(settings[feature_type.name])
+            featureParameters[feature_type] = parameters
+
+        parameterGrids = {}
+        for name, parameterValues in settings.get('sweep', {}).items():
+            if name not in FeatureType.__members__:
+                raise ValueError("Unknown feature family %s in the sweep of %s" % (name, parameterFile))
+            parameterGrids[FeatureType[name]] = parameterValues
+            # Check the parameter names before running anything
+            self.getParameterGrid(FeatureType[name], parameterValues)
+        if not featureParameters and not parameterGrids:
+            raise ValueError("No feature family (%s) is given in %s" % (
+                ', '.join(feature_type.name for feature_type in FeatureType), parameterFile))
+
+        return {
+            'featureParameters': featureParameters,
+            'features': settings.get('features', True),
+            'textureMaps': settings.get('textureMaps', False),
+            'outputCSV': settings.get('outputCSV', 'features.csv'),
+            'separateFeatures': settings.get('separateFeatures', False),
+            'intensityPercentiles': tuple(settings.get('intensityPercentiles', (0.0, 100.0))),
+            'slabSize': settings.get('slabSize', 0),
+            'samplingStride': settings.get('samplingStride', 1),
+            'computationEngine': settings.get('computationEngine', 'filter'),
+            'vectorToScalar': settings.get('vectorToScalar'),
+            'parameterGrids': parameterGrids,
+            'sweepCSV': settings.get('sweepCSV', 'sweep.csv'),
+        }
+
+    def runBatch(self,
+                 inputDir: str,
+                 parameterFile: str,
+                 outputDir: str,
+                 numberOfWorkers: int = 1,
+                 useCache: bool = True,
+                 memoryLimit: Optional[int] = None) -> None:
+        """
+        Process a cohort without the module GUI, e.g. from `Slicer --no-main-window --python-script`.
+        The cases are found in inputDir as in the serializer mode, the settings are read from
+        parameterFile (see readBatchParameters), and the results are written in outputDir.
+        memoryLimit, in bytes, bounds the estimated memory of the CLIs running at the same time.
+        """
+        settings = self.readBatchParameters(parameterFile)
+        inputData = self.findSerializerInputs(inputDir)
+        if not inputData:
+            raise ValueError("No cases were found in the input directory %s" % inputDir)
+        os.makedirs(outputDir, exist_ok=True)
+        logging.info("Processing %d case(s) of %s" % (len(inputData), inputDir))
+
+        conversionParameters = settings['vectorToScalar']
+        convertVectorScan = None
+        if conversionParameters:
+            conversionMethod = VectorToScalarVolume.ConversionMethods[conversionParameters['conversionMethod']]
+            componentToExtract = conversionParameters.get('componentToExtract', 0)
+            convertVectorScan = lambda inputScan: self.convertVectorScanToScalar(inputScan, conversionMethod, componentToExtract)
+        cacheDirectory = self.getResultCacheDirectory(outputDir) if useCache else None
+
+        if settings['features'] and settings['featureParameters']:
+            self.computeFeaturesSerializerMode(
+                inputData,
+                settings['featureParameters'],
+                os.path.join(outputDir, settings['outputCSV']),
+                numberOfWorkers=numberOfWorkers,
+                convertVectorScan=convertVectorScan,
+                cacheDirectory=cacheDirectory,
+                conversionParameters=conversionParameters,
+                memoryLimit=memoryLimit)
+        if settings['textureMaps'] and settings['featureParameters']:
+            textureMapParameters = {feature_type: dict(parameters,
+                                                       slabSize=settings['slabSize'],
+                                                       samplingStride=settings['samplingStride'],
+                                                       computationEngine=settings['computationEngine'])
+                                    for feature_type, parameters in settings['featureParameters'].items()}
+            self.computeTextureMapsSerializerMode(
+                inputData,
+                textureMapParameters,
+                outputDir,
+                separateFeatures=settings['separateFeatures'],
+                convertVectorScan=convertVectorScan,
+                cacheDirectory=cacheDirectory,
+                conversionParameters=conversionParameters,
+                intensityPercentiles=settings['intensityPercentiles'],
+                memoryLimit=memoryLimit)
+        if settings['parameterGrids']:
+            self.computeFeaturesSweep(
+                inputData,
+                settings['parameterGrids'],
+                os.path.join(outputDir, settings['sweepCSV']),
+                numberOfWorkers=numberOfWorkers,
+                convertVectorScan=convertVectorScan,
+                cacheDirectory=cacheDirectory,
+                conversionParameters=conversionParameters,
+                memoryLimit=memoryLimit)
+
     def SaveTableAsCSV(self,
                        table,
                        fileName):
@@ -1362,6 +2459,88 @@ class BoneTextureTest(ScriptedLoadableModuleTest):
     def runTest(self):
         self.setUp()
         self.test_BoneTexture1()
+        self.setUp()
+        self.test_BoneTexture2()
 
     def test_BoneTexture1(self):
+        """ In-process features of a synthetic scan and mask, computed from the nodes."""
+        self.delayDisplay("Starting the test")
+        import numpy as np
+
+        # Bone slabs of 2 voxels every 4 voxels along x, in a cubic mask
+        scanArray = np.zeros((16, 16, 16), dtype=np.int16)
+        scanArray[:, :, (np.arange(16) % 4) < 2] = 1500
+        maskArray = np.zeros(scanArray.shape, dtype=np.uint8)
+        maskArray[4:12, 4:12, 4:12] = 1
+        inputScan = slicer.util.addVolumeFromArray(scanArray, name="Scan")
+        inputLabelMap = slicer.util.addVolumeFromArray(maskArray, name="Mask", nodeClassName="vtkMRMLLabelMapVolumeNode")
+        inputScan.SetSpacing(0.5, 0.5, 0.5)
+        inputLabelMap.SetSpacing(0.5, 0.5, 0.5)
+
+        logic = BoneTextureLogic()
+        self.assertTrue(logic.inputDataVerification(inputScan, inputLabelMap))
+        self.assertEqual(logic.computeLabelStatistics(inputScan, inputLabelMap), (0.0, 1500.0))
+
+        featureParameters = {feature_type: logic.getDefaultFeatureParameters(feature_type) for feature_type in FeatureType}
+        featureParameters[FeatureType.BM]['threshold'] = 1000
+        features = logic.computeFeaturesInProcess(inputScan, featureParameters, inputLabelMap)
+        self.assertEqual(len(features.glcm.asList()), len(FeatureNames[FeatureType.GLCM]))
+        self.assertEqual(len(features.glrlm.asList()), len(FeatureNames[FeatureType.GLRLM]))
+        self.assertAlmostEqual(features.bm.boneVolumeDensity, 0.5)
+
+        # The same values as from the arrays, with the spacing of the nodes
+        expected = computeTextureFeatures(scanArray, maskArray, (0.5, 0.5, 0.5),
+                                          GLCMParameters=featureParameters[FeatureType.GLCM],
+                                          GLRLMParameters=featureParameters[FeatureType.GLRLM],
+                                          BMParameters=featureParameters[FeatureType.BM])
+        np.testing.assert_allclose(features.glcm.asList(), expected.glcm.asList())
+        np.testing.assert_allclose(features.glrlm.asList(), expected.glrlm.asList())
+        np.testing.assert_allclose(features.bm.asList(), expected.bm.asList())
+
+        # The CLIs give the same features as the in-process computation
+        cliFeatures = {
+            feature_type: logic.computeLabelFeatures(inputScan, inputLabelMap, featureParameters[feature_type],
+                                                     feature_type, labels=[1])[1]
+            for feature_type in FeatureType
+        }
+        np.testing.assert_allclose(cliFeatures[FeatureType.GLCM], features.glcm.asList(), rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(cliFeatures[FeatureType.GLRLM], features.glrlm.asList(), rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(cliFeatures[FeatureType.BM], features.bm.asList(), rtol=1e-4, atol=1e-6)
+
+        # Only the parameters of the features CLIs can be swept
+        self.assertEqual(len(logic.getParameterGrid(FeatureType.GLRLM, {'binNumber': [16, 32], 'distanceMax': [1, 2, 3]})), 6)
+        with self.assertRaises(ValueError):
+            logic.getParameterGrid(FeatureType.GLCM, {'neighborhoodRadius': [2, 4, 6]})
+        self.delayDisplay("Test passed")
+
+    def test_BoneTexture2(self):
+        """ A cohort of separated texture maps, computed again from the cache."""
         self.delayDisplay("Starting the test")
+        import numpy as np
+
+        with tempfile.TemporaryDirectory(dir=slicer.app.temporaryPath) as temporaryDir:
+            scanArray = np.zeros((12, 12, 12), dtype=np.int16)
+            scanArray[:, :, (np.arange(12) % 4) < 2] = 1500
+            maskArray = np.zeros(scanArray.shape, dtype=np.uint8)
+            maskArray[2:10, 2:10, 2:10] = 1
+            scanFile = os.path.join(temporaryDir, "Scan.nrrd")
+            labelMapFile = os.path.join(temporaryDir, "Mask.nrrd")
+            sitk.WriteImage(sitk.GetImageFromArray(scanArray), scanFile)
+            sitk.WriteImage(sitk.GetImageFromArray(maskArray), labelMapFile)
+            outputDir = os.path.join(temporaryDir, "Maps")
+            os.makedirs(outputDir)
+
+            logic = BoneTextureLogic()
+            featureParameters = {FeatureType.BM: dict(logic.getDefaultFeatureParameters(FeatureType.BM), neighborhoodRadius=1)}
+            arguments = dict(inputData=[(scanFile, labelMapFile)], featureParameters=featureParameters,
+                             outputDir=outputDir, separateFeatures=True,
+                             cacheDirectory=os.path.join(temporaryDir, "Cache"))
+            logic.computeTextureMapsSerializerMode(**arguments)
+            mapFiles = [os.path.join(outputDir, fileName) for fileName in separatedFeatureFileNames("BM_Scan", 5)]
+            self.assertEqual(sorted(os.listdir(outputDir)), sorted(os.path.basename(fileName) for fileName in mapFiles))
+
+            # The second run finds the maps of the case in the cache and does not write them again
+            modificationTimes = [os.stat(fileName).st_mtime_ns for fileName in mapFiles]
+            logic.computeTextureMapsSerializerMode(**arguments)
+            self.assertEqual([os.stat(fileName).st_mtime_ns for fileName in mapFiles], modificationTimes)
+        self.delayDisplay("Test passed")
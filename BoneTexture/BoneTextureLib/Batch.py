@@ -0,0 +1,61 @@
+"""
+Headless batch processing of a cohort with the BoneTexture pipeline.
+
+Runs the serializer mode of the module without its GUI, for example on a compute node:
+
+    Slicer --no-main-window --python-script BoneTextureLib/Batch.py \
+        --input-dir /data/cohort --parameters parameters.json --output-dir /data/results --workers 8
+
+The input directory follows the naming convention of the serializer mode (Scan_<ID>.nrrd and
+the optional Seg_<ID>.nrrd), and the parameter file is described in
+BoneTextureLogic.readBatchParameters. Results already computed in the output directory with the
+same settings are not recomputed, unless --no-cache is given. --memory-limit keeps the estimated
+memory of the computations running at the same time within the given number of GB.
+"""
+
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute the texture features and texture maps of a cohort.")
+    parser.add_argument("--input-dir", required=True,
+                        help="Directory of the Scan_<ID> and Seg_<ID> volumes")
+    parser.add_argument("--parameters", required=True,
+                        help="JSON file of the features to compute and of their parameters")
+    parser.add_argument("--output-dir", required=True,
+                        help="Directory of the feature table and of the texture maps")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of cases whose features are computed at the same time")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute all the results, even those found in the output directory")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="Memory available to the computations, in GB. Fewer cases are processed at the same "
+                             "time and large texture maps are computed by slabs to stay within it")
+    # Slicer forwards the arguments following the script, possibly after a '--' separator
+    if argv and argv[0] == "--":
+        argv = argv[1:]
+    args = parser.parse_args(argv)
+
+    # Only available in the Slicer Python environment
+    from BoneTexture import BoneTextureLogic
+
+    try:
+        BoneTextureLogic().runBatch(args.input_dir,
+                                    args.parameters,
+                                    args.output_dir,
+                                    numberOfWorkers=args.workers,
+                                    useCache=not args.no_cache,
+                                    memoryLimit=int(args.memory_limit * 2**30) if args.memory_limit else None)
+    except (OSError, ValueError, KeyError) as error:
+        logging.error("BoneTexture batch processing failed: %s" % error)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exitCode = main(sys.argv[1:])
+    import slicer
+    slicer.util.exit(exitCode)
@@ -0,0 +1,53 @@
+"""
+Names of the files written when a feature map is separated into one image per feature.
+
+SeparateVectorImage writes each component of a map as '<base name>_<feature>.nrrd', the
+features being named after the CamelCase lists below. As the map files do not store their
+feature families, the names are chosen from the number of components of the map: the
+combined maps hold the GLCM, GLRLM and BM components in that order, and the components of
+other maps are numbered from 1. The lists must be kept in sync with SeparateVectorImage.cxx.
+"""
+
+from typing import List
+
+__all__ = [
+    "GLCMFeatureFileNames",
+    "GLRLMFeatureFileNames",
+    "BMFeatureFileNames",
+    "separatedFeatureNames",
+    "separatedFeatureFileNames",
+]
+
+GLCMFeatureFileNames = ["Energy", "Entropy", "Correlation", "InverseDifferenceMoment",
+                        "Inertia", "ClusterShade", "ClusterProminence", "HaralickCorrelation"]
+
+GLRLMFeatureFileNames = ["ShortRunEmphasis", "LongRunEmphasis",
+                         "GreyLevelNonuniformity", "RunLengthNonuniformity",
+                         "LowGreyLevelRunEmphasis", "HighGreyLevelRunEmphasis",
+                         "ShortRunLowGreyLevelEmphasis", "ShortRunHighGreyLevelEmphasis",
+                         "LongRunLowGreyLevelEmphasis", "LongRunHighGreyLevelEmphasis"]
+
+BMFeatureFileNames = ["BoneVolumeDensity", "TrabecularThickness",
+                      "TrabecularSeparation", "TrabecularNumber", "BoneSurfaceDensity"]
+
+
+def separatedFeatureNames(numberOfComponents: int) -> List[str]:
+    """ Returns the suffixes SeparateVectorImage gives to the components of a map."""
+    combinations = [
+        GLCMFeatureFileNames,
+        GLRLMFeatureFileNames,
+        BMFeatureFileNames,
+        GLCMFeatureFileNames + GLRLMFeatureFileNames,
+        GLCMFeatureFileNames + BMFeatureFileNames,
+        GLRLMFeatureFileNames + BMFeatureFileNames,
+        GLCMFeatureFileNames + GLRLMFeatureFileNames + BMFeatureFileNames,
+    ]
+    for names in combinations:
+        if len(names) == numberOfComponents:
+            return list(names)
+    return [str(component) for component in range(1, numberOfComponents + 1)]
+
+
+def separatedFeatureFileNames(baseName: str, numberOfComponents: int) -> List[str]:
+    """ Returns the names of the files SeparateVectorImage writes for a map of outputFileBaseName baseName."""
+    return [f"{baseName}_{name}.nrrd" for name in separatedFeatureNames(numberOfComponents)]
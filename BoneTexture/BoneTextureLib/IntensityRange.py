@@ -0,0 +1,79 @@
+"""
+Intensity range of a scan, optionally restricted to a mask, used to set the histogram
+bounds of the GLCM and GLRLM features.
+
+The functions work directly on the NumPy arrays returned by slicer.util.arrayFromVolume.
+The minimum and maximum are computed together, block by block, so that each block of the
+scan and of the mask is read from memory once and no masked copy of the scan is made.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+__all__ = [
+    "computeIntensityRange",
+]
+
+# Number of voxels processed at once, small enough for a block to stay in cache
+_blockSize = 1 << 18
+
+
+def _blocks(array: np.ndarray):
+    flat = array.reshape(-1)
+    for start in range(0, flat.size, _blockSize):
+        yield start, flat[start:start + _blockSize]
+
+
+def _inside(mask: np.ndarray, label: Optional[int]) -> np.ndarray:
+    return mask != 0 if label is None else mask == label
+
+
+def _minMax(array: np.ndarray, mask: Optional[np.ndarray], label: Optional[int]) -> Tuple[float, float]:
+    minimum = None
+    maximum = None
+    flatMask = mask.reshape(-1) if mask is not None else None
+    for start, block in _blocks(array):
+        if flatMask is not None:
+            block = block[_inside(flatMask[start:start + block.size], label)]
+            if block.size == 0:
+                continue
+        blockMin = block.min()
+        blockMax = block.max()
+        minimum = blockMin if minimum is None else min(minimum, blockMin)
+        maximum = blockMax if maximum is None else max(maximum, blockMax)
+    if minimum is None:
+        raise ValueError("The mask does not contain any voxel")
+    return float(minimum), float(maximum)
+
+
+def computeIntensityRange(array: np.ndarray,
+                          mask: Optional[np.ndarray] = None,
+                          label: Optional[int] = None,
+                          lowerPercentile: float = 0.0,
+                          upperPercentile: float = 100.0) -> Tuple[float, float]:
+    """
+    Returns the (min, max) intensity of the voxels of array inside the mask: the voxels whose
+    mask value is label, or any non-zero value when label is None. The whole array is used
+    when no mask is given.
+
+    Robust bounds are returned when percentiles other than 0 and 100 are given, e.g. (0.5, 99.5)
+    to ignore the outliers of a scan in the histogram range.
+    """
+    if mask is not None and mask.shape != array.shape:
+        raise ValueError("The mask array must have the same shape as the input array")
+    if not 0.0 <= lowerPercentile <= upperPercentile <= 100.0:
+        raise ValueError("The percentiles must satisfy 0 <= lowerPercentile <= upperPercentile <= 100")
+
+    array = np.ascontiguousarray(array)
+    if mask is not None:
+        mask = np.ascontiguousarray(mask)
+
+    if lowerPercentile == 0.0 and upperPercentile == 100.0:
+        return _minMax(array, mask, label)
+
+    values = array.reshape(-1) if mask is None else array[_inside(mask, label)]
+    if values.size == 0:
+        raise ValueError("The mask does not contain any voxel")
+    lower, upper = np.percentile(values, (lowerPercentile, upperPercentile))
+    return float(lower), float(upper)
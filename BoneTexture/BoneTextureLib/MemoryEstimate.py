@@ -0,0 +1,146 @@
+"""
+Estimates of the peak memory of the CLIs, used to run the cohorts under a memory limit.
+
+The estimates follow how the CLIs hold their images: the scan is read whole with its pixel
+type, the mask is converted to a compact image, and the feature maps are float vectors of
+one component per feature (8 for GLCM, 10 for GLRLM, 5 for BM). The "fast" computation
+engines also index the region they compute, padded by its neighborhoods, while the ITK filters
+do not. They are upper bounds of the images, plus a fixed allowance for the process itself,
+and do not depend on the number of threads. Sizes are given as (x, y, z) in voxels, the slabs
+splitting the volume along z.
+"""
+
+from typing import Optional, Sequence
+
+__all__ = [
+    "processMemoryOverhead",
+    "engineVoxelBytes",
+    "estimateFeaturesMemory",
+    "estimateFeatureMapMemory",
+    "estimateSeparateFeaturesMemory",
+    "chooseSlabSize",
+]
+
+# Memory used by a CLI process besides its images: executable, ITK and thread stacks
+processMemoryOverhead = 256 * 2**20
+
+# Bytes per value of the feature maps computed by the filters
+_mapValueBytes = 4
+
+# Bytes per voxel of the padded region indexed by the "fast" engine of each feature family,
+# up to 127 bins and a neighborhood radius of 127: the bins for GLCM, the bins and the run
+# lengths of the 13 directions for GLRLM, and the 5 summed-area tables of 4 bytes and the
+# inside and bone voxels for BM
+engineVoxelBytes = {
+    "GLCM": 1,
+    "GLRLM": 14,
+    "BM": 22,
+}
+
+
+def _numberOfVoxels(size: Sequence[int]) -> int:
+    numberOfVoxels = 1
+    for length in size:
+        numberOfVoxels *= int(length)
+    return numberOfVoxels
+
+
+def estimateFeaturesMemory(size: Sequence[int], pixelBytes: int, labelMapBytes: int = 0) -> int:
+    """
+    Returns the peak memory, in bytes, of a features CLI (GLCM, GLRLM or BM features of the
+    labels of a mask) for a scan of the given size and bytes per voxel. labelMapBytes is the
+    number of bytes per voxel of the label map file, 0 without mask.
+    """
+    numberOfVoxels = _numberOfVoxels(size)
+    # The scan, the labels while they are read, and the mask with the pixel type of the scan
+    images = numberOfVoxels * pixelBytes
+    if labelMapBytes:
+        images += numberOfVoxels * (labelMapBytes + pixelBytes)
+    return images + processMemoryOverhead
+
+
+def estimateFeatureMapMemory(size: Sequence[int],
+                             pixelBytes: int,
+                             numberOfComponents: int,
+                             neighborhoodRadius: int,
+                             labelMapBytes: int = 0,
+                             slabSize: int = 0,
+                             outputPrecision: str = "float32",
+                             computationEngine: str = "filter",
+                             featureTypes: Sequence[str] = (),
+                             samplingStride: int = 1) -> int:
+    """
+    Returns the peak memory, in bytes, of a feature map CLI computing a map of numberOfComponents
+    features for a scan of the given size and bytes per voxel, with a mask whose file has
+    labelMapBytes bytes per voxel (0 without mask). The map of the whole volume is computed
+    at once when slabSize is 0, otherwise slabSize slices at a time. With the "fast"
+    computationEngine, the index of the largest of the featureTypes engines, which run one
+    after the other, is added.
+    """
+    sliceVoxels = _numberOfVoxels(size[:2])
+    numberOfSlices = int(size[2])
+    numberOfVoxels = sliceVoxels * numberOfSlices
+
+    # The scan is read whole when its file cannot be streamed, as are the labels of a slabbed map
+    images = numberOfVoxels * pixelBytes
+    if slabSize > 0:
+        # Each slab is padded by the neighborhood radius, plus the sampling stride
+        mapVoxels = sliceVoxels * min(numberOfSlices, slabSize + 2 * (neighborhoodRadius + max(samplingStride, 1)))
+        if labelMapBytes:
+            images += numberOfVoxels * labelMapBytes + mapVoxels
+    else:
+        mapVoxels = numberOfVoxels
+        if labelMapBytes:
+            images += numberOfVoxels
+    # The map of the bounding box of the mask and the map it is pasted in, which may be as large
+    maps = 2 * mapVoxels * numberOfComponents * _mapValueBytes
+    if outputPrecision in ("float16", "fixed16") and slabSize <= 0:
+        maps += mapVoxels * numberOfComponents * 2
+    # The engines index at most the input of the map, the padded slab or the whole volume
+    engine = 0
+    if computationEngine == "fast":
+        engine = mapVoxels * max([engineVoxelBytes.get(featureType, 0) for featureType in featureTypes] + [0])
+    return images + maps + engine + processMemoryOverhead
+
+
+def estimateSeparateFeaturesMemory(size: Sequence[int], numberOfComponents: int) -> int:
+    """
+    Returns the peak memory, in bytes, of separating a feature map of the given size into one
+    image per feature (SeparateVectorImage): the map and the images of its features.
+    """
+    return 2 * _numberOfVoxels(size) * numberOfComponents * _mapValueBytes + processMemoryOverhead
+
+
+def chooseSlabSize(size: Sequence[int],
+                   pixelBytes: int,
+                   numberOfComponents: int,
+                   neighborhoodRadius: int,
+                   memoryLimit: int,
+                   labelMapBytes: int = 0,
+                   outputPrecision: str = "float32",
+                   computationEngine: str = "filter",
+                   featureTypes: Sequence[str] = (),
+                   samplingStride: int = 1) -> Optional[int]:
+    """
+    Returns the slab size to compute a feature map within memoryLimit bytes (see
+    estimateFeatureMapMemory): 0 when the whole map fits, the largest number of slices that
+    fits otherwise, and None when even single slices do not fit.
+    """
+    def estimate(slabSize):
+        return estimateFeatureMapMemory(size, pixelBytes, numberOfComponents, neighborhoodRadius,
+                                        labelMapBytes, slabSize, outputPrecision,
+                                        computationEngine, featureTypes, samplingStride)
+
+    if estimate(0) <= memoryLimit:
+        return 0
+    if estimate(1) > memoryLimit:
+        return None
+    # The estimate grows with the slab size
+    low, high = 1, max(1, int(size[2]))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate(middle) <= memoryLimit:
+            low = middle
+        else:
+            high = middle - 1
+    return low
@@ -0,0 +1,85 @@
+"""
+Quantization of a scan into the histogram bins of the GLCM and GLRLM features.
+
+The features CLIs count the voxels of the scan in [pixelIntensityMin, pixelIntensityMax],
+the maximum included, and digitize them into binNumber bins of the same width. The bins of
+ComputeGLCMFeatures split [pixelIntensityMin, pixelIntensityMax + 1[, as the co-occurrence
+filter of ITK does for integer pixels, and the ones of ComputeGLRLMFeatures split
+[pixelIntensityMin, pixelIntensityMax], the maximum falling in the last bin. A scan quantized
+once into a compact volume of bin codes for a feature family can be given to its CLI in place
+of the scan, with the parameters of quantizedIntensityParameters: the features are the same,
+and the volume is shared by the runs using the same binning (e.g. a sweep over the
+neighborhood radius or the distances).
+"""
+
+from typing import Dict
+
+import numpy as np
+
+__all__ = [
+    "maximumNumberOfQuantizedBins",
+    "quantizeIntensities",
+    "quantizedIntensityParameters",
+]
+
+# The codes are stored on 16 bits at most, code 0 being the voxels out of the range
+maximumNumberOfQuantizedBins = 65534
+
+# Number of voxels processed at once, small enough for a block to stay in cache
+_blockSize = 1 << 18
+
+
+def _binUpperBound(maximum: int, featureType: str) -> int:
+    """ Upper bound of the bins of the features CLI of featureType, for a maximum intensity."""
+    if featureType == "GLCM":
+        return maximum + 1
+    if featureType == "GLRLM":
+        return maximum
+    raise ValueError("Only the GLCM and GLRLM features have intensity bins, not %s" % featureType)
+
+
+def quantizeIntensities(array: np.ndarray, minimum: int, maximum: int, numberOfBins: int,
+                        featureType: str) -> np.ndarray:
+    """
+    Returns the bin codes of the voxels of array for the features CLI of featureType ("GLCM" or
+    "GLRLM"): 0 out of [minimum, maximum], and bin + 1 in it. The bins are computed as by the
+    histograms of the CLIs, in double precision from the integer parameters, so that they match.
+    The codes are unsigned char when the CLIs can process them as such, unsigned short otherwise.
+    """
+    if not 1 <= numberOfBins <= maximumNumberOfQuantizedBins:
+        raise ValueError("The number of bins must be between 1 and %d" % maximumNumberOfQuantizedBins)
+    upper = _binUpperBound(maximum, featureType)
+    codeType = np.uint8 if numberOfBins + 1 <= np.iinfo(np.uint8).max else np.uint16
+    width = (upper - minimum) / numberOfBins
+
+    array = np.ascontiguousarray(array)
+    codes = np.empty(array.shape, dtype=codeType)
+    flatArray = array.reshape(-1)
+    flatCodes = codes.reshape(-1)
+    for start in range(0, flatArray.size, _blockSize):
+        block = flatArray[start:start + _blockSize].astype(np.float64)
+        inside = (block >= minimum) & (block <= maximum)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            bins = np.floor((block - minimum) / width) if width > 0 else np.zeros(block.shape)
+            bins = np.clip(np.where(inside, bins, 0), 0, numberOfBins - 1).astype(np.int64)
+        flatCodes[start:start + block.size] = np.where(inside, bins + 1, 0)
+    return codes
+
+
+def quantizedIntensityParameters(numberOfBins: int, featureType: str) -> Dict[str, int]:
+    """
+    Returns the histogram range to give to the features CLI of featureType with a volume of
+    quantizeIntensities: a bin of width 1 per code, code 0 being out of the range.
+    """
+    # Codes 1 to numberOfBins in bins of width 1 over [1, numberOfBins + 1[, whose upper bound is
+    # the maximum plus one for GLCM and the maximum for GLRLM
+    maximum = numberOfBins + 1
+    if featureType == "GLCM":
+        maximum -= 1
+    elif featureType != "GLRLM":
+        raise ValueError("Only the GLCM and GLRLM features have intensity bins, not %s" % featureType)
+    return {
+        'pixelIntensityMin': 1,
+        'pixelIntensityMax': maximum,
+        'binNumber': numberOfBins,
+    }
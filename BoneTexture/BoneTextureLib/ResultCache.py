@@ -0,0 +1,108 @@
+"""
+Content-addressed cache of the results of the serializer mode.
+
+Each result is stored as a small JSON file named after a hash of everything it
+depends on: the content of the input files, the kind of result (feature type,
+texture maps, ...) and its parameters. Interrupted or repeated cohort runs can
+then skip the cases that were already computed with the same settings, and a
+parameter change only invalidates the results of the affected feature family.
+Intermediate volumes, such as the quantized scans, are stored the same way.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+__all__ = [
+    "ResultCache",
+]
+
+
+class ResultCache:
+    """
+    Results are stored in 'directory' as '<key[:2]>/<key>.json'. Writes are atomic, so a run
+    interrupted in the middle of a write never leaves a truncated entry behind, and the cache
+    can be used from several threads.
+    """
+
+    # Bumped when the layout of the entries, or the way their keys are computed, changes
+    version = 1
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._fileDigests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def fileDigest(self, fileName: str) -> str:
+        """
+        Returns the SHA-256 of the content of a file. Digests are memoized on the path, size
+        and modification time of the file, so that each input is read once per run.
+        """
+        status = os.stat(fileName)
+        memoKey = (os.path.abspath(fileName), status.st_size, status.st_mtime_ns)
+        with self._lock:
+            if memoKey in self._fileDigests:
+                return self._fileDigests[memoKey]
+
+        digest = hashlib.sha256()
+        with open(fileName, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 22), b''):
+                digest.update(block)
+        digest = digest.hexdigest()
+
+        with self._lock:
+            self._fileDigests[memoKey] = digest
+        return digest
+
+    def key(self, inputFiles: Sequence[Optional[str]], resultType: str, parameters: Dict[str, Any]) -> str:
+        """
+        Returns the key of a result computed from inputFiles (None for a missing optional input)
+        with the given parameters. Only the content of the files is used, not their name.
+        """
+        description = {
+            'version': self.version,
+            'inputs': [self.fileDigest(fileName) if fileName else None for fileName in inputFiles],
+            'resultType': resultType,
+            'parameters': parameters,
+        }
+        # Values from NumPy (e.g. intensity ranges) are not JSON serializable: use their text
+        serialized = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def entryFileName(self, key: str, extension: str = '.json') -> str:
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def get(self, key: str) -> Optional[Any]:
+        """ Returns the cached value, or None if there is no (readable) entry for the key."""
+        try:
+            with open(self.entryFileName(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def getFiles(self, key: str, directory: str) -> Optional[List[str]]:
+        """
+        Returns the cached list of the names of files written in directory, or None if there is
+        no entry for the key or if one of the files is missing.
+        """
+        fileNames = self.get(key)
+        if not fileNames or not all(os.path.isfile(os.path.join(directory, fileName)) for fileName in fileNames):
+            return None
+        return fileNames
+
+    def put(self, key: str, value: Any) -> None:
+        """ Stores a JSON serializable value."""
+        fileName = self.entryFileName(key)
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+        descriptor, temporaryFileName = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(fileName))
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(value, file)
+            os.replace(temporaryFileName, fileName)
+        except BaseException:
+            if os.path.exists(temporaryFileName):
+                os.remove(temporaryFileName)
+            raise
@@ -0,0 +1,367 @@
+"""
+In-process computation of the scalar texture features of a region of interest.
+
+The functions of this module work directly on the NumPy arrays returned by
+slicer.util.arrayFromVolume (indexed [k, j, i]) and follow the definitions of the
+ITK filters used by the ComputeGLCMFeatures, ComputeGLRLMFeatures and
+ComputeBMFeatures CLIs, so that many small regions can be processed without
+writing temporary volumes or starting a CLI process for each of them.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = [
+    "GLCMFeatures",
+    "GLRLMFeatures",
+    "BMFeatures",
+    "TextureFeatures",
+    "computeGLCMFeatures",
+    "computeGLRLMFeatures",
+    "computeBMFeatures",
+    "computeTextureFeatures",
+]
+
+
+@dataclass
+class GLCMFeatures:
+    energy: float
+    entropy: float
+    correlation: float
+    inverseDifferenceMoment: float
+    inertia: float
+    clusterShade: float
+    clusterProminence: float
+    haralickCorrelation: float
+
+    def asList(self) -> List[float]:
+        """ Returns the feature values in the order of the ComputeGLCMFeatures output vector """
+        return list(dataclasses.astuple(self))
+
+
+@dataclass
+class GLRLMFeatures:
+    shortRunEmphasis: float
+    longRunEmphasis: float
+    greyLevelNonuniformity: float
+    runLengthNonuniformity: float
+    lowGreyLevelRunEmphasis: float
+    highGreyLevelRunEmphasis: float
+    shortRunLowGreyLevelEmphasis: float
+    shortRunHighGreyLevelEmphasis: float
+    longRunLowGreyLevelEmphasis: float
+    longRunHighGreyLevelEmphasis: float
+
+    def asList(self) -> List[float]:
+        """ Returns the feature values in the order of the ComputeGLRLMFeatures output vector """
+        return list(dataclasses.astuple(self))
+
+
+@dataclass
+class BMFeatures:
+    boneVolumeDensity: float
+    trabecularThickness: float
+    trabecularSeparation: float
+    trabecularNumber: float
+    boneSurfaceDensity: float
+
+    def asList(self) -> List[float]:
+        """ Returns the feature values in the order of the ComputeBMFeatures output vector """
+        return list(dataclasses.astuple(self))
+
+
+@dataclass
+class TextureFeatures:
+    """ Features of the families that were requested, None for the others """
+    glcm: Optional[GLCMFeatures] = None
+    glrlm: Optional[GLRLMFeatures] = None
+    bm: Optional[BMFeatures] = None
+
+
+# ----------------------------- Helpers ------------------------------------ #
+
+def _defaultOffsets() -> List[Tuple[int, int, int]]:
+    """
+    Returns the 13 offsets used by default by the ITK co-occurrence and run length
+    filters: the "previous" half of the 26-neighborhood, in array (k, j, i) order.
+    """
+    offsets = []
+    for d in range(13):
+        x, y, z = d % 3 - 1, (d // 3) % 3 - 1, d // 9 - 1
+        offsets.append((z, y, x))
+    return offsets
+
+
+def _shiftedSlices(shape: Sequence[int], offset: Sequence[int]):
+    """
+    Returns the slices (source, destination) such that array[destination] holds the
+    neighbors at the given offset of the voxels array[source], for every voxel whose
+    neighbor lies inside the array.
+    """
+    source = []
+    destination = []
+    for size, o in zip(shape, offset):
+        source.append(slice(max(0, -o), size - max(0, o)))
+        destination.append(slice(max(0, o), size - max(0, -o)))
+    return tuple(source), tuple(destination)
+
+
+def _binIndices(values: np.ndarray, lower: float, upper: float, numberOfBins: int) -> np.ndarray:
+    """ Index of the histogram bin of each value, for equal width bins over [lower, upper) """
+    binWidth = (upper - lower) / numberOfBins
+    if binWidth <= 0:
+        return np.zeros(values.shape, dtype=np.int64)
+    indices = np.floor((values - lower) / binWidth).astype(np.int64)
+    return np.clip(indices, 0, numberOfBins - 1)
+
+
+def _insideMask(array: np.ndarray, mask: Optional[np.ndarray], insideMask) -> np.ndarray:
+    if mask is None:
+        return np.ones(array.shape, dtype=bool)
+    if mask.shape != array.shape:
+        raise ValueError("The mask array must have the same shape as the input array")
+    return mask == insideMask
+
+
+# ------------------------------- GLCM ------------------------------------- #
+
+def _glcmFeaturesFromMatrix(matrix: np.ndarray) -> np.ndarray:
+    """ Texture features of a co-occurrence matrix, as computed by itk::HistogramToTextureFeaturesFilter """
+    if matrix.sum() == 0:
+        return np.full(8, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequencies = matrix / matrix.sum()
+        i, j = np.indices(matrix.shape, dtype=np.float64)
+
+        pixelMean = (i * frequencies).sum()
+        marginalSums = frequencies.sum(axis=1)
+        marginalMean = marginalSums.mean()
+        marginalDevSquared = marginalSums.var()
+        pixelVariance = ((i - pixelMean) ** 2 * frequencies).sum()
+
+        nonZero = frequencies > 0
+        p = frequencies[nonZero]
+        i = i[nonZero]
+        j = j[nonZero]
+
+        energy = (p * p).sum()
+        entropy = -(p[p > 0.0001] * np.log2(p[p > 0.0001])).sum()
+        correlation = ((i - pixelMean) * (j - pixelMean) * p).sum() / pixelVariance
+        inverseDifferenceMoment = (p / (1.0 + (i - j) ** 2)).sum()
+        inertia = ((i - j) ** 2 * p).sum()
+        clusterShade = (((i - pixelMean) + (j - pixelMean)) ** 3 * p).sum()
+        clusterProminence = (((i - pixelMean) + (j - pixelMean)) ** 4 * p).sum()
+        haralickCorrelation = ((i * j * p).sum() - marginalMean * marginalMean) / marginalDevSquared
+
+    return np.array([energy, entropy, correlation, inverseDifferenceMoment,
+                     inertia, clusterShade, clusterProminence, haralickCorrelation])
+
+
+def computeGLCMFeatures(array: np.ndarray,
+                        mask: Optional[np.ndarray] = None,
+                        insideMask: int = 1,
+                        binNumber: int = 10,
+                        pixelIntensityMin: float = 0,
+                        pixelIntensityMax: float = 4000) -> GLCMFeatures:
+    """
+    Computes the co-occurrence features of the voxels of array inside the mask.
+
+    As in itk::Statistics::ScalarImageToTextureFeaturesFilter, a symmetric co-occurrence
+    matrix is built for each of the 13 default offsets, with binNumber bins over
+    [pixelIntensityMin, pixelIntensityMax + 1), and the features are averaged over the offsets.
+    """
+    values = np.asarray(array, dtype=np.float64)
+    valid = _insideMask(values, mask, insideMask) & (values >= pixelIntensityMin) & (values <= pixelIntensityMax)
+    bins = _binIndices(values, pixelIntensityMin, pixelIntensityMax + 1, binNumber)
+
+    features = []
+    for offset in _defaultOffsets():
+        source, destination = _shiftedSlices(values.shape, offset)
+        pairs = valid[source] & valid[destination]
+        pairIndices = bins[source][pairs] * binNumber + bins[destination][pairs]
+        matrix = np.bincount(pairIndices, minlength=binNumber * binNumber).reshape(binNumber, binNumber)
+        features.append(_glcmFeaturesFromMatrix((matrix + matrix.T).astype(np.float64)))
+
+    return GLCMFeatures(*np.mean(features, axis=0).tolist())
+
+
+# ------------------------------- GLRLM ------------------------------------ #
+
+def _forwardRunLengths(continues: np.ndarray, offset: Sequence[int]) -> np.ndarray:
+    """
+    Returns for each voxel the number of voxels that follow it in its run along offset,
+    continues[p] being True when the voxel p + offset belongs to the same run as p.
+    """
+    lengths = np.zeros(continues.shape, dtype=np.int64)
+    axis = next(a for a, o in enumerate(offset) if o != 0)
+    step = offset[axis]
+    sliceOffset = [o for a, o in enumerate(offset) if a != axis]
+    sliceShape = [s for a, s in enumerate(continues.shape) if a != axis]
+    source, destination = _shiftedSlices(sliceShape, sliceOffset)
+
+    # Runs are accumulated backward, so that the length of the next voxel is known
+    n = continues.shape[axis]
+    positions = range(n - 1, -1, -1) if step > 0 else range(n)
+    for t in positions:
+        if not 0 <= t + step < n:
+            continue
+        current = np.take(continues, t, axis=axis)
+        nextLengths = np.take(lengths, t + step, axis=axis)
+        currentLengths = np.zeros(current.shape, dtype=np.int64)
+        currentLengths[source] = np.where(current[source], 1 + nextLengths[destination], 0)
+        index = [slice(None)] * continues.ndim
+        index[axis] = t
+        lengths[tuple(index)] = currentLengths
+    return lengths
+
+
+def _glrlmFeaturesFromMatrix(matrix: np.ndarray) -> np.ndarray:
+    """ Run length features of a run length matrix, as computed by itk::HistogramToRunLengthFeaturesFilter """
+    i, j = np.indices(matrix.shape, dtype=np.float64)
+    i2 = (i + 1) ** 2
+    j2 = (j + 1) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        totalNumberOfRuns = matrix.sum()
+        features = np.array([
+            (matrix / j2).sum(),
+            (matrix * j2).sum(),
+            (matrix.sum(axis=1) ** 2).sum(),
+            (matrix.sum(axis=0) ** 2).sum(),
+            (matrix / i2).sum(),
+            (matrix * i2).sum(),
+            (matrix / (i2 * j2)).sum(),
+            (matrix * i2 / j2).sum(),
+            (matrix * j2 / i2).sum(),
+            (matrix * i2 * j2).sum(),
+        ]) / totalNumberOfRuns
+    return features
+
+
+def computeGLRLMFeatures(array: np.ndarray,
+                         mask: Optional[np.ndarray] = None,
+                         spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                         insideMask: int = 1,
+                         binNumber: int = 10,
+                         pixelIntensityMin: float = 0,
+                         pixelIntensityMax: float = 4000,
+                         distanceMin: float = 0.0,
+                         distanceMax: float = 1.0) -> GLRLMFeatures:
+    """
+    Computes the run length features of the voxels of array inside the mask.
+
+    As in itk::Statistics::ScalarImageToRunLengthFeaturesFilter, a run length matrix is built
+    for each of the 13 default offsets and the features are averaged over the offsets. A run
+    is a chain of voxels falling in the same of the binNumber intensity bins over
+    [pixelIntensityMin, pixelIntensityMax], and its length is the physical distance between its
+    first and last voxels. spacing is given in (i, j, k) order, as returned by node.GetSpacing().
+    """
+    values = np.asarray(array, dtype=np.float64)
+    valid = _insideMask(values, mask, insideMask) & (values >= pixelIntensityMin) & (values <= pixelIntensityMax)
+    labels = np.where(valid, _binIndices(values, pixelIntensityMin, pixelIntensityMax, binNumber), -1)
+    arraySpacing = np.asarray(spacing, dtype=np.float64)[::-1]
+
+    features = []
+    for offset in _defaultOffsets():
+        # Runs are followed in the direction of increasing memory address
+        sign = next(1 if o > 0 else -1 for o in offset if o != 0)
+        offset = tuple(sign * o for o in offset)
+        stepLength = np.sqrt(((np.asarray(offset) * arraySpacing) ** 2).sum())
+
+        source, destination = _shiftedSlices(values.shape, offset)
+        continues = np.zeros(values.shape, dtype=bool)
+        continues[source] = (labels[source] == labels[destination]) & valid[source]
+        hasNext = np.zeros(values.shape, dtype=bool)
+        hasNext[source] = True
+
+        # A run starts on each voxel that does not continue the run of its predecessor.
+        # Like ITK, single voxel runs without any neighbor along the offset are ignored.
+        starts = valid.copy()
+        starts[destination] &= ~continues[source]
+        runLengths = _forwardRunLengths(continues, offset)[starts]
+        keep = (runLengths > 0) | hasNext[starts]
+        distances = runLengths[keep] * stepLength
+        runLabels = labels[starts][keep]
+
+        inRange = (distances >= distanceMin) & (distances <= distanceMax)
+        distanceBins = _binIndices(distances[inRange], distanceMin, distanceMax, binNumber)
+        matrix = np.bincount(runLabels[inRange] * binNumber + distanceBins,
+                             minlength=binNumber * binNumber).reshape(binNumber, binNumber)
+        features.append(_glrlmFeaturesFromMatrix(matrix.astype(np.float64)))
+
+    return GLRLMFeatures(*np.mean(features, axis=0).tolist())
+
+
+# -------------------------------- BM -------------------------------------- #
+
+def computeBMFeatures(array: np.ndarray,
+                      mask: Optional[np.ndarray] = None,
+                      spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                      threshold: float = 1) -> BMFeatures:
+    """
+    Computes the bone morphometry features of the voxels of array inside the mask (non-zero
+    mask voxels), voxels greater or equal to threshold being bone.
+
+    As in itk::BoneMorphometryFeaturesFilter, the features follow the parallel plate model
+    from the number of bone/background transitions per unit length along each axis.
+    spacing is given in (i, j, k) order, as returned by node.GetSpacing().
+    """
+    values = np.asarray(array)
+    inside = np.ones(values.shape, dtype=bool) if mask is None else (np.asarray(mask) != 0)
+    if inside.shape != values.shape:
+        raise ValueError("The mask array must have the same shape as the input array")
+    bone = values >= threshold
+    arraySpacing = np.asarray(spacing, dtype=np.float64)[::-1]
+
+    numberOfVoxels = float(inside.sum())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boneVolumeDensity = float((bone & inside).sum()) / numberOfVoxels
+
+        # Voxels outside of the image are background
+        transitionsPerLength = 0.0
+        for axis in range(values.ndim):
+            nextBone = np.zeros(values.shape, dtype=bool)
+            index = [slice(None)] * values.ndim
+            index[axis] = slice(0, -1)
+            nextIndex = [slice(None)] * values.ndim
+            nextIndex[axis] = slice(1, None)
+            nextBone[tuple(index)] = bone[tuple(nextIndex)]
+            transitions = float((inside & (bone != nextBone)).sum())
+            transitionsPerLength += transitions / (numberOfVoxels * arraySpacing[axis])
+        transitionsPerLength /= values.ndim
+
+        trabecularNumber = transitionsPerLength
+        trabecularThickness = boneVolumeDensity / transitionsPerLength
+        trabecularSeparation = (1.0 - boneVolumeDensity) / transitionsPerLength
+        boneSurfaceDensity = 2.0 * transitionsPerLength / boneVolumeDensity
+
+    return BMFeatures(float(boneVolumeDensity), float(trabecularThickness), float(trabecularSeparation),
+                      float(trabecularNumber), float(boneSurfaceDensity))
+
+
+# ------------------------------------------------------------------------------ #
+
+def computeTextureFeatures(array: np.ndarray,
+                           mask: Optional[np.ndarray] = None,
+                           spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                           GLCMParameters: Optional[dict] = None,
+                           GLRLMParameters: Optional[dict] = None,
+                           BMParameters: Optional[dict] = None) -> TextureFeatures:
+    """
+    Computes the features of each family for which parameters are given. The parameter
+    dictionaries use the names of the CLI parameters; neighborhoodRadius, which only applies
+    to feature maps, is ignored.
+    """
+    def withoutRadius(parameters):
+        return {key: value for key, value in parameters.items() if key != 'neighborhoodRadius'}
+
+    features = TextureFeatures()
+    if GLCMParameters is not None:
+        features.glcm = computeGLCMFeatures(array, mask, **withoutRadius(GLCMParameters))
+    if GLRLMParameters is not None:
+        features.glrlm = computeGLRLMFeatures(array, mask, spacing, **withoutRadius(GLRLMParameters))
+    if BMParameters is not None:
+        features.bm = computeBMFeatures(array, mask, spacing, **withoutRadius(BMParameters))
+    return features
@@ -0,0 +1,6 @@
+from .FeatureMapNames import *
+from .IntensityRange import *
+from .MemoryEstimate import *
+from .Quantization import *
+from .ResultCache import *
+from .TextureFeatures import *
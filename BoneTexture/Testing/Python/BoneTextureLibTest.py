@@ -0,0 +1,368 @@
+"""
+Unit tests of the BoneTextureLib helpers, which only depend on NumPy.
+
+They can be run in the Slicer Python environment (ctest) or in any Python environment
+with NumPy, e.g. `python -m unittest BoneTextureLibTest` from this directory.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+from BoneTextureLib import (  # noqa: E402
+    ResultCache,
+    chooseSlabSize,
+    computeBMFeatures,
+    computeGLCMFeatures,
+    computeGLRLMFeatures,
+    computeIntensityRange,
+    engineVoxelBytes,
+    estimateFeatureMapMemory,
+    estimateFeaturesMemory,
+    quantizeIntensities,
+    quantizedIntensityParameters,
+    separatedFeatureFileNames,
+    separatedFeatureNames,
+)
+from BoneTextureLib.TextureFeatures import (  # noqa: E402
+    _forwardRunLengths,
+    _glcmFeaturesFromMatrix,
+    _glrlmFeaturesFromMatrix,
+)
+
+
+class TextureFeaturesTest(unittest.TestCase):
+
+    def test_glcmFeaturesFromMatrix(self):
+        # Frequencies [[0.5, 0.25], [0.25, 0]]
+        features = _glcmFeaturesFromMatrix(np.array([[2.0, 1.0], [1.0, 0.0]]))
+        energy, entropy, _, inverseDifferenceMoment, inertia, _, _, _ = features
+        self.assertAlmostEqual(energy, 0.375)
+        self.assertAlmostEqual(entropy, 1.5)
+        self.assertAlmostEqual(inverseDifferenceMoment, 0.75)
+        self.assertAlmostEqual(inertia, 0.5)
+
+    def test_glcmConstantImage(self):
+        features = computeGLCMFeatures(np.full((4, 4, 4), 100), binNumber=8, pixelIntensityMin=0, pixelIntensityMax=255)
+        self.assertAlmostEqual(features.energy, 1.0)
+        self.assertAlmostEqual(features.entropy, 0.0)
+        self.assertAlmostEqual(features.inverseDifferenceMoment, 1.0)
+        self.assertAlmostEqual(features.inertia, 0.0)
+
+    def test_glcmMaskedVoxels(self):
+        # The voxels outside of the mask do not change the features
+        array = np.full((4, 4, 4), 10)
+        mask = np.ones(array.shape, dtype=np.uint8)
+        array[0] = 200
+        mask[0] = 0
+        features = computeGLCMFeatures(array, mask, binNumber=8, pixelIntensityMin=0, pixelIntensityMax=255)
+        self.assertAlmostEqual(features.energy, 1.0)
+        self.assertAlmostEqual(features.inertia, 0.0)
+
+    def test_glrlmFeaturesFromMatrix(self):
+        # A single run, in grey level bin 1 and length bin 1
+        matrix = np.zeros((2, 2))
+        matrix[1, 1] = 1
+        expected = [1 / 4, 4, 1, 1, 1 / 4, 4, 1 / 16, 1, 1, 16]
+        np.testing.assert_allclose(_glrlmFeaturesFromMatrix(matrix), expected)
+
+    def test_forwardRunLengths(self):
+        continues = np.array([[[True, True, False, False]]])
+        lengths = _forwardRunLengths(continues, (0, 0, 1))
+        np.testing.assert_array_equal(lengths.reshape(-1), [2, 1, 0, 0])
+
+    def test_glrlmConstantImage(self):
+        # All the runs are in the same grey level bin
+        features = computeGLRLMFeatures(np.full((3, 3, 3), 5), binNumber=4, pixelIntensityMin=0, pixelIntensityMax=20,
+                                        distanceMin=0, distanceMax=10)
+        self.assertAlmostEqual(features.lowGreyLevelRunEmphasis, 1.0 / (1 + 1) ** 2)
+        self.assertAlmostEqual(features.highGreyLevelRunEmphasis, (1 + 1) ** 2)
+
+    def test_bmFeatures(self):
+        # Two bone voxels followed by two background voxels along x, the voxels outside of
+        # the image being background
+        array = np.array([[[1, 1, 0, 0]]])
+        features = computeBMFeatures(array, threshold=1)
+        transitionsPerLength = (1 / 4 + 2 / 4 + 2 / 4) / 3
+        self.assertAlmostEqual(features.boneVolumeDensity, 0.5)
+        self.assertAlmostEqual(features.trabecularNumber, transitionsPerLength)
+        self.assertAlmostEqual(features.trabecularThickness, 0.5 / transitionsPerLength)
+        self.assertAlmostEqual(features.trabecularSeparation, 0.5 / transitionsPerLength)
+        self.assertAlmostEqual(features.boneSurfaceDensity, 2 * transitionsPerLength / 0.5)
+
+    def test_bmSpacing(self):
+        array = np.array([[[1, 1, 0, 0]]])
+        features = computeBMFeatures(array, spacing=(2.0, 1.0, 1.0), threshold=1)
+        self.assertAlmostEqual(features.trabecularNumber, (1 / 8 + 2 / 4 + 2 / 4) / 3)
+
+    def test_maskShape(self):
+        with self.assertRaises(ValueError):
+            computeBMFeatures(np.zeros((2, 2, 2)), np.zeros((2, 2, 3)))
+
+
+class IntensityRangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.array = np.arange(60, dtype=np.int16).reshape(3, 4, 5)
+        self.mask = np.zeros(self.array.shape, dtype=np.uint8)
+        self.mask[1] = 2
+        self.mask[2, 0] = 3
+
+    def test_wholeArray(self):
+        self.assertEqual(computeIntensityRange(self.array), (0.0, 59.0))
+
+    def test_label(self):
+        self.assertEqual(computeIntensityRange(self.array, self.mask, 2), (20.0, 39.0))
+        self.assertEqual(computeIntensityRange(self.array, self.mask, 3), (40.0, 44.0))
+
+    def test_nonZeroMask(self):
+        self.assertEqual(computeIntensityRange(self.array, self.mask), (20.0, 44.0))
+
+    def test_severalBlocks(self):
+        # Larger than a block of the implementation
+        array = np.zeros(1 << 20, dtype=np.float32)
+        array[-1] = 7.5
+        array[3] = -2.0
+        self.assertEqual(computeIntensityRange(array), (-2.0, 7.5))
+
+    def test_percentiles(self):
+        values = self.array[self.mask == 2]
+        expected = np.percentile(values, (10, 90))
+        np.testing.assert_allclose(computeIntensityRange(self.array, self.mask, 2, 10, 90), expected)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            computeIntensityRange(self.array, self.mask, 5)
+        with self.assertRaises(ValueError):
+            computeIntensityRange(self.array, self.mask, 5, 1, 99)
+        with self.assertRaises(ValueError):
+            computeIntensityRange(self.array, self.mask[:2])
+        with self.assertRaises(ValueError):
+            computeIntensityRange(self.array, lowerPercentile=60, upperPercentile=40)
+
+
+class QuantizationTest(unittest.TestCase):
+
+    def test_boundaries(self):
+        # Bins of width 10 over [0, 40[ for GLCM, of width 9.75 over [0, 39] for GLRLM, the maximum
+        # being in the range
+        array = np.array([-1, 0, 9, 10, 29, 30, 39, 40, 100], dtype=np.int16)
+        codes = quantizeIntensities(array, 0, 39, 4, 'GLCM')
+        np.testing.assert_array_equal(codes, [0, 1, 1, 2, 3, 4, 4, 0, 0])
+        self.assertEqual(codes.dtype, np.uint8)
+        np.testing.assert_array_equal(quantizeIntensities(array, 0, 39, 4, 'GLRLM'), [0, 1, 1, 2, 3, 4, 4, 0, 0])
+        np.testing.assert_array_equal(quantizeIntensities(array, 0, 40, 4, 'GLRLM'), [0, 1, 1, 2, 3, 4, 4, 4, 0])
+
+    def test_floatScan(self):
+        array = np.array([0.0, 9.99, 10.0, 39.999, 40.0, 40.5], dtype=np.float32)
+        np.testing.assert_array_equal(quantizeIntensities(array, 0, 39, 4, 'GLCM'), [1, 1, 2, 0, 0, 0])
+        np.testing.assert_array_equal(quantizeIntensities(array, 0, 40, 4, 'GLRLM'), [1, 1, 2, 4, 4, 0])
+
+    def test_codeType(self):
+        self.assertEqual(quantizeIntensities(np.zeros(3, dtype=np.uint8), 0, 1000, 254, 'GLCM').dtype, np.uint8)
+        self.assertEqual(quantizeIntensities(np.zeros(3, dtype=np.uint8), 0, 1000, 255, 'GLCM').dtype, np.uint16)
+        with self.assertRaises(ValueError):
+            quantizeIntensities(np.zeros(3), 0, 10, 0, 'GLCM')
+        with self.assertRaises(ValueError):
+            quantizeIntensities(np.zeros(3), 0, 10, 4, 'BM')
+        with self.assertRaises(ValueError):
+            quantizedIntensityParameters(4, 'BM')
+
+    def test_parameters(self):
+        # The codes of the bins are in their own bin of width 1
+        self.assertEqual(quantizedIntensityParameters(16, 'GLCM'),
+                         {'pixelIntensityMin': 1, 'pixelIntensityMax': 16, 'binNumber': 16})
+        self.assertEqual(quantizedIntensityParameters(16, 'GLRLM'),
+                         {'pixelIntensityMin': 1, 'pixelIntensityMax': 17, 'binNumber': 16})
+        for featureType in ('GLCM', 'GLRLM'):
+            parameters = quantizedIntensityParameters(16, featureType)
+            codes = quantizeIntensities(np.arange(-5, 165, dtype=np.int32), 0, 160, 16, featureType)
+            requantized = quantizeIntensities(codes, parameters['pixelIntensityMin'], parameters['pixelIntensityMax'],
+                                              parameters['binNumber'], featureType)
+            np.testing.assert_array_equal(requantized, codes)
+
+    def test_sameFeatures(self):
+        # The features of the quantized scan are the ones of the scan, the maximum included
+        random = np.random.RandomState(0)
+        array = random.randint(-100, 4101, size=(12, 12, 12)).astype(np.int16)
+        array[0, 0, :4] = 4000
+        array[6:9, 6:9, 6:9] = 4000
+        mask = (random.rand(12, 12, 12) < 0.8).astype(np.uint8)
+        spacing = (0.5, 0.5, 1.0)
+        for binNumber in (1, 10, 255):
+            glcmParameters = quantizedIntensityParameters(binNumber, 'GLCM')
+            glcmCodes = quantizeIntensities(array, 0, 4000, binNumber, 'GLCM')
+            np.testing.assert_allclose(
+                computeGLCMFeatures(glcmCodes, mask, **glcmParameters).asList(),
+                computeGLCMFeatures(array, mask, binNumber=binNumber, pixelIntensityMin=0, pixelIntensityMax=4000).asList(),
+                rtol=1e-12)
+            glrlmParameters = quantizedIntensityParameters(binNumber, 'GLRLM')
+            glrlmCodes = quantizeIntensities(array, 0, 4000, binNumber, 'GLRLM')
+            np.testing.assert_allclose(
+                computeGLRLMFeatures(glrlmCodes, mask, spacing, distanceMax=5.0, **glrlmParameters).asList(),
+                computeGLRLMFeatures(array, mask, spacing, binNumber=binNumber, pixelIntensityMin=0,
+                                     pixelIntensityMax=4000, distanceMax=5.0).asList(),
+                rtol=1e-12)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writeFile(self, name, content):
+        fileName = os.path.join(self.directory.name, name)
+        with open(fileName, 'wb') as file:
+            file.write(content)
+        return fileName
+
+    def test_keys(self):
+        first = self.writeFile('first.nrrd', b'scan')
+        second = self.writeFile('second.nrrd', b'scan')
+        other = self.writeFile('other.nrrd', b'other scan')
+        key = self.cache.key([first, None], 'FeaturesGLCM', {'binNumber': 10})
+        # Only the content of the files is used
+        self.assertEqual(key, self.cache.key([second, None], 'FeaturesGLCM', {'binNumber': 10}))
+        self.assertNotEqual(key, self.cache.key([other, None], 'FeaturesGLCM', {'binNumber': 10}))
+        self.assertNotEqual(key, self.cache.key([first, first], 'FeaturesGLCM', {'binNumber': 10}))
+        self.assertNotEqual(key, self.cache.key([first, None], 'FeaturesGLRLM', {'binNumber': 10}))
+        self.assertNotEqual(key, self.cache.key([first, None], 'FeaturesGLCM', {'binNumber': 20}))
+        # NumPy values are accepted
+        self.cache.key([first, None], 'FeaturesGLCM', {'pixelIntensityMax': np.float64(99.5)})
+
+    def test_modifiedFile(self):
+        fileName = self.writeFile('scan.nrrd', b'scan')
+        key = self.cache.key([fileName], 'TextureMaps', {})
+        status = os.stat(fileName)
+        self.writeFile('scan.nrrd', b'new scan')
+        os.utime(fileName, ns=(status.st_atime_ns, status.st_mtime_ns + 1000))
+        self.assertNotEqual(key, self.cache.key([fileName], 'TextureMaps', {}))
+
+    def test_getPut(self):
+        self.assertIsNone(self.cache.get('0123'))
+        self.cache.put('0123', [1.5, 'NaN'])
+        self.assertEqual(self.cache.get('0123'), [1.5, 'NaN'])
+        self.assertTrue(os.path.isfile(self.cache.entryFileName('0123')))
+
+    def test_unreadableEntry(self):
+        fileName = self.cache.entryFileName('abcd')
+        os.makedirs(os.path.dirname(fileName))
+        with open(fileName, 'w') as file:
+            file.write('{"truncated": ')
+        self.assertIsNone(self.cache.get('abcd'))
+        with self.assertRaises(TypeError):
+            self.cache.put('abcd', object())
+        # A failed write keeps no temporary file
+        self.assertEqual(os.listdir(os.path.dirname(fileName)), ['abcd.json'])
+
+
+    def test_resumeSeparatedMaps(self):
+        # A case whose map was separated: the files SeparateVectorImage writes, cached after the run
+        scanFile = self.writeFile('scan.nrrd', b'scan')
+        outputDir = os.path.join(self.directory.name, 'output')
+        os.makedirs(outputDir)
+        key = self.cache.key([scanFile, None], 'TextureMaps', {'separateFeatures': True})
+        outputFiles = separatedFeatureFileNames('GLCM_scan', 8)
+        for fileName in outputFiles:
+            self.writeFile(os.path.join('output', fileName), b'map')
+        self.assertIsNone(self.cache.getFiles(key, outputDir))
+        self.cache.put(key, outputFiles)
+
+        # The rerun finds the cached case
+        rerunKey = self.cache.key([scanFile, None], 'TextureMaps', {'separateFeatures': True})
+        self.assertEqual(self.cache.getFiles(rerunKey, outputDir), outputFiles)
+        # and computes it again when one of its files was removed
+        os.remove(os.path.join(outputDir, 'GLCM_scan_InverseDifferenceMoment.nrrd'))
+        self.assertIsNone(self.cache.getFiles(rerunKey, outputDir))
+
+
+class FeatureMapNamesTest(unittest.TestCase):
+
+    def test_fileNames(self):
+        self.assertEqual(separatedFeatureFileNames('BM_scan', 5)[0], 'BM_scan_BoneVolumeDensity.nrrd')
+        self.assertEqual(separatedFeatureNames(18)[7:9], ['HaralickCorrelation', 'ShortRunEmphasis'])
+        self.assertEqual(separatedFeatureNames(15)[-1], 'BoneSurfaceDensity')
+        self.assertEqual(len(separatedFeatureNames(23)), 23)
+        self.assertEqual(separatedFeatureNames(3), ['1', '2', '3'])
+
+    def test_sameNamesAsSeparateVectorImage(self):
+        sourceFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir,
+                                  'SeparateVectorImage', 'SeparateVectorImage.cxx')
+        if not os.path.isfile(sourceFile):
+            self.skipTest('SeparateVectorImage.cxx is not available')
+        with open(sourceFile) as file:
+            source = file.read()
+        for listName, numberOfComponents in (('GLCMFeatures', 8), ('RLFeatures', 10), ('BMFeatures', 5)):
+            names = re.search(r'std::vector<std::string> %s = \{([^}]*)\}' % listName, source).group(1)
+            self.assertEqual(re.findall(r'"(\w+)"', names), separatedFeatureNames(numberOfComponents))
+
+
+class MemoryEstimateTest(unittest.TestCase):
+
+    size = (512, 512, 400)
+
+    def estimate(self, slabSize):
+        return estimateFeatureMapMemory(self.size, 2, 8, 4, labelMapBytes=1, slabSize=slabSize)
+
+    def test_estimates(self):
+        numberOfVoxels = 512 * 512 * 400
+        self.assertGreater(estimateFeaturesMemory(self.size, 2, 1), numberOfVoxels * 2)
+        # The map of the whole volume is larger than the input, and the slabs bound it
+        self.assertGreater(self.estimate(0), numberOfVoxels * 8 * 4)
+        self.assertLess(self.estimate(10), self.estimate(0))
+        self.assertLess(self.estimate(10), self.estimate(20))
+
+    def test_slabSize(self):
+        limit = (self.estimate(0) + self.estimate(1)) // 2
+        slabSize = chooseSlabSize(self.size, 2, 8, 4, limit, labelMapBytes=1)
+        self.assertGreater(slabSize, 0)
+        self.assertLessEqual(self.estimate(slabSize), limit)
+        self.assertGreater(self.estimate(slabSize + 1), limit)
+
+    def test_wholeVolumeOrNothing(self):
+        self.assertEqual(chooseSlabSize(self.size, 2, 8, 4, self.estimate(0), labelMapBytes=1), 0)
+        self.assertIsNone(chooseSlabSize(self.size, 2, 8, 4, self.estimate(1) - 1, labelMapBytes=1))
+
+    def test_engines(self):
+        numberOfVoxels = 512 * 512 * 400
+        filterEstimate = self.estimate(0)
+        # The fast engines add the index of the largest engine of the map, the filters nothing
+        for featureTypes, voxelBytes in ((['GLCM'], 1), (['GLRLM'], 14), (['BM'], 22), (['GLCM', 'BM'], 22)):
+            fastEstimate = estimateFeatureMapMemory(self.size, 2, 8, 4, labelMapBytes=1, computationEngine='fast',
+                                                    featureTypes=featureTypes)
+            self.assertEqual(fastEstimate - filterEstimate, numberOfVoxels * voxelBytes)
+            self.assertEqual(engineVoxelBytes[featureTypes[-1]], voxelBytes)
+        self.assertEqual(estimateFeatureMapMemory(self.size, 2, 8, 4, labelMapBytes=1, computationEngine='filter',
+                                                  featureTypes=['GLRLM']), filterEstimate)
+
+    def test_engineSlabSize(self):
+        # The engine index takes memory, so the slabs of the fast engine are thinner
+        limit = (self.estimate(0) + self.estimate(1)) // 2
+        filterSlabSize = chooseSlabSize(self.size, 2, 8, 4, limit, labelMapBytes=1)
+        fastSlabSize = chooseSlabSize(self.size, 2, 8, 4, limit, labelMapBytes=1, computationEngine='fast',
+                                      featureTypes=['GLRLM'])
+        self.assertGreater(fastSlabSize, 0)
+        self.assertLess(fastSlabSize, filterSlabSize)
+        self.assertLessEqual(estimateFeatureMapMemory(self.size, 2, 8, 4, labelMapBytes=1, slabSize=fastSlabSize,
+                                                      computationEngine='fast', featureTypes=['GLRLM']), limit)
+
+    def test_samplingStridePadding(self):
+        # The slabs are padded by the radius plus the sampling stride: 2 more slices on each side
+        # for the two maps and the compact mask
+        sliceBytes = 512 * 512 * (8 * 4 * 2 + 1)
+        strided = estimateFeatureMapMemory(self.size, 2, 8, 4, labelMapBytes=1, slabSize=10, samplingStride=3)
+        self.assertEqual(strided - self.estimate(10), 2 * 2 * sliceBytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,6 +35,12 @@
 #include "itkBoneMorphometryFeaturesImageFilter.h"
 #include "itkReplaceFeatureMapNanInfImageFilter.h"
 
+#include "CompactMask.h"
+#include "FeatureMapEngine.h"
+#include "FeatureMapPipeline.h"
+#include "IntegralBoneMorphometryFeatures.h"
+#include "NativePixelTypes.h"
+
 #include "itkPluginUtilities.h"
 
 #include "ComputeBMFeatureMapsCLP.h"
@@ -52,51 +58,61 @@ int DoIt( int argc, char * argv[] )
   typedef TPixel                                 PixelType;
   typedef itk::Image< PixelType, Dimension >     InputImageType;
   typedef itk::VectorImage< float, Dimension >   OutputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
 
   typedef itk::Neighborhood<typename InputImageType::PixelType, InputImageType::ImageDimension> NeighborhoodType;
   NeighborhoodType hood;
-
-  typedef itk::ImageFileReader< InputImageType > ReaderType;
-  typename ReaderType::Pointer reader = ReaderType::New();
-  reader->SetFileName( inputVolume );
-  reader->Update();
-
-  typedef itk::BoneMorphometryFeaturesImageFilter<InputImageType, OutputImageType, InputImageType> FilterType;
-  typename FilterType::Pointer filter = FilterType::New();
-  filter->SetInput(reader->GetOutput());
-
-  if(inputMask != "")
-  {
-    typename ReaderType::Pointer maskReader = ReaderType::New();
-    maskReader->SetFileName( inputMask );
-    maskReader->Update();
-    filter->SetMaskImage(maskReader->GetOutput());
-  }
-
   hood.SetRadius(neighborhoodRadius);
-  filter->SetNeighborhoodRadius(hood.GetRadius());
-  filter->SetThreshold( threshold );
-  filter->Update();
 
+  typedef itk::BoneMorphometryFeaturesImageFilter<InputImageType, OutputImageType, MaskImageType> FilterType;
   typedef itk::ReplaceFeatureMapNanInfImageFilter<OutputImageType> PostProcessingFilterType;
-  PostProcessingFilterType::Pointer postProcessingFilter = PostProcessingFilterType::New();
-
-  postProcessingFilter->SetInput( filter->GetOutput() );
-  postProcessingFilter->Update();
-  
-  itk::MetaDataDictionary dictionary;
-  itk::EncapsulateMetaData<std::string>(dictionary,"DWMRI_b-value","1.0");
-  itk::EncapsulateMetaData<std::string>(dictionary,"modality","DWMRI");
-  postProcessingFilter->GetOutput()->SetMetaDataDictionary(dictionary);
-
-  typedef itk::ImageFileWriter< OutputImageType > WriterType;
-  typename WriterType::Pointer writer = WriterType::New();
-  writer->SetFileName( outputVolume );
-  writer->SetInput( postProcessingFilter->GetOutput() );
-  writer->SetUseCompression( true );
-  writer->Update();
+  typedef BoneTexture::IntegralBoneMorphometryFeatures< PixelType, MaskImageType::PixelType > EngineType;
 
-  return EXIT_SUCCESS;
+  // Feature map of a region of the volume, or of a slab of it
+  auto computeFeatureMap = [&]( const InputImageType * input,
+                                const MaskImageType * mask,
+                                const typename InputImageType::RegionType & region ) -> typename OutputImageType::Pointer
+  {
+    PostProcessingFilterType::Pointer postProcessingFilter = PostProcessingFilterType::New();
+    if( computationEngine == "fast" )
+    {
+      const EngineType engine( neighborhoodRadius, threshold, input->GetSpacing().GetDataPointer() );
+      postProcessingFilter->SetInput(
+        BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >( engine, input, mask, region ) );
+    }
+    else
+    {
+      typename FilterType::Pointer filter = FilterType::New();
+      filter->SetInput(input);
+      if( mask )
+      {
+        filter->SetMaskImage(mask);
+      }
+      filter->SetNeighborhoodRadius(hood.GetRadius());
+      filter->SetThreshold( threshold );
+      postProcessingFilter->SetInput( filter->GetOutput() );
+    }
+    postProcessingFilter->GetOutput()->SetRequestedRegion( region );
+    postProcessingFilter->Update();
+
+    typename OutputImageType::Pointer featureMap = postProcessingFilter->GetOutput();
+    featureMap->DisconnectPipeline();
+    return featureMap;
+  };
+
+  BoneTexture::FeatureMapPipelineOptions options;
+  options.inputVolume = inputVolume;
+  options.inputMask = inputMask;
+  options.insideMask = BoneTexture::MaskInsideValue;
+  options.outputVolume = outputVolume;
+  options.neighborhoodRadius = neighborhoodRadius;
+  options.samplingStride = samplingStride;
+  options.samplingOutput = samplingOutput;
+  options.maskCropping = maskCropping;
+  options.slabSize = slabSize;
+  options.outputPrecision = outputPrecision;
+  options.outputCompression = outputCompression;
+  return BoneTexture::ComputeFeatureMapPipeline< InputImageType, OutputImageType, MaskImageType >( options, computeFeatureMap );
 }
 
 } // end of anonymous namespace
@@ -115,15 +131,32 @@ int main( int argc, char * argv[] )
 
     itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+    // The scans are processed with their own pixel type when it can represent the
+    // intensity parameters, and as int otherwise
+    std::vector< double > intensityParameters;
+    intensityParameters.push_back( threshold );
+
     switch( inputComponentType )
       {
       case itk::ImageIOBase::UCHAR:
+        if( BoneTexture::CanRepresentValues< unsigned char >( intensityParameters ) )
+          {
+          return DoIt< unsigned char >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::USHORT:
+        if( BoneTexture::CanRepresentValues< unsigned short >( intensityParameters ) )
+          {
+          return DoIt< unsigned short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::SHORT:
+        if( BoneTexture::CanRepresentValues< short >( intensityParameters ) )
+          {
+          return DoIt< short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::FLOAT:
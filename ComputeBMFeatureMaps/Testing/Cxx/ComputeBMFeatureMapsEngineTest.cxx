@@ -0,0 +1,83 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+// Compares the bone morphometry feature maps of the "fast" computation engine with the
+// ones of itk::BoneMorphometryFeaturesImageFilter, on a small synthetic volume with a mask.
+
+#include "itkBoneMorphometryFeaturesImageFilter.h"
+#include "itkReplaceFeatureMapNanInfImageFilter.h"
+
+#include "CompactMask.h"
+#include "FeatureMapEngine.h"
+#include "FeatureMapEngineTesting.h"
+#include "IntegralBoneMorphometryFeatures.h"
+
+#include <cstdlib>
+
+int main( int, char *[] )
+{
+  const unsigned int Dimension = 3;
+  typedef short                                  PixelType;
+  typedef itk::Image< PixelType, Dimension >     InputImageType;
+  typedef itk::VectorImage< float, Dimension >   OutputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
+
+  typedef itk::BoneMorphometryFeaturesImageFilter< InputImageType, OutputImageType, MaskImageType > FilterType;
+  typedef itk::ReplaceFeatureMapNanInfImageFilter< OutputImageType > PostProcessingFilterType;
+  typedef BoneTexture::IntegralBoneMorphometryFeatures< PixelType, MaskImageType::PixelType > EngineType;
+
+  const unsigned int size = 16;
+  const unsigned int neighborhoodRadius = 2;
+  const PixelType threshold = 500;
+  InputImageType::Pointer input = BoneTexture::CreateTestVolume< InputImageType >( size );
+  MaskImageType::Pointer mask = BoneTexture::CreateTestMask< MaskImageType >( size, 6.0, BoneTexture::MaskInsideValue );
+
+  int status = EXIT_SUCCESS;
+  for( unsigned int masked = 0; masked < 2; ++masked )
+    {
+    const MaskImageType * testMask = masked ? mask.GetPointer() : nullptr;
+
+    FilterType::Pointer filter = FilterType::New();
+    filter->SetInput( input );
+    if( testMask )
+      {
+      filter->SetMaskImage( testMask );
+      }
+    InputImageType::SizeType radius;
+    radius.Fill( neighborhoodRadius );
+    filter->SetNeighborhoodRadius( radius );
+    filter->SetThreshold( threshold );
+    PostProcessingFilterType::Pointer filterPostProcessing = PostProcessingFilterType::New();
+    filterPostProcessing->SetInput( filter->GetOutput() );
+    filterPostProcessing->Update();
+
+    const EngineType engine( neighborhoodRadius, threshold, input->GetSpacing().GetDataPointer() );
+    PostProcessingFilterType::Pointer enginePostProcessing = PostProcessingFilterType::New();
+    enginePostProcessing->SetInput( BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >(
+      engine, input.GetPointer(), testMask, input->GetLargestPossibleRegion() ) );
+    enginePostProcessing->Update();
+
+    if( BoneTexture::CompareFeatureMaps< OutputImageType >( filterPostProcessing->GetOutput(),
+                                                            enginePostProcessing->GetOutput(), 1e-4 ) > 0 )
+      {
+      std::cerr << "The engine and the filter differ " << ( masked ? "with" : "without" ) << " mask" << std::endl;
+      status = EXIT_FAILURE;
+      }
+    }
+  return status;
+}
@@ -36,11 +36,33 @@
 
 #include "itkPluginUtilities.h"
 
+#include "CompactMask.h"
+#include "LabelFeatureTable.h"
+#include "NativePixelTypes.h"
+
 #include "ComputeBMFeaturesCLP.h"
 
 namespace
 {
 
+template< typename TImage, typename TMaskImage >
+typename itk::BoneMorphometryFeaturesFilter< TImage, TMaskImage >::Pointer
+CreateFeaturesFilter( const TImage * image, const TMaskImage * mask, int threshold )
+{
+  typedef itk::BoneMorphometryFeaturesFilter<TImage, TMaskImage> FilterType;
+  typename FilterType::Pointer filter = FilterType::New();
+  filter->SetInput(image);
+
+  if(mask)
+  {
+    filter->SetMaskImage(mask);
+  }
+
+  filter->SetThreshold( threshold );
+  filter->Update();
+  return filter;
+}
+
 template< typename TPixel >
 int DoIt( int argc, char * argv[] )
 {
@@ -50,26 +72,80 @@ int DoIt( int argc, char * argv[] )
 
   typedef TPixel                                 PixelType;
   typedef itk::Image< PixelType, Dimension >     InputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
+  typedef itk::Image< int, Dimension >           LabelImageType;
 
   typedef itk::ImageFileReader< InputImageType > ReaderType;
   typename ReaderType::Pointer reader = ReaderType::New();
   reader->SetFileName( inputVolume );
   reader->Update();
 
-  typedef itk::BoneMorphometryFeaturesFilter<InputImageType, InputImageType> FilterType;
-  typename FilterType::Pointer filter = FilterType::New();
-  filter->SetInput(reader->GetOutput());
+  typedef itk::BoneMorphometryFeaturesFilter<InputImageType, MaskImageType> FilterType;
 
+  if( allLabels || !labels.empty() )
+  {
+    // Multi-label mode: the input volume is read once and the features of each label
+    // are computed on the bounding box of the label.
+    if( inputMask == "" || outputTable == "" )
+    {
+      std::cerr << "Computing the features of several labels requires an input mask and an output table." << std::endl;
+      return EXIT_FAILURE;
+    }
+    typedef itk::ImageFileReader< LabelImageType > LabelReaderType;
+    typename LabelReaderType::Pointer labelReader = LabelReaderType::New();
+    labelReader->SetFileName( inputMask );
+    labelReader->Update();
+    const LabelImageType * labelMap = labelReader->GetOutput();
+
+    typedef std::map< int, typename LabelImageType::RegionType > LabelRegionsType;
+    LabelRegionsType labelRegions = BoneTexture::ComputeLabelRegions< LabelImageType >( labelMap );
+    std::vector< int > selectedLabels = BoneTexture::SelectLabels( labelRegions, allLabels ? std::vector< int >() : labels );
+
+    std::map< int, std::vector< double > > labelFeatures;
+    for( std::vector< int >::const_iterator lIt = selectedLabels.begin(); lIt != selectedLabels.end(); ++lIt )
+    {
+      typename LabelRegionsType::const_iterator region = labelRegions.find( *lIt );
+      if( region == labelRegions.end() )
+      {
+        std::cerr << "Label " << *lIt << " not found in the input mask." << std::endl;
+        continue;
+      }
+      typename InputImageType::Pointer labelImage = BoneTexture::CropToLabelRegion< InputImageType >( reader->GetOutput(), region->second );
+      typename MaskImageType::Pointer labelMask = BoneTexture::ExtractLabelMask< LabelImageType, MaskImageType >(
+        BoneTexture::CropToLabelRegion< LabelImageType >( labelMap, region->second ), *lIt );
+      typename FilterType::Pointer filter = CreateFeaturesFilter< InputImageType, MaskImageType >( labelImage, labelMask, threshold );
+
+      std::vector< double > features;
+      features.push_back( filter->GetBVTV() );
+      features.push_back( filter->GetTbTh() );
+      features.push_back( filter->GetTbSp() );
+      features.push_back( filter->GetTbN() );
+      features.push_back( filter->GetBSBV() );
+      labelFeatures[*lIt] = features;
+    }
+
+    std::vector< std::string > featureNames;
+    featureNames.push_back("BVTV");
+    featureNames.push_back("TbTh");
+    featureNames.push_back("TbSp");
+    featureNames.push_back("TbN");
+    featureNames.push_back("BSBV");
+    if( !BoneTexture::WriteLabelFeatureTable( outputTable, featureNames, selectedLabels, labelFeatures ) )
+    {
+      std::cerr << "Could not write the output table " << outputTable << std::endl;
+      return EXIT_FAILURE;
+    }
+    return EXIT_SUCCESS;
+  }
+
+  // The filter uses the non-zero voxels of the mask
+  typename MaskImageType::Pointer mask;
   if(inputMask != "")
   {
-    typename ReaderType::Pointer maskReader = ReaderType::New();
-    maskReader->SetFileName( inputMask );
-    maskReader->Update();
-    filter->SetMaskImage(maskReader->GetOutput());
+    mask = BoneTexture::ReadCompactMask< MaskImageType >( inputMask, BoneTexture::MaskInsideValue );
   }
 
-  filter->SetThreshold( threshold );
-  filter->Update();
+  typename FilterType::Pointer filter = CreateFeaturesFilter< InputImageType, MaskImageType >( reader->GetOutput(), mask.GetPointer(), threshold );
 
   std::ofstream rts;
   rts.open(returnParameterFile.c_str() );
@@ -103,15 +179,32 @@ int main( int argc, char * argv[] )
 
     itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+    // The scans are processed with their own pixel type when it can represent the
+    // intensity parameters, and as int otherwise
+    std::vector< double > intensityParameters;
+    intensityParameters.push_back( threshold );
+
     switch( inputComponentType )
       {
       case itk::ImageIOBase::UCHAR:
+        if( BoneTexture::CanRepresentValues< unsigned char >( intensityParameters ) )
+          {
+          return DoIt< unsigned char >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::USHORT:
+        if( BoneTexture::CanRepresentValues< unsigned short >( intensityParameters ) )
+          {
+          return DoIt< unsigned short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::SHORT:
+        if( BoneTexture::CanRepresentValues< short >( intensityParameters ) )
+          {
+          return DoIt< short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::FLOAT:
@@ -34,6 +34,12 @@
 
 #include "itkRunLengthTextureFeaturesImageFilter.h"
 
+#include "CompactMask.h"
+#include "FeatureMapEngine.h"
+#include "FeatureMapPipeline.h"
+#include "NativePixelTypes.h"
+#include "RunLengthIndexFeatures.h"
+
 #include "itkPluginUtilities.h"
 
 #include "ComputeGLRLMFeatureMapsCLP.h"
@@ -51,50 +57,61 @@ int DoIt( int argc, char * argv[] )
   typedef TPixel                                 PixelType;
   typedef itk::Image< PixelType, Dimension >     InputImageType;
   typedef itk::VectorImage< float, Dimension >   OutputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
 
   typedef itk::Neighborhood<typename InputImageType::PixelType, InputImageType::ImageDimension> NeighborhoodType;
   NeighborhoodType hood;
+  hood.SetRadius(neighborhoodRadius);
 
-  typedef itk::ImageFileReader< InputImageType > ReaderType;
-  typename ReaderType::Pointer reader = ReaderType::New();
-  reader->SetFileName( inputVolume );
-  reader->Update();
-
-  typedef itk::Statistics::RunLengthTextureFeaturesImageFilter< InputImageType, OutputImageType ,InputImageType > FilterType;
-  typename FilterType::Pointer filter = FilterType::New();
-  filter->SetInput(reader->GetOutput());
+  typedef itk::Statistics::RunLengthTextureFeaturesImageFilter< InputImageType, OutputImageType ,MaskImageType > FilterType;
+  typedef BoneTexture::RunLengthIndexFeatures< PixelType, MaskImageType::PixelType > EngineType;
 
-  if(inputMask != "")
+  // Feature map of a region of the volume, or of a slab of it
+  auto computeFeatureMap = [&]( const InputImageType * input,
+                                const MaskImageType * mask,
+                                const typename InputImageType::RegionType & region ) -> typename OutputImageType::Pointer
   {
-    typename ReaderType::Pointer maskReader = ReaderType::New();
-    maskReader->SetFileName( inputMask );
-    maskReader->Update();
-    filter->SetMaskImage(maskReader->GetOutput());
-  }
-
-  filter->SetInsidePixelValue(insideMask);
-  filter->SetNumberOfBinsPerAxis(binNumber);
-  hood.SetRadius(neighborhoodRadius);
-  filter->SetNeighborhoodRadius(hood.GetRadius());
-  filter->SetHistogramValueMinimum( pixelIntensityMin );
-  filter->SetHistogramValueMaximum( pixelIntensityMax );
-  filter->SetHistogramDistanceMinimum( distanceMin );
-  filter->SetHistogramDistanceMaximum( distanceMax );
-  filter->Update();
-  
-  itk::MetaDataDictionary dictionary;
-  itk::EncapsulateMetaData<std::string>(dictionary,"DWMRI_b-value","1.0");
-  itk::EncapsulateMetaData<std::string>(dictionary,"modality","DWMRI");
-  filter->GetOutput()->SetMetaDataDictionary(dictionary);
-
-  typedef itk::ImageFileWriter< OutputImageType > WriterType;
-  typename WriterType::Pointer writer = WriterType::New();
-  writer->SetFileName( outputVolume );
-  writer->SetInput( filter->GetOutput() );
-  writer->SetUseCompression( true );
-  writer->Update();
+    if( computationEngine == "fast" )
+    {
+      const EngineType engine( neighborhoodRadius, binNumber, pixelIntensityMin, pixelIntensityMax,
+                               distanceMin, distanceMax, BoneTexture::MaskInsideValue, input->GetSpacing().GetDataPointer() );
+      return BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >( engine, input, mask, region );
+    }
 
-  return EXIT_SUCCESS;
+    typename FilterType::Pointer filter = FilterType::New();
+    filter->SetInput(input);
+    if( mask )
+    {
+      filter->SetMaskImage(mask);
+    }
+    filter->SetInsidePixelValue(BoneTexture::MaskInsideValue);
+    filter->SetNumberOfBinsPerAxis(binNumber);
+    filter->SetNeighborhoodRadius(hood.GetRadius());
+    filter->SetHistogramValueMinimum( pixelIntensityMin );
+    filter->SetHistogramValueMaximum( pixelIntensityMax );
+    filter->SetHistogramDistanceMinimum( distanceMin );
+    filter->SetHistogramDistanceMaximum( distanceMax );
+    filter->GetOutput()->SetRequestedRegion( region );
+    filter->Update();
+
+    typename OutputImageType::Pointer featureMap = filter->GetOutput();
+    featureMap->DisconnectPipeline();
+    return featureMap;
+  };
+
+  BoneTexture::FeatureMapPipelineOptions options;
+  options.inputVolume = inputVolume;
+  options.inputMask = inputMask;
+  options.insideMask = insideMask;
+  options.outputVolume = outputVolume;
+  options.neighborhoodRadius = neighborhoodRadius;
+  options.samplingStride = samplingStride;
+  options.samplingOutput = samplingOutput;
+  options.maskCropping = maskCropping;
+  options.slabSize = slabSize;
+  options.outputPrecision = outputPrecision;
+  options.outputCompression = outputCompression;
+  return BoneTexture::ComputeFeatureMapPipeline< InputImageType, OutputImageType, MaskImageType >( options, computeFeatureMap );
 }
 
 } // end of anonymous namespace
@@ -113,15 +130,33 @@ int main( int argc, char * argv[] )
 
     itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+    // The scans are processed with their own pixel type when it can represent the
+    // intensity parameters, and as int otherwise
+    std::vector< double > intensityParameters;
+    intensityParameters.push_back( pixelIntensityMin );
+    intensityParameters.push_back( pixelIntensityMax );
+
     switch( inputComponentType )
       {
       case itk::ImageIOBase::UCHAR:
+        if( BoneTexture::CanRepresentValues< unsigned char >( intensityParameters ) )
+          {
+          return DoIt< unsigned char >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::USHORT:
+        if( BoneTexture::CanRepresentValues< unsigned short >( intensityParameters ) )
+          {
+          return DoIt< unsigned short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::SHORT:
+        if( BoneTexture::CanRepresentValues< short >( intensityParameters ) )
+          {
+          return DoIt< short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::FLOAT:
@@ -0,0 +1,86 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+// Compares the run-length feature maps of the "fast" computation engine with the ones of
+// itk::Statistics::RunLengthTextureFeaturesImageFilter, on a small synthetic volume with a mask.
+
+#include "itkRunLengthTextureFeaturesImageFilter.h"
+
+#include "CompactMask.h"
+#include "FeatureMapEngine.h"
+#include "FeatureMapEngineTesting.h"
+#include "RunLengthIndexFeatures.h"
+
+#include <cstdlib>
+
+int main( int, char *[] )
+{
+  const unsigned int Dimension = 3;
+  typedef short                                  PixelType;
+  typedef itk::Image< PixelType, Dimension >     InputImageType;
+  typedef itk::VectorImage< float, Dimension >   OutputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
+
+  typedef itk::Statistics::RunLengthTextureFeaturesImageFilter< InputImageType, OutputImageType, MaskImageType > FilterType;
+  typedef BoneTexture::RunLengthIndexFeatures< PixelType, MaskImageType::PixelType > EngineType;
+
+  const unsigned int size = 16;
+  const unsigned int neighborhoodRadius = 2;
+  const unsigned int binNumber = 10;
+  const PixelType pixelIntensityMin = 100;
+  const PixelType pixelIntensityMax = 900;
+  const double distanceMin = 0.0;
+  const double distanceMax = 5.0;
+  InputImageType::Pointer input = BoneTexture::CreateTestVolume< InputImageType >( size );
+  MaskImageType::Pointer mask = BoneTexture::CreateTestMask< MaskImageType >( size, 6.0, BoneTexture::MaskInsideValue );
+
+  int status = EXIT_SUCCESS;
+  for( unsigned int masked = 0; masked < 2; ++masked )
+    {
+    const MaskImageType * testMask = masked ? mask.GetPointer() : nullptr;
+
+    FilterType::Pointer filter = FilterType::New();
+    filter->SetInput( input );
+    if( testMask )
+      {
+      filter->SetMaskImage( testMask );
+      }
+    filter->SetInsidePixelValue( BoneTexture::MaskInsideValue );
+    filter->SetNumberOfBinsPerAxis( binNumber );
+    InputImageType::SizeType radius;
+    radius.Fill( neighborhoodRadius );
+    filter->SetNeighborhoodRadius( radius );
+    filter->SetHistogramValueMinimum( pixelIntensityMin );
+    filter->SetHistogramValueMaximum( pixelIntensityMax );
+    filter->SetHistogramDistanceMinimum( distanceMin );
+    filter->SetHistogramDistanceMaximum( distanceMax );
+    filter->Update();
+
+    const EngineType engine( neighborhoodRadius, binNumber, pixelIntensityMin, pixelIntensityMax,
+                             distanceMin, distanceMax, BoneTexture::MaskInsideValue, input->GetSpacing().GetDataPointer() );
+    OutputImageType::Pointer engineMap = BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >(
+      engine, input.GetPointer(), testMask, input->GetLargestPossibleRegion() );
+
+    if( BoneTexture::CompareFeatureMaps< OutputImageType >( filter->GetOutput(), engineMap.GetPointer(), 1e-4 ) > 0 )
+      {
+      std::cerr << "The engine and the filter differ " << ( masked ? "with" : "without" ) << " mask" << std::endl;
+      status = EXIT_FAILURE;
+      }
+    }
+  return status;
+}
@@ -36,36 +36,27 @@
 
 #include "itkPluginUtilities.h"
 
+#include "CompactMask.h"
+#include "LabelFeatureTable.h"
+#include "NativePixelTypes.h"
+
 #include "ComputeGLRLMFeaturesCLP.h"
 
 namespace
 {
 
-template< typename TPixel >
-int DoIt( int argc, char * argv[] )
+template< typename TImage >
+typename itk::Statistics::ScalarImageToRunLengthFeaturesFilter< TImage >::Pointer
+CreateFeaturesFilter( const TImage * image, const TImage * mask, int insideMask, int binNumber,
+                      int pixelIntensityMin, int pixelIntensityMax, float distanceMin, float distanceMax )
 {
-  PARSE_ARGS;
-
-  const unsigned int Dimension = 3;
-
-  typedef TPixel                                 PixelType;
-  typedef itk::Image< PixelType, Dimension >     InputImageType;
-
-  typedef itk::ImageFileReader< InputImageType > ReaderType;
-  typename ReaderType::Pointer reader = ReaderType::New();
-  reader->SetFileName( inputVolume );
-  reader->Update();
-
-  typedef itk::Statistics::ScalarImageToRunLengthFeaturesFilter< InputImageType> FilterType;
+  typedef itk::Statistics::ScalarImageToRunLengthFeaturesFilter< TImage > FilterType;
   typename FilterType::Pointer filter = FilterType::New();
-  filter->SetInput(reader->GetOutput());
+  filter->SetInput(image);
 
-  if(inputMask != "")
+  if(mask)
   {
-    typename ReaderType::Pointer maskReader = ReaderType::New();
-    maskReader->SetFileName( inputMask );
-    maskReader->Update();
-    filter->SetMaskImage(maskReader->GetOutput());
+    filter->SetMaskImage(mask);
   }
 
   filter->SetInsidePixelValue(insideMask);
@@ -87,6 +78,93 @@ int DoIt( int argc, char * argv[] )
   filter->SetRequestedFeatures(requestedFeatures);
 
   filter->Update();
+  return filter;
+}
+
+template< typename TPixel >
+int DoIt( int argc, char * argv[] )
+{
+  PARSE_ARGS;
+
+  const unsigned int Dimension = 3;
+
+  typedef TPixel                                 PixelType;
+  typedef itk::Image< PixelType, Dimension >     InputImageType;
+  typedef itk::Image< int, Dimension >           LabelImageType;
+
+  typedef itk::ImageFileReader< InputImageType > ReaderType;
+  typename ReaderType::Pointer reader = ReaderType::New();
+  reader->SetFileName( inputVolume );
+  reader->Update();
+
+  if( allLabels || !labels.empty() )
+  {
+    // Multi-label mode: the input volume is read once and the features of each label
+    // are computed on the bounding box of the label.
+    if( inputMask == "" || outputTable == "" )
+    {
+      std::cerr << "Computing the features of several labels requires an input mask and an output table." << std::endl;
+      return EXIT_FAILURE;
+    }
+    typedef itk::ImageFileReader< LabelImageType > LabelReaderType;
+    typename LabelReaderType::Pointer labelReader = LabelReaderType::New();
+    labelReader->SetFileName( inputMask );
+    labelReader->Update();
+    const LabelImageType * labelMap = labelReader->GetOutput();
+
+    typedef std::map< int, typename LabelImageType::RegionType > LabelRegionsType;
+    LabelRegionsType labelRegions = BoneTexture::ComputeLabelRegions< LabelImageType >( labelMap );
+    std::vector< int > selectedLabels = BoneTexture::SelectLabels( labelRegions, allLabels ? std::vector< int >() : labels );
+
+    std::map< int, std::vector< double > > labelFeatures;
+    for( std::vector< int >::const_iterator lIt = selectedLabels.begin(); lIt != selectedLabels.end(); ++lIt )
+    {
+      typename LabelRegionsType::const_iterator region = labelRegions.find( *lIt );
+      if( region == labelRegions.end() )
+      {
+        std::cerr << "Label " << *lIt << " not found in the input mask." << std::endl;
+        continue;
+      }
+      typename InputImageType::Pointer labelImage = BoneTexture::CropToLabelRegion< InputImageType >( reader->GetOutput(), region->second );
+      typename InputImageType::Pointer labelMask = BoneTexture::ExtractLabelMask< LabelImageType, InputImageType >(
+        BoneTexture::CropToLabelRegion< LabelImageType >( labelMap, region->second ), *lIt );
+      typedef itk::Statistics::ScalarImageToRunLengthFeaturesFilter< InputImageType > FilterType;
+      typename FilterType::Pointer filter = CreateFeaturesFilter< InputImageType >(
+        labelImage, labelMask, BoneTexture::MaskInsideValue, binNumber, pixelIntensityMin, pixelIntensityMax, distanceMin, distanceMax );
+
+      typename FilterType::FeatureValueVectorPointer meanVector = filter->GetFeatureMeans();
+      labelFeatures[*lIt] = meanVector->CastToSTLConstContainer();
+    }
+
+    std::vector< std::string > featureNames;
+    featureNames.push_back("ShortRunEmphasis");
+    featureNames.push_back("LongRunEmphasis");
+    featureNames.push_back("GreyLevelNonuniformity");
+    featureNames.push_back("RunLengthNonuniformity");
+    featureNames.push_back("LowGreyLevelRunEmphasis");
+    featureNames.push_back("HighGreyLevelRunEmphasis");
+    featureNames.push_back("ShortRunLowGreyLevelEmphasis");
+    featureNames.push_back("ShortRunHighGreyLevelEmphasis");
+    featureNames.push_back("LongRunLowGreyLevelEmphasis");
+    featureNames.push_back("LongRunHighGreyLevelEmphasis");
+    if( !BoneTexture::WriteLabelFeatureTable( outputTable, featureNames, selectedLabels, labelFeatures ) )
+    {
+      std::cerr << "Could not write the output table " << outputTable << std::endl;
+      return EXIT_FAILURE;
+    }
+    return EXIT_SUCCESS;
+  }
+
+  // The scalar feature filters take a mask of the type of the input
+  typename InputImageType::Pointer mask;
+  if(inputMask != "")
+  {
+    mask = BoneTexture::ReadCompactMask< InputImageType >( inputMask, insideMask );
+  }
+
+  typedef itk::Statistics::ScalarImageToRunLengthFeaturesFilter< InputImageType> FilterType;
+  typename FilterType::Pointer filter = CreateFeaturesFilter< InputImageType >(
+    reader->GetOutput(), mask.GetPointer(), BoneTexture::MaskInsideValue, binNumber, pixelIntensityMin, pixelIntensityMax, distanceMin, distanceMax );
 
   typename FilterType::FeatureValueVector::ConstIterator mIt;
   typename FilterType::FeatureValueVectorPointer meanVector = filter->GetFeatureMeans();
@@ -144,15 +222,33 @@ int main( int argc, char * argv[] )
 
     itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+    // The scans are processed with their own pixel type when it can represent the
+    // intensity parameters, and as int otherwise
+    std::vector< double > intensityParameters;
+    intensityParameters.push_back( pixelIntensityMin );
+    intensityParameters.push_back( pixelIntensityMax );
+
     switch( inputComponentType )
       {
       case itk::ImageIOBase::UCHAR:
+        if( BoneTexture::CanRepresentValues< unsigned char >( intensityParameters ) )
+          {
+          return DoIt< unsigned char >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::USHORT:
+        if( BoneTexture::CanRepresentValues< unsigned short >( intensityParameters ) )
+          {
+          return DoIt< unsigned short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::SHORT:
+        if( BoneTexture::CanRepresentValues< short >( intensityParameters ) )
+          {
+          return DoIt< short >( argc, argv );
+          }
         return DoIt< int >( argc, argv );
         break;
       case itk::ImageIOBase::FLOAT:
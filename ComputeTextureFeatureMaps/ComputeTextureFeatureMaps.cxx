@@ -0,0 +1,323 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+
+// Use an anonymous namespace to keep class types and function names
+// from colliding when module is used as shared object module.  Every
+// thing should be in an anonymous namespace except for the module
+// entry point, e.g. main()
+//
+
+#include "itkImageFileReader.h"
+#include "itkImageFileWriter.h"
+#include "itkFloatingPointExceptions.h"
+#include "itkImage.h"
+#include "itkVector.h"
+#include "itkNeighborhood.h"
+#include "itkMetaDataDictionary.h"
+#include "itkMetaDataObject.h"
+
+#include "itkCoocurrenceTextureFeaturesImageFilter.h"
+#include "itkRunLengthTextureFeaturesImageFilter.h"
+#include "itkBoneMorphometryFeaturesImageFilter.h"
+#include "itkReplaceFeatureMapNanInfImageFilter.h"
+
+#include "CompactMask.h"
+#include "FeatureMapEngine.h"
+#include "FeatureMapPipeline.h"
+#include "IntegralBoneMorphometryFeatures.h"
+#include "NativePixelTypes.h"
+#include "RunLengthIndexFeatures.h"
+#include "SlidingCoocurrenceFeatures.h"
+
+#include "itkPluginUtilities.h"
+
+#include "ComputeTextureFeatureMapsCLP.h"
+
+namespace
+{
+
+const unsigned int GLCMNumberOfFeatures = 8;
+const unsigned int GLRLMNumberOfFeatures = 10;
+const unsigned int BMNumberOfFeatures = 5;
+
+// Copy the components of a feature map into the components of the combined
+// output, starting at firstComponent. Both images share the same buffered region.
+template< typename TOutputImage >
+void CopyFeatureMapComponents( const TOutputImage * featureMap, TOutputImage * output, unsigned int firstComponent )
+{
+  const unsigned int featureMapComponents = featureMap->GetNumberOfComponentsPerPixel();
+  const unsigned int outputComponents = output->GetNumberOfComponentsPerPixel();
+  const itk::SizeValueType numberOfPixels = output->GetBufferedRegion().GetNumberOfPixels();
+
+  const typename TOutputImage::InternalPixelType * in = featureMap->GetBufferPointer();
+  typename TOutputImage::InternalPixelType * out = output->GetBufferPointer() + firstComponent;
+  for( itk::SizeValueType i = 0; i < numberOfPixels; ++i )
+    {
+    std::copy( in, in + featureMapComponents, out );
+    in += featureMapComponents;
+    out += outputComponents;
+    }
+}
+
+template< typename TPixel >
+int DoIt( int argc, char * argv[] )
+{
+  PARSE_ARGS;
+
+  const unsigned int Dimension = 3;
+
+  typedef TPixel                                 PixelType;
+  typedef itk::Image< PixelType, Dimension >     InputImageType;
+  typedef itk::VectorImage< float, Dimension >   OutputImageType;
+  typedef itk::Image< unsigned char, Dimension > MaskImageType;
+
+  bool computeGLCM = false;
+  bool computeGLRLM = false;
+  bool computeBM = false;
+  for( std::vector< std::string >::const_iterator it = featureFamilies.begin(); it != featureFamilies.end(); ++it )
+    {
+    if( *it == "GLCM" )
+      {
+      computeGLCM = true;
+      }
+    else if( *it == "GLRLM" )
+      {
+      computeGLRLM = true;
+      }
+    else if( *it == "BM" )
+      {
+      computeBM = true;
+      }
+    else
+      {
+      std::cerr << "Unknown feature family: " << *it << ". Use GLCM, GLRLM or BM." << std::endl;
+      return EXIT_FAILURE;
+      }
+    }
+  if( !computeGLCM && !computeGLRLM && !computeBM )
+    {
+    std::cerr << "At least one feature family (GLCM, GLRLM or BM) must be selected." << std::endl;
+    return EXIT_FAILURE;
+    }
+
+  typedef itk::Neighborhood<typename InputImageType::PixelType, InputImageType::ImageDimension> NeighborhoodType;
+  NeighborhoodType hood;
+  hood.SetRadius(neighborhoodRadius);
+
+  // Feature map of a region of the volume, or of a slab of it. The input and the mask are
+  // shared by all the feature filters, and each feature map is copied in the combined
+  // output as soon as it is computed so that only one intermediate feature map is in
+  // memory at a time.
+  auto computeFeatureMap = [&]( const InputImageType * input,
+                                const MaskImageType * mask,
+                                const typename InputImageType::RegionType & region ) -> typename OutputImageType::Pointer
+  {
+    typename OutputImageType::Pointer output = OutputImageType::New();
+    output->CopyInformation( input );
+    output->SetRegions( region );
+    output->SetLargestPossibleRegion( input->GetLargestPossibleRegion() );
+    output->SetNumberOfComponentsPerPixel( computeGLCM * GLCMNumberOfFeatures
+                                         + computeGLRLM * GLRLMNumberOfFeatures
+                                         + computeBM * BMNumberOfFeatures );
+    output->Allocate();
+
+    unsigned int firstComponent = 0;
+
+    if( computeGLCM && computationEngine == "fast" )
+    {
+      const BoneTexture::SlidingCoocurrenceFeatures< PixelType, MaskImageType::PixelType > engine(
+        neighborhoodRadius, binNumber, pixelIntensityMin, pixelIntensityMax, BoneTexture::MaskInsideValue );
+      typename OutputImageType::Pointer featureMap =
+        BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >( engine, input, mask, region );
+
+      CopyFeatureMapComponents< OutputImageType >( featureMap, output, firstComponent );
+      firstComponent += GLCMNumberOfFeatures;
+    }
+    else if( computeGLCM )
+    {
+      typedef itk::Statistics::CoocurrenceTextureFeaturesImageFilter< InputImageType, OutputImageType, MaskImageType > FilterType;
+      typename FilterType::Pointer filter = FilterType::New();
+      filter->SetInput(input);
+      if( mask )
+      {
+        filter->SetMaskImage(mask);
+      }
+      filter->SetInsidePixelValue(BoneTexture::MaskInsideValue);
+      filter->SetNumberOfBinsPerAxis(binNumber);
+      filter->SetNeighborhoodRadius(hood.GetRadius());
+      filter->SetHistogramMinimum( pixelIntensityMin );
+      filter->SetHistogramMaximum( pixelIntensityMax );
+      filter->GetOutput()->SetRequestedRegion( region );
+      filter->Update();
+
+      CopyFeatureMapComponents< OutputImageType >( filter->GetOutput(), output, firstComponent );
+      firstComponent += GLCMNumberOfFeatures;
+    }
+
+    if( computeGLRLM && computationEngine == "fast" )
+    {
+      const BoneTexture::RunLengthIndexFeatures< PixelType, MaskImageType::PixelType > engine(
+        neighborhoodRadius, binNumber, pixelIntensityMin, pixelIntensityMax,
+        distanceMin, distanceMax, BoneTexture::MaskInsideValue, input->GetSpacing().GetDataPointer() );
+      typename OutputImageType::Pointer featureMap =
+        BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >( engine, input, mask, region );
+
+      CopyFeatureMapComponents< OutputImageType >( featureMap, output, firstComponent );
+      firstComponent += GLRLMNumberOfFeatures;
+    }
+    else if( computeGLRLM )
+    {
+      typedef itk::Statistics::RunLengthTextureFeaturesImageFilter< InputImageType, OutputImageType, MaskImageType > FilterType;
+      typename FilterType::Pointer filter = FilterType::New();
+      filter->SetInput(input);
+      if( mask )
+      {
+        filter->SetMaskImage(mask);
+      }
+      filter->SetInsidePixelValue(BoneTexture::MaskInsideValue);
+      filter->SetNumberOfBinsPerAxis(binNumber);
+      filter->SetNeighborhoodRadius(hood.GetRadius());
+      filter->SetHistogramValueMinimum( pixelIntensityMin );
+      filter->SetHistogramValueMaximum( pixelIntensityMax );
+      filter->SetHistogramDistanceMinimum( distanceMin );
+      filter->SetHistogramDistanceMaximum( distanceMax );
+      filter->GetOutput()->SetRequestedRegion( region );
+      filter->Update();
+
+      CopyFeatureMapComponents< OutputImageType >( filter->GetOutput(), output, firstComponent );
+      firstComponent += GLRLMNumberOfFeatures;
+    }
+
+    if( computeBM )
+    {
+      typedef itk::ReplaceFeatureMapNanInfImageFilter<OutputImageType> PostProcessingFilterType;
+      PostProcessingFilterType::Pointer postProcessingFilter = PostProcessingFilterType::New();
+      if( computationEngine == "fast" )
+      {
+        const BoneTexture::IntegralBoneMorphometryFeatures< PixelType, MaskImageType::PixelType > engine(
+          neighborhoodRadius, threshold, input->GetSpacing().GetDataPointer() );
+        postProcessingFilter->SetInput(
+          BoneTexture::ComputeFeatureMapWithEngine< InputImageType, OutputImageType >( engine, input, mask, region ) );
+      }
+      else
+      {
+        typedef itk::BoneMorphometryFeaturesImageFilter<InputImageType, OutputImageType, MaskImageType> FilterType;
+        typename FilterType::Pointer filter = FilterType::New();
+        filter->SetInput(input);
+        if( mask )
+        {
+          filter->SetMaskImage(mask);
+        }
+        filter->SetNeighborhoodRadius(hood.GetRadius());
+        filter->SetThreshold( threshold );
+        postProcessingFilter->SetInput( filter->GetOutput() );
+      }
+      postProcessingFilter->GetOutput()->SetRequestedRegion( region );
+      postProcessingFilter->Update();
+
+      CopyFeatureMapComponents< OutputImageType >( postProcessingFilter->GetOutput(), output, firstComponent );
+      firstComponent += BMNumberOfFeatures;
+    }
+
+    return output;
+  };
+
+  BoneTexture::FeatureMapPipelineOptions options;
+  options.inputVolume = inputVolume;
+  options.inputMask = inputMask;
+  options.insideMask = insideMask;
+  options.outputVolume = outputVolume;
+  options.neighborhoodRadius = neighborhoodRadius;
+  options.samplingStride = samplingStride;
+  options.samplingOutput = samplingOutput;
+  options.maskCropping = maskCropping;
+  options.slabSize = slabSize;
+  options.outputPrecision = outputPrecision;
+  options.outputCompression = outputCompression;
+  return BoneTexture::ComputeFeatureMapPipeline< InputImageType, OutputImageType, MaskImageType >( options, computeFeatureMap );
+}
+
+} // end of anonymous namespace
+
+int main( int argc, char * argv[] )
+{
+  PARSE_ARGS;
+
+  itk::ImageIOBase::IOPixelType     inputPixelType;
+  itk::ImageIOBase::IOComponentType inputComponentType;
+  itk::FloatingPointExceptions::Enable();
+  itk::FloatingPointExceptions::SetExceptionAction( itk::FloatingPointExceptions::ABORT );
+
+  try
+    {
+
+    itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
+
+    // The scans are processed with their own pixel type when it can represent the
+    // intensity parameters, and as int otherwise
+    std::vector< double > intensityParameters;
+    intensityParameters.push_back( pixelIntensityMin );
+    intensityParameters.push_back( pixelIntensityMax );
+    intensityParameters.push_back( threshold );
+
+    switch( inputComponentType )
+      {
+      case itk::ImageIOBase::UCHAR:
+        if( BoneTexture::CanRepresentValues< unsigned char >( intensityParameters ) )
+          {
+          return DoIt< unsigned char >( argc, argv );
+          }
+        return DoIt< int >( argc, argv );
+        break;
+      case itk::ImageIOBase::USHORT:
+        if( BoneTexture::CanRepresentValues< unsigned short >( intensityParameters ) )
+          {
+          return DoIt< unsigned short >( argc, argv );
+          }
+        return DoIt< int >( argc, argv );
+        break;
+      case itk::ImageIOBase::SHORT:
+        if( BoneTexture::CanRepresentValues< short >( intensityParameters ) )
+          {
+          return DoIt< short >( argc, argv );
+          }
+        return DoIt< int >( argc, argv );
+        break;
+      case itk::ImageIOBase::FLOAT:
+        return DoIt< float >( argc, argv );
+        break;
+      case itk::ImageIOBase::INT:
+        return DoIt< int >( argc, argv );
+        break;
+      default:
+        std::cerr << "Unknown input image pixel component type: "
+          << itk::ImageIOBase::GetComponentTypeAsString( inputComponentType )
+          << std::endl;
+        return EXIT_FAILURE;
+        break;
+      }
+    }
+  catch( itk::ExceptionObject & excep )
+    {
+    std::cerr << argv[0] << ": exception caught !" << std::endl;
+    std::cerr << excep << std::endl;
+    return EXIT_FAILURE;
+    }
+  return EXIT_SUCCESS;
+}
@@ -0,0 +1,115 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+// Compares the combined feature map of ComputeTextureFeatureMaps with the feature maps of
+// the CLIs of each family, whose components it must hold in the order of its arguments.
+
+#include "itkImageFileReader.h"
+#include "itkImageRegionConstIterator.h"
+#include "itkImageRegionIterator.h"
+#include "itkNrrdImageIO.h"
+
+#include "FeatureMapEngineTesting.h"
+
+#include <cstdlib>
+#include <vector>
+
+namespace
+{
+
+typedef itk::VectorImage< float, 3 > FeatureMapType;
+
+FeatureMapType::Pointer
+ReadFeatureMap( const char * fileName )
+{
+  typedef itk::ImageFileReader< FeatureMapType > ReaderType;
+  ReaderType::Pointer reader = ReaderType::New();
+  reader->SetImageIO( itk::NrrdImageIO::New() );
+  reader->SetFileName( fileName );
+  reader->Update();
+  return reader->GetOutput();
+}
+
+} // end of anonymous namespace
+
+int main( int argc, char * argv[] )
+{
+  if( argc < 3 )
+    {
+    std::cerr << "Usage: " << argv[0] << " combinedFeatureMap familyFeatureMap [familyFeatureMap...]" << std::endl;
+    return EXIT_FAILURE;
+    }
+
+  FeatureMapType::Pointer combined;
+  std::vector< FeatureMapType::Pointer > families;
+  try
+    {
+    combined = ReadFeatureMap( argv[1] );
+    for( int i = 2; i < argc; ++i )
+      {
+      families.push_back( ReadFeatureMap( argv[i] ) );
+      }
+    }
+  catch( itk::ExceptionObject & exception )
+    {
+    std::cerr << exception << std::endl;
+    return EXIT_FAILURE;
+    }
+
+  // Components of the family maps, one after the other, in a map of the geometry of the combined map
+  unsigned int numberOfComponents = 0;
+  for( std::size_t f = 0; f < families.size(); ++f )
+    {
+    if( families[f]->GetLargestPossibleRegion() != combined->GetLargestPossibleRegion()
+        || families[f]->GetOrigin() != combined->GetOrigin() || families[f]->GetSpacing() != combined->GetSpacing() )
+      {
+      std::cerr << "The map " << argv[f + 2] << " does not have the geometry of the combined map" << std::endl;
+      return EXIT_FAILURE;
+      }
+    numberOfComponents += families[f]->GetNumberOfComponentsPerPixel();
+    }
+  FeatureMapType::Pointer expected = FeatureMapType::New();
+  expected->CopyInformation( combined );
+  expected->SetRegions( combined->GetLargestPossibleRegion() );
+  expected->SetNumberOfComponentsPerPixel( numberOfComponents );
+  expected->Allocate();
+  itk::ImageRegionIterator< FeatureMapType > expectedIt( expected, expected->GetLargestPossibleRegion() );
+  FeatureMapType::PixelType values( numberOfComponents );
+  std::vector< itk::ImageRegionConstIterator< FeatureMapType > > familyIts;
+  for( std::size_t f = 0; f < families.size(); ++f )
+    {
+    familyIts.push_back( itk::ImageRegionConstIterator< FeatureMapType >( families[f], expected->GetLargestPossibleRegion() ) );
+    }
+  for( expectedIt.GoToBegin(); !expectedIt.IsAtEnd(); ++expectedIt )
+    {
+    unsigned int component = 0;
+    for( std::size_t f = 0; f < families.size(); ++f )
+      {
+      const FeatureMapType::PixelType familyValues = familyIts[f].Get();
+      for( unsigned int c = 0; c < familyValues.GetSize(); ++c )
+        {
+        values[component++] = familyValues[c];
+        }
+      ++familyIts[f];
+      }
+    expectedIt.Set( values );
+    }
+
+  // The combined map runs the same computations as the CLIs of each family
+  return BoneTexture::CompareFeatureMaps< FeatureMapType >( expected, combined, 0.0 ) > 0 ? EXIT_FAILURE : EXIT_SUCCESS;
+}
@@ -0,0 +1,65 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+// Writes the synthetic volume and mask of the tests of the feature map CLIs (see
+// FeatureMapEngineTesting.h) as NRRD files.
+
+#include "itkImageFileWriter.h"
+#include "itkNrrdImageIO.h"
+
+#include "CompactMask.h"
+#include "FeatureMapEngineTesting.h"
+
+#include <cstdlib>
+
+int main( int argc, char * argv[] )
+{
+  if( argc < 3 )
+    {
+    std::cerr << "Usage: " << argv[0] << " outputVolume outputMask" << std::endl;
+    return EXIT_FAILURE;
+    }
+  typedef itk::Image< short, 3 >         InputImageType;
+  typedef itk::Image< unsigned char, 3 > MaskImageType;
+
+  const unsigned int size = 16;
+  InputImageType::Pointer input = BoneTexture::CreateTestVolume< InputImageType >( size );
+  MaskImageType::Pointer mask = BoneTexture::CreateTestMask< MaskImageType >( size, 6.0, BoneTexture::MaskInsideValue );
+  try
+    {
+    typedef itk::ImageFileWriter< InputImageType > InputWriterType;
+    InputWriterType::Pointer inputWriter = InputWriterType::New();
+    inputWriter->SetImageIO( itk::NrrdImageIO::New() );
+    inputWriter->SetInput( input );
+    inputWriter->SetFileName( argv[1] );
+    inputWriter->Update();
+
+    typedef itk::ImageFileWriter< MaskImageType > MaskWriterType;
+    MaskWriterType::Pointer maskWriter = MaskWriterType::New();
+    maskWriter->SetImageIO( itk::NrrdImageIO::New() );
+    maskWriter->SetInput( mask );
+    maskWriter->SetFileName( argv[2] );
+    maskWriter->Update();
+    }
+  catch( itk::ExceptionObject & exception )
+    {
+    std::cerr << exception << std::endl;
+    return EXIT_FAILURE;
+    }
+  return EXIT_SUCCESS;
+}
@@ -37,11 +37,52 @@
 
 #include "itkPluginUtilities.h"
 
+#include "LabelListReader.h"
+
 #include "CreateLabelMapFromCSVCLP.h"
 
 namespace
 {
 
+// Writes the labels read from the input file directly in the buffer of the label map
+template< typename TImage >
+class LabelWriter
+{
+public:
+  LabelWriter( TImage * image )
+    : m_Buffer( image->GetBufferPointer() ),
+      m_Region( image->GetBufferedRegion() ),
+      m_NumberOfVoxelsOutside( 0 )
+  {
+  }
+
+  void operator()( long i, long j, long k, long label )
+  {
+    const long x = i - m_Region.GetIndex(0);
+    const long y = j - m_Region.GetIndex(1);
+    const long z = k - m_Region.GetIndex(2);
+    const long sizeX = static_cast< long >( m_Region.GetSize(0) );
+    const long sizeY = static_cast< long >( m_Region.GetSize(1) );
+    const long sizeZ = static_cast< long >( m_Region.GetSize(2) );
+    if( x < 0 || y < 0 || z < 0 || x >= sizeX || y >= sizeY || z >= sizeZ )
+    {
+      ++m_NumberOfVoxelsOutside;
+      return;
+    }
+    m_Buffer[ x + sizeX * ( y + sizeY * z ) ] = static_cast< typename TImage::PixelType >( label );
+  }
+
+  unsigned long GetNumberOfVoxelsOutside() const
+  {
+    return m_NumberOfVoxelsOutside;
+  }
+
+private:
+  typename TImage::PixelType * m_Buffer;
+  typename TImage::RegionType  m_Region;
+  unsigned long                m_NumberOfVoxelsOutside;
+};
+
 template< typename TPixel >
 int DoIt( int argc, char * argv[] )
 {
@@ -56,65 +97,65 @@ int DoIt( int argc, char * argv[] )
     typedef itk::Image< unsigned int, Dimension >        OutImageType;
     typedef itk::ImageFileWriter< OutImageType >         WriterType;
 
+    // Only the geometry of the input volume is needed
     typename ReaderType::Pointer reader = ReaderType::New();
     reader->SetFileName( inputVolume );
-    reader->Update();
+    reader->UpdateOutputInformation();
 
     OutImageType::Pointer output = OutImageType::New();
-    output->SetRegions(reader->GetOutput()->GetRequestedRegion());
+    output->SetRegions(reader->GetOutput()->GetLargestPossibleRegion());
     output->SetOrigin(reader->GetOutput()->GetOrigin());
     output->SetDirection(reader->GetOutput()->GetDirection());
     output->SetSpacing(reader->GetOutput()->GetSpacing());
-    output->Allocate();
-
-    typename OutImageType::IndexType pixelIndex;
+    output->Allocate(true);
 
-    std::ifstream inputFile;
-    inputFile.open(inputFileName.c_str(), std::ios::in);
+    LabelWriter< OutImageType > labelWriter( output );
 
-    std::string line;
-    while(std::getline(inputFile, line))
+    if(inputFormat == "binary")
     {
-
-        std::istringstream s(line);
-        std::string field;
-
-        getline(s, field,',');
-        pixelIndex[0] = std::atoi(field.c_str());
-        getline(s, field,',');
-        pixelIndex[1] = std::atoi(field.c_str());
-        getline(s, field,',');
-        pixelIndex[2] = std::atoi(field.c_str());
-        getline(s, field,',');
-
-        std::string label = field.substr(0, field.size()-1);
-
-        if(label == Label1.c_str())
+        if( BoneTexture::LabelListReader::ReadBinary( inputFileName, labelWriter ) < 0 )
         {
-            output->SetPixel (pixelIndex, 1);
-        }
-        else if(label == Label2.c_str())
-        {
-            output->SetPixel (pixelIndex, 2);
+            std::cerr << "Could not read " << inputFileName << ": expected records of four int32 values (i, j, k, label)" << std::endl;
+            return EXIT_FAILURE;
         }
-        else if(label == Label3.c_str())
+    }
+    else
+    {
+        // Label names are mapped to 1, 2, ... in the order they are given
+        std::vector< std::string > labelNames = labels;
+        if( labelNames.empty() )
         {
-            output->SetPixel (pixelIndex, 3);
+            labelNames.push_back(Label1);
+            labelNames.push_back(Label2);
+            labelNames.push_back(Label3);
+            labelNames.push_back(Label4);
+            labelNames.push_back(Label5);
         }
-        else if(label == Label4.c_str())
+        BoneTexture::LabelListReader::LabelValuesType labelValues;
+        for( unsigned int i = 0; i < labelNames.size(); i++ )
         {
-            output->SetPixel (pixelIndex, 4);
+            if( labelNames[i] != "" )
+            {
+                labelValues.insert( std::make_pair( labelNames[i], i + 1 ) );
+            }
         }
-        else if(label == Label5.c_str())
+
+        long numberOfInvalidLines = BoneTexture::LabelListReader::ReadCSV( inputFileName, labelValues, labelWriter );
+        if( numberOfInvalidLines < 0 )
         {
-            output->SetPixel (pixelIndex, 5);
+            std::cerr << "Could not read " << inputFileName << std::endl;
+            return EXIT_FAILURE;
         }
-        else
+        if( numberOfInvalidLines > 0 )
         {
-            output->SetPixel (pixelIndex, 0);
+            std::cerr << numberOfInvalidLines << " line(s) of " << inputFileName << " ignored (expected i,j,k,label)" << std::endl;
         }
-
     }
+    if( labelWriter.GetNumberOfVoxelsOutside() > 0 )
+    {
+        std::cerr << labelWriter.GetNumberOfVoxelsOutside() << " voxel(s) outside of the input volume ignored" << std::endl;
+    }
+
     typename WriterType::Pointer writer = WriterType::New();
     writer->SetFileName( outputLabeMap );
     writer->SetInput( output );
@@ -23,6 +23,8 @@
 // entry point, e.g. main()
 //
 #include <fstream>
+#include <memory>
+#include <sstream>
 #include "itkImageFileReader.h"
 #include "itkImageFileWriter.h"
 #include "itkFloatingPointExceptions.h"
@@ -36,6 +38,10 @@
 
 #include "itkPluginUtilities.h"
 
+#include "ColumnarNrrdWriter.h"
+#include "CompactMask.h"
+#include "FeatureMapFiles.h"
+
 #include "SaveVectorImageAsCSVCLP.h"
 
 namespace
@@ -51,285 +57,206 @@ int DoIt( int argc, char * argv[] )
 
     typedef TPixel                                       PixelType;
     typedef itk::VectorImage< PixelType, Dimension >     InputImageType;
-    typedef itk::Image< PixelType, Dimension >           InputMaskType;
-    typedef itk::ImageFileReader< InputImageType >       ReaderType;
-    typedef itk::ImageFileReader< InputMaskType >        MaskReaderType;
+    typedef itk::Image< unsigned char, Dimension >       InputMaskType;
 
-    typename ReaderType::Pointer reader = ReaderType::New();
-    reader->SetFileName( inputVolume );
-    reader->Update();
+    // The input volumes are exported side by side: X, Y, Z and the components of each volume
+    std::vector< std::string > inputVolumes;
+    inputVolumes.push_back( inputVolume );
+    if(secondInputVolume != "")
+    {
+        inputVolumes.push_back( secondInputVolume );
+        if(thirdInputVolume != "")
+        {
+            inputVolumes.push_back( thirdInputVolume );
+        }
+    }
 
-    std::ofstream outputFile;
-    const char *outputFilename = outputFileBaseName.c_str();
-    outputFile.open(outputFilename, std::ios::out);
+    std::vector< typename InputImageType::Pointer > images;
+    unsigned int numberOfComponents = 0;
+    for( unsigned int v = 0; v < inputVolumes.size(); v++ )
+    {
+        images.push_back( BoneTexture::ReadFeatureMap< InputImageType >( inputVolumes[v] ) );
+        numberOfComponents += images.back()->GetNumberOfComponentsPerPixel();
+    }
 
+    typename InputMaskType::Pointer mask;
+    if(inputMask != "")
+    {
+        // The voxels of all the non-zero labels are exported
+        mask = BoneTexture::ReadCompactMask< InputMaskType >( inputMask, BoneTexture::MaskInsideValue );
+    }
+
+    std::vector< std::string > columnNames;
+    columnNames.push_back("X");
+    columnNames.push_back("Y");
+    columnNames.push_back("Z");
     if(predefineTitle)
     {
-        outputFile<<"X"<<",";
-        outputFile<<"Y"<<",";
-        outputFile<<"Z"<<",";
-        outputFile<<"Energy"<<",";
-        outputFile<<"Entropy"<<",";
-        outputFile<<"Correlation"<<",";
-        outputFile<<"InverseDifferenceMoment"<<",";
-        outputFile<<"Inertia"<<",";
-        outputFile<<"ClusterShade"<<",";
-        outputFile<<"ClusterProminence"<<",";
-        outputFile<<"HarralickCorrelation"<<",";
-        outputFile<<"ShortRunEmphasis"<<",";
-        outputFile<<"LongRunEmpasis"<<",";
-        outputFile<<"GreyLevelNonUniformity"<<",";
-        outputFile<<"RunLengthNonUniformity"<<",";
-        outputFile<<"LowGreyLevelRunEmphasis"<<",";
-        outputFile<<"HighGreyLevelRunEmphasis"<<",";
-        outputFile<<"ShortRunLowGreyLevelEmphasis"<<",";
-        outputFile<<"ShortRunHighGreyLevelEmphasis"<<",";
-        outputFile<<"LongRunLowGreyLevelEmphasis"<<",";
-        outputFile<<"LongRunHighGreyLevelEmphasis"<<",";
-        outputFile<<"BVTV"<<",";
-        outputFile<<"TbN"<<",";
-        outputFile<<"TbTh"<<",";
-        outputFile<<"TbSp"<<",";
-        outputFile<<"BSBV"<<",";
-
-
-        outputFile<<std::endl;
+        columnNames.push_back("Energy");
+        columnNames.push_back("Entropy");
+        columnNames.push_back("Correlation");
+        columnNames.push_back("InverseDifferenceMoment");
+        columnNames.push_back("Inertia");
+        columnNames.push_back("ClusterShade");
+        columnNames.push_back("ClusterProminence");
+        columnNames.push_back("HarralickCorrelation");
+        columnNames.push_back("ShortRunEmphasis");
+        columnNames.push_back("LongRunEmpasis");
+        columnNames.push_back("GreyLevelNonUniformity");
+        columnNames.push_back("RunLengthNonUniformity");
+        columnNames.push_back("LowGreyLevelRunEmphasis");
+        columnNames.push_back("HighGreyLevelRunEmphasis");
+        columnNames.push_back("ShortRunLowGreyLevelEmphasis");
+        columnNames.push_back("ShortRunHighGreyLevelEmphasis");
+        columnNames.push_back("LongRunLowGreyLevelEmphasis");
+        columnNames.push_back("LongRunHighGreyLevelEmphasis");
+        columnNames.push_back("BVTV");
+        columnNames.push_back("TbTh");
+        columnNames.push_back("TbSp");
+        columnNames.push_back("TbN");
+        columnNames.push_back("BSBV");
     }
 
-    typename itk::ImageRegionConstIterator< InputImageType > inIt( reader->GetOutput(),  reader->GetOutput()->GetRequestedRegion());
-    inIt.GoToBegin ();
-    typename InputImageType::PixelType inputPixel;
-    typename InputImageType::IndexType inputIndex;
-    const unsigned int VectorComponentDimension = reader->GetOutput()->GetNumberOfComponentsPerPixel();
+    std::ofstream outputFile;
+    std::unique_ptr< BoneTexture::ColumnarNrrdWriter > columnarWriter;
 
-    if(inputMask != "")
+    if(outputFormat == "nrrd")
     {
-        typename MaskReaderType::Pointer maskReader = MaskReaderType::New();
-        maskReader->SetFileName( inputMask );
-        maskReader->Update();
-        typename itk::ImageRegionConstIterator< InputMaskType > maskIt( maskReader->GetOutput(),  maskReader->GetOutput()->GetRequestedRegion());
-        maskIt.GoToBegin ();
-        if(secondInputVolume != "")
+        // The columns of the NRRD file must be named and sized before writing any row
+        while( columnNames.size() < numberOfComponents + Dimension )
         {
-            typename ReaderType::Pointer secondReader = ReaderType::New();
-            secondReader->SetFileName( secondInputVolume );
-            secondReader->Update();
-            typename itk::ImageRegionConstIterator< InputImageType > secInIt( secondReader->GetOutput(),  secondReader->GetOutput()->GetRequestedRegion());
-            secInIt.GoToBegin ();
-            const unsigned int SecondVectorComponentDimension = secondReader->GetOutput()->GetNumberOfComponentsPerPixel();
-
-            if(thirdInputVolume != "")
-            {
-                typename ReaderType::Pointer thirdReader = ReaderType::New();
-                thirdReader->SetFileName( thirdInputVolume );
-                thirdReader->Update();
-                typename itk::ImageRegionConstIterator< InputImageType > thirdInIt( thirdReader->GetOutput(),  thirdReader->GetOutput()->GetRequestedRegion());
-                thirdInIt.GoToBegin ();
-                const unsigned int ThirdVectorComponentDimension = thirdReader->GetOutput()->GetNumberOfComponentsPerPixel();
-
-                /// Mask + Input Volume + second and third Input Volume ///
-                while ( !inIt.IsAtEnd() )
-                {
-                    if(maskIt.Get() != 0)
-                    {
-                        inputIndex = inIt.GetIndex();
-                        for( unsigned int i = 0; i < Dimension; i++ )
-                        {
-                            outputFile<<inputIndex[i]<<",";
-                        }
-                        inputPixel = inIt.Get();
-                        for( unsigned int i = 0; i < VectorComponentDimension; i++ )
-                        {
-                            outputFile<<inputPixel[i]<<",";
-                        }
-                        inputPixel = secInIt.Get();
-                        for( unsigned int i = 0; i < SecondVectorComponentDimension; i++ )
-                        {
-                            outputFile<<inputPixel[i]<<",";
-                        }
-                        inputPixel = thirdInIt.Get();
-                        for( unsigned int i = 0; i < ThirdVectorComponentDimension; i++ )
-                        {
-                            outputFile<<inputPixel[i];
-                            if (i != (ThirdVectorComponentDimension - 1)) outputFile<<",";
-                        }
-                        outputFile<<std::endl;
-                    }
-                    ++secInIt;
-                    ++inIt;
-                    ++maskIt;
-                    ++thirdInIt;
-                }
-            }
+            std::ostringstream name;
+            name << "Feature" << columnNames.size() - Dimension + 1;
+            columnNames.push_back( name.str() );
+        }
+        columnNames.resize( numberOfComponents + Dimension );
 
-            else
+        std::size_t numberOfRows = images[0]->GetRequestedRegion().GetNumberOfPixels();
+        if( mask )
+        {
+            numberOfRows = 0;
+            typename itk::ImageRegionConstIterator< InputMaskType > maskIt( mask, mask->GetRequestedRegion());
+            for( maskIt.GoToBegin(); !maskIt.IsAtEnd(); ++maskIt )
             {
-                /// Mask + Input Volume + second Input Volume ///
-                while ( !inIt.IsAtEnd() )
-                {
-                    if(maskIt.Get() != 0)
-                    {
-                        inputIndex = inIt.GetIndex();
-                        for( unsigned int i = 0; i < Dimension; i++ )
-                        {
-                            outputFile<<inputIndex[i]<<",";
-                        }
-                        inputPixel = inIt.Get();
-                        for( unsigned int i = 0; i < VectorComponentDimension; i++ )
-                        {
-                            outputFile<<inputPixel[i]<<",";
-                        }
-                        inputPixel = secInIt.Get();
-                        for( unsigned int i = 0; i < SecondVectorComponentDimension; i++ )
-                        {
-                            outputFile<<inputPixel[i];
-                            if (i != (SecondVectorComponentDimension - 1)) outputFile<<",";
-                        }
-                        outputFile<<std::endl;
-                    }
-                    ++secInIt;
-                    ++inIt;
-                    ++maskIt;
-                }
+                numberOfRows += ( maskIt.Get() != 0 );
             }
         }
+        std::string headerFileName = outputFileBaseName;
+        std::string::size_type extension = headerFileName.rfind( ".csv" );
+        if( extension != std::string::npos && extension == headerFileName.size() - 4 )
+        {
+            headerFileName.replace( extension, 4, ".nhdr" );
+        }
 
-
-        else
+        columnarWriter.reset( new BoneTexture::ColumnarNrrdWriter( headerFileName, numberOfRows, columnNames ) );
+        if( !columnarWriter->Open() )
+        {
+            std::cerr << "Could not write " << columnarWriter->GetFileName() << std::endl;
+            return EXIT_FAILURE;
+        }
+        if( numberOfRows == 0 )
         {
+            std::cout << "The mask is empty: the table without rows is written as " << columnarWriter->GetFileName() << std::endl;
+        }
+    }
+    else
+    {
+        const char *outputFilename = outputFileBaseName.c_str();
+        outputFile.open(outputFilename, std::ios::out);
 
-            /// Mask + Input Volume///
-            while ( !inIt.IsAtEnd() )
+        if(predefineTitle)
+        {
+            for( unsigned int i = 0; i < columnNames.size(); i++ )
             {
-                if(maskIt.Get() != 0)
-                {
-                    inputIndex = inIt.GetIndex();
-                    for( unsigned int i = 0; i < Dimension; i++ )
-                    {
-                        outputFile<<inputIndex[i]<<",";
-                    }
-                    inputPixel = inIt.Get();
-                    for( unsigned int i = 0; i < VectorComponentDimension; i++ )
-                    {
-                        outputFile<<inputPixel[i];
-                        if (i != (VectorComponentDimension - 1)) outputFile<<",";
-                    }
-                    outputFile<<std::endl;
-                }
-                ++inIt;
-                ++maskIt;
+                outputFile<<columnNames[i]<<",";
             }
-
+            outputFile<<std::endl;
         }
     }
-    else
+
+    typedef itk::ImageRegionConstIterator< InputImageType > IteratorType;
+    std::vector< IteratorType > inIts;
+    for( unsigned int v = 0; v < images.size(); v++ )
+    {
+        inIts.push_back( IteratorType( images[v], images[v]->GetRequestedRegion() ) );
+        inIts.back().GoToBegin();
+    }
+    typename itk::ImageRegionConstIterator< InputMaskType > maskIt;
+    if( mask )
+    {
+        maskIt = typename itk::ImageRegionConstIterator< InputMaskType >( mask, mask->GetRequestedRegion() );
+        maskIt.GoToBegin();
+    }
+
+    typename InputImageType::PixelType inputPixel;
+    typename InputImageType::IndexType inputIndex;
+    std::vector< float > row( numberOfComponents + Dimension );
+
+    while ( !inIts[0].IsAtEnd() )
     {
-        if(secondInputVolume != "")
+        if( !mask || maskIt.Get() != 0 )
         {
-            typename ReaderType::Pointer secondReader = ReaderType::New();
-            secondReader->SetFileName( secondInputVolume );
-            secondReader->Update();
-            typename itk::ImageRegionConstIterator< InputImageType > secInIt( secondReader->GetOutput(),  secondReader->GetOutput()->GetRequestedRegion());
-            secInIt.GoToBegin ();
-            const unsigned int SecondVectorComponentDimension = reader->GetOutput()->GetNumberOfComponentsPerPixel();
-
-            if(thirdInputVolume != "")
+            inputIndex = inIts[0].GetIndex();
+            unsigned int column = 0;
+            for( unsigned int i = 0; i < Dimension; i++ )
             {
-                typename ReaderType::Pointer thirdReader = ReaderType::New();
-                thirdReader->SetFileName( thirdInputVolume );
-                thirdReader->Update();
-                typename itk::ImageRegionConstIterator< InputImageType > thirdInIt( thirdReader->GetOutput(),  thirdReader->GetOutput()->GetRequestedRegion());
-                thirdInIt.GoToBegin ();
-                const unsigned int ThirdVectorComponentDimension = thirdReader->GetOutput()->GetNumberOfComponentsPerPixel();
-
-                /// Input Volume + second and third Input Volume ///
-                while ( !inIt.IsAtEnd() )
+                if( columnarWriter.get() )
                 {
-                    inputIndex = inIt.GetIndex();
-                    for( unsigned int i = 0; i < Dimension; i++ )
-                    {
-                        outputFile<<inputIndex[i]<<",";
-                    }
-                    inputPixel = inIt.Get();
-                    for( unsigned int i = 0; i < VectorComponentDimension; i++ )
-                    {
-                        outputFile<<inputPixel[i]<<",";
-                    }
-                    inputPixel = secInIt.Get();
-                    for( unsigned int i = 0; i < SecondVectorComponentDimension; i++ )
-                    {
-                        outputFile<<inputPixel[i]<<",";
-                    }
-                    inputPixel = thirdInIt.Get();
-                    for( unsigned int i = 0; i < ThirdVectorComponentDimension; i++ )
-                    {
-                        outputFile<<inputPixel[i];
-                        if (i != (ThirdVectorComponentDimension - 1)) outputFile<<",";
-                    }
-                    outputFile<<std::endl;
-                    ++secInIt;
-                    ++inIt;
-                    ++thirdInIt;
+                    row[column++] = static_cast< float >( inputIndex[i] );
+                }
+                else
+                {
+                    outputFile<<inputIndex[i]<<",";
                 }
             }
-
-            else
+            for( unsigned int v = 0; v < inIts.size(); v++ )
             {
-
-                ///Input Volume + second Input Volume ///
-                while ( !inIt.IsAtEnd() )
+                inputPixel = inIts[v].Get();
+                const unsigned int VectorComponentDimension = inputPixel.GetSize();
+                for( unsigned int i = 0; i < VectorComponentDimension; i++ )
                 {
-
-                    inputIndex = inIt.GetIndex();
-                    for( unsigned int i = 0; i < Dimension; i++ )
+                    if( columnarWriter.get() )
                     {
-                        outputFile<<inputIndex[i]<<",";
+                        row[column++] = static_cast< float >( inputPixel[i] );
                     }
-                    inputPixel = inIt.Get();
-                    for( unsigned int i = 0; i < VectorComponentDimension; i++ )
+                    else
                     {
-                        outputFile<<inputPixel[i]<<",";
+                        outputFile<<static_cast< typename itk::NumericTraits< PixelType >::PrintType >( inputPixel[i] );
+                        if (v != inIts.size() - 1 || i != (VectorComponentDimension - 1)) outputFile<<",";
                     }
-                    inputPixel = secInIt.Get();
-                    for( unsigned int i = 0; i < SecondVectorComponentDimension; i++ )
-                    {
-                        outputFile<<inputPixel[i];
-                        if (i != (SecondVectorComponentDimension - 1)) outputFile<<",";
-                    }
-                    outputFile<<std::endl;
-                    ++secInIt;
-                    ++inIt;
                 }
             }
-        }
-
-
-        else
-        {
-
-
-            ///  Input Volume ///
-            while ( !inIt.IsAtEnd() )
+            if( columnarWriter.get() )
+            {
+                columnarWriter->AddRow( &row[0] );
+            }
+            else
             {
-                inputIndex = inIt.GetIndex();
-                for( unsigned int i = 0; i < Dimension; i++ )
-                {
-                    outputFile<<inputIndex[i]<<",";
-                }
-                inputPixel = inIt.Get();
-                for( unsigned int i = 0; i < VectorComponentDimension; i++ )
-                {
-                    outputFile<<inputPixel[i];
-                    if (i != (VectorComponentDimension - 1)) outputFile<<",";
-                }
                 outputFile<<std::endl;
-                ++inIt;
             }
         }
+        for( unsigned int v = 0; v < inIts.size(); v++ )
+        {
+            ++inIts[v];
+        }
+        if( mask )
+        {
+            ++maskIt;
+        }
+    }
 
-
+    if( columnarWriter.get() )
+    {
+        if( !columnarWriter->Close() )
+        {
+            std::cerr << "Could not write " << columnarWriter->GetDataFileName() << std::endl;
+            return EXIT_FAILURE;
+        }
+    }
+    else
+    {
+        outputFile.close();
     }
-    outputFile.close();
 
     return EXIT_SUCCESS;
 }
@@ -350,16 +277,22 @@ int main( int argc, char * argv[] )
 
         itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+        // The feature maps stored on 16 bits are decoded as floats
+        if( !BoneTexture::GetFeatureMapEncoding( inputVolume ).empty() )
+        {
+            return DoIt< float >( argc, argv );
+        }
+
         switch( inputComponentType )
         {
         case itk::ImageIOBase::UCHAR:
-            return DoIt< int >( argc, argv );
+            return DoIt< unsigned char >( argc, argv );
             break;
         case itk::ImageIOBase::USHORT:
-            return DoIt< int >( argc, argv );
+            return DoIt< unsigned short >( argc, argv );
             break;
         case itk::ImageIOBase::SHORT:
-            return DoIt< int >( argc, argv );
+            return DoIt< short >( argc, argv );
             break;
         case itk::ImageIOBase::FLOAT:
             return DoIt< float >( argc, argv );
@@ -0,0 +1,137 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+// Writes tables with ColumnarNrrdWriter and reads them back: a table of several chunks with
+// the NRRD reader of ITK, and a table without rows as a CSV file.
+
+#include "itkImage.h"
+#include "itkImageFileReader.h"
+#include "itkNrrdImageIO.h"
+
+#include "ColumnarNrrdWriter.h"
+
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <iostream>
+#include <string>
+#include <vector>
+
+int main( int argc, char * argv[] )
+{
+  if( argc < 2 )
+    {
+    std::cerr << "Usage: " << argv[0] << " outputDirectory" << std::endl;
+    return EXIT_FAILURE;
+    }
+  const std::string directory = argv[1];
+
+  std::vector< std::string > columnNames;
+  columnNames.push_back( "x" );
+  columnNames.push_back( "y" );
+  columnNames.push_back( "Energy" );
+
+  // 5 rows written by chunks of 2
+  const std::size_t numberOfRows = 5;
+  const std::string headerFileName = directory + "/ColumnarNrrdWriterTest.nhdr";
+  BoneTexture::ColumnarNrrdWriter writer( headerFileName, numberOfRows, columnNames, 2 );
+  if( !writer.Open() || writer.GetFileName() != headerFileName )
+    {
+    std::cerr << "Could not open " << headerFileName << std::endl;
+    return EXIT_FAILURE;
+    }
+  for( std::size_t r = 0; r < numberOfRows; ++r )
+    {
+    const float row[3] = { static_cast< float >( r ), 10.0f + r, 0.5f * r };
+    writer.AddRow( row );
+    }
+  if( !writer.Close() )
+    {
+    std::cerr << "Could not write " << writer.GetDataFileName() << std::endl;
+    return EXIT_FAILURE;
+    }
+
+  typedef itk::Image< float, 2 >              TableImageType;
+  typedef itk::ImageFileReader< TableImageType > ReaderType;
+  ReaderType::Pointer reader = ReaderType::New();
+  reader->SetImageIO( itk::NrrdImageIO::New() );
+  reader->SetFileName( headerFileName );
+  try
+    {
+    reader->Update();
+    }
+  catch( itk::ExceptionObject & exception )
+    {
+    std::cerr << "Could not read " << headerFileName << ": " << exception << std::endl;
+    return EXIT_FAILURE;
+    }
+  const TableImageType * table = reader->GetOutput();
+  const TableImageType::SizeType size = table->GetLargestPossibleRegion().GetSize();
+  if( size[0] != numberOfRows || size[1] != columnNames.size() )
+    {
+    std::cerr << "The table has " << size << " values instead of " << numberOfRows << " rows and "
+              << columnNames.size() << " columns" << std::endl;
+    return EXIT_FAILURE;
+    }
+  int status = EXIT_SUCCESS;
+  for( std::size_t r = 0; r < numberOfRows; ++r )
+    {
+    const float expected[3] = { static_cast< float >( r ), 10.0f + r, 0.5f * r };
+    for( std::size_t c = 0; c < columnNames.size(); ++c )
+      {
+      TableImageType::IndexType index;
+      index[0] = r;
+      index[1] = c;
+      if( table->GetPixel( index ) != expected[c] )
+        {
+        std::cerr << "Row " << r << ", column " << c << ": expected " << expected[c] << ", got "
+                  << table->GetPixel( index ) << std::endl;
+        status = EXIT_FAILURE;
+        }
+      }
+    }
+
+  // A table without rows is a CSV file of the column names
+  const std::string emptyHeaderFileName = directory + "/ColumnarNrrdWriterEmptyTest.nhdr";
+  const std::string emptyTableFileName = directory + "/ColumnarNrrdWriterEmptyTest.csv";
+  std::remove( emptyHeaderFileName.c_str() );
+  BoneTexture::ColumnarNrrdWriter emptyWriter( emptyHeaderFileName, 0, columnNames );
+  if( !emptyWriter.Open() || emptyWriter.GetFileName() != emptyTableFileName || !emptyWriter.Close() )
+    {
+    std::cerr << "Could not write the table without rows" << std::endl;
+    return EXIT_FAILURE;
+    }
+  if( std::ifstream( emptyHeaderFileName.c_str() ) )
+    {
+    std::cerr << "A NRRD header was written for the table without rows" << std::endl;
+    status = EXIT_FAILURE;
+    }
+  std::ifstream emptyTable( emptyTableFileName.c_str() );
+  std::string line;
+  std::vector< std::string > lines;
+  while( std::getline( emptyTable, line ) )
+    {
+    lines.push_back( line );
+    }
+  if( lines.size() != 1 || lines[0] != "x,y,Energy" )
+    {
+    std::cerr << "The table without rows is not the line of the column names" << std::endl;
+    status = EXIT_FAILURE;
+    }
+  return status;
+}
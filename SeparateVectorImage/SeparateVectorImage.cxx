@@ -32,10 +32,18 @@
 #include "itkMetaDataDictionary.h"
 #include "itkMetaDataObject.h"
 
-#include "itkVectorIndexSelectionCastImageFilter.h"
-
 #include "itkPluginUtilities.h"
 
+#include "CompactMask.h"
+#include "FeatureMapFiles.h"
+#include "MaskCropping.h"
+
+#include <algorithm>
+#include <atomic>
+#include <functional>
+#include <mutex>
+#include <thread>
+
 #include "SeparateVectorImageCLP.h"
 
 // Feature name lists for GLCM, GLRM, and BM
@@ -54,6 +62,22 @@ std::vector<std::string> BMFeatures = {"BoneVolumeDensity", "TrabecularThickness
 namespace
 {
 
+// Runs the function in numberOfThreads threads, the calling thread being one of them
+template< typename TFunction >
+void RunInThreads( TFunction & function, unsigned int numberOfThreads )
+{
+  std::vector< std::thread > threads;
+  for( unsigned int t = 1; t < numberOfThreads; ++t )
+    {
+    threads.push_back( std::thread( std::ref( function ) ) );
+    }
+  function();
+  for( std::vector< std::thread >::iterator it = threads.begin(); it != threads.end(); ++it )
+    {
+    it->join();
+    }
+}
+
 template< typename TPixel >
 int DoIt( int argc, char * argv[] )
 {
@@ -64,17 +88,70 @@ int DoIt( int argc, char * argv[] )
   typedef TPixel                                       PixelType;
   typedef itk::VectorImage< PixelType, Dimension >     InputImageType;
   typedef itk::Image< PixelType, Dimension >           OutputImageType;
+  typedef itk::Image< unsigned char, Dimension >       MaskImageType;
   
-  typedef itk::ImageFileReader< InputImageType > ReaderType;
-  typename ReaderType::Pointer reader = ReaderType::New();
-  reader->SetFileName( inputVolume );
-  reader->Update();
+  typename InputImageType::Pointer inputImage = BoneTexture::ReadFeatureMap< InputImageType >( inputVolume );
 
-  unsigned int VectorComponentDimension = reader->GetOutput()->GetNumberOfComponentsPerPixel();
+  unsigned int VectorComponentDimension = inputImage->GetNumberOfComponentsPerPixel();
+
+  // The outputs cover the whole input, or the bounding box of the mask
+  typename InputImageType::RegionType region = inputImage->GetLargestPossibleRegion();
+  if( inputMask != "" )
+    {
+    typename MaskImageType::Pointer mask = BoneTexture::ReadCompactMask< MaskImageType >( inputMask, BoneTexture::MaskInsideValue );
+    if( mask->GetLargestPossibleRegion().GetSize() != region.GetSize() )
+      {
+      std::cerr << "The input volume and the input mask must have the same size" << std::endl;
+      return EXIT_FAILURE;
+      }
+    if( !BoneTexture::ComputeMaskRegion< MaskImageType >( mask, region ) )
+      {
+      std::cerr << "The input mask is empty" << std::endl;
+      return EXIT_FAILURE;
+      }
+    }
+  typename OutputImageType::PointType origin;
+  inputImage->TransformIndexToPhysicalPoint( region.GetIndex(), origin );
+
+  std::vector< typename OutputImageType::Pointer > outputs( VectorComponentDimension );
+  std::vector< PixelType * > outputBuffers( VectorComponentDimension );
+  for( unsigned int i = 0; i < VectorComponentDimension; i++ )
+    {
+    outputs[i] = OutputImageType::New();
+    outputs[i]->SetRegions( typename OutputImageType::RegionType( region.GetSize() ) );
+    outputs[i]->SetSpacing( inputImage->GetSpacing() );
+    outputs[i]->SetOrigin( origin );
+    outputs[i]->SetDirection( inputImage->GetDirection() );
+    outputs[i]->Allocate();
+    outputBuffers[i] = outputs[i]->GetBufferPointer();
+    }
 
-  typedef itk::VectorIndexSelectionCastImageFilter< InputImageType, OutputImageType > IndexSelectionType;
-  typename IndexSelectionType::Pointer indexSelectionFilter = IndexSelectionType::New();
-  indexSelectionFilter->SetInput( reader->GetOutput() );
+  // All the components are de-interleaved in a single pass over the input, the rows of
+  // the region being shared between the threads
+  const unsigned int numberOfThreads = std::max( std::thread::hardware_concurrency(), 1u );
+  const typename InputImageType::SizeType size = region.GetSize();
+  const unsigned long numberOfRows = size[1] * size[2];
+  const PixelType * inputBuffer = inputImage->GetBufferPointer();
+  std::atomic< unsigned long > nextRow( 0 );
+  auto separateRows = [&]()
+  {
+    for( unsigned long row = nextRow++; row < numberOfRows; row = nextRow++ )
+      {
+      typename InputImageType::IndexType index = region.GetIndex();
+      index[1] += row % size[1];
+      index[2] += row / size[1];
+      const PixelType * input = inputBuffer + inputImage->ComputeOffset( index ) * VectorComponentDimension;
+      const unsigned long rowOffset = row * size[0];
+      for( unsigned long x = 0; x < size[0]; ++x, input += VectorComponentDimension )
+        {
+        for( unsigned int i = 0; i < VectorComponentDimension; i++ )
+          {
+          outputBuffers[i][rowOffset + x] = input[i];
+          }
+        }
+      }
+  };
+  RunInThreads( separateRows, numberOfThreads );
 
   // Select the appropriate feature name list based on VectorComponentDimension
   std::vector<std::string> featureNames;
@@ -85,6 +162,20 @@ int DoIt( int argc, char * argv[] )
     featureNames = RLFeatures;
   } else if (VectorComponentDimension == 5) {
     featureNames = BMFeatures;
+  } else if (VectorComponentDimension == 18) {
+    // Outputs of ComputeTextureFeatureMaps: GLCM, GLRLM and BM components, in that order
+    featureNames = GLCMFeatures;
+    featureNames.insert(featureNames.end(), RLFeatures.begin(), RLFeatures.end());
+  } else if (VectorComponentDimension == 13) {
+    featureNames = GLCMFeatures;
+    featureNames.insert(featureNames.end(), BMFeatures.begin(), BMFeatures.end());
+  } else if (VectorComponentDimension == 15) {
+    featureNames = RLFeatures;
+    featureNames.insert(featureNames.end(), BMFeatures.begin(), BMFeatures.end());
+  } else if (VectorComponentDimension == 23) {
+    featureNames = GLCMFeatures;
+    featureNames.insert(featureNames.end(), RLFeatures.begin(), RLFeatures.end());
+    featureNames.insert(featureNames.end(), BMFeatures.begin(), BMFeatures.end());
   } else {
       for (unsigned int i = 1; i <= VectorComponentDimension; ++i) {
         std::ostringstream ss;
@@ -93,23 +184,38 @@ int DoIt( int argc, char * argv[] )
       }
   }
 
-  for( unsigned int i = 0; i < VectorComponentDimension; i++ )
+  // The files are written concurrently
+  std::atomic< unsigned int > nextOutput( 0 );
+  std::mutex errorMutex;
+  std::string error;
+  auto writeOutputs = [&]()
+  {
+    for( unsigned int i = nextOutput++; i < VectorComponentDimension; i = nextOutput++ )
+      {
+      typedef itk::ImageFileWriter< OutputImageType > WriterType;
+      typename WriterType::Pointer writer = WriterType::New();
+      std::string outputFilename = outputFileBaseName.c_str();
+      std::string suffix = featureNames[i];
+      writer->SetFileName( outputFilename + "_" + suffix + ".nrrd" );
+      writer->SetInput( outputs[i] );
+      try
+        {
+        writer->Update();
+        }
+      catch( itk::ExceptionObject & excep )
+        {
+        std::lock_guard< std::mutex > lock( errorMutex );
+        error = excep.what();
+        }
+      }
+  };
+  RunInThreads( writeOutputs, std::min( numberOfThreads, VectorComponentDimension ) );
+  if( !error.empty() )
     {
-    indexSelectionFilter->SetIndex(i);
-
-    // Create and set up a writer
-    typedef itk::ImageFileWriter< OutputImageType > WriterType;
-    typename WriterType::Pointer writer = WriterType::New();
-    std::string outputFilename = outputFileBaseName.c_str();;
-    std::string suffix = featureNames[i];
-    writer->SetFileName( outputFilename + "_" + suffix + ".nrrd" );
-    writer->SetInput( indexSelectionFilter->GetOutput() );
-
-    writer->Update();
+    std::cerr << error << std::endl;
+    return EXIT_FAILURE;
     }
 
-
-
   return EXIT_SUCCESS;
 }
 
@@ -129,6 +235,12 @@ int main( int argc, char * argv[] )
 
     itk::GetImageType(inputVolume, inputPixelType, inputComponentType);
 
+    // The feature maps stored on 16 bits are decoded as floats
+    if( !BoneTexture::GetFeatureMapEncoding( inputVolume ).empty() )
+      {
+      return DoIt< float >( argc, argv );
+      }
+
     switch( inputComponentType )
       {
       case itk::ImageIOBase::UCHAR:
@@ -0,0 +1,205 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef ColumnarNrrdWriter_h
+#define ColumnarNrrdWriter_h
+
+#include <algorithm>
+#include <fstream>
+#include <string>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Writes a table of float values as a detached NRRD file (.nhdr header + .raw data).
+// The data is stored column after column ("sizes: rows columns"), so that each
+// column is contiguous and can be memory-mapped directly, e.g. with
+// numpy.memmap(rawFile, dtype='<f4', shape=(columns, rows)), or read as a 2D image.
+// Rows are buffered and written by chunks, so the buffer of the writer holds at most
+// chunkSize rows whatever the number of rows of the table (the images the rows come
+// from are not streamed by the writer).
+// NRRD has no empty axes, so a table without rows is written instead as a CSV file of
+// the same base name holding the line of the column names (see GetFileName()).
+class ColumnarNrrdWriter
+{
+public:
+  ColumnarNrrdWriter( const std::string & headerFileName,
+                      std::size_t numberOfRows,
+                      const std::vector< std::string > & columnNames,
+                      std::size_t chunkSize = 65536 )
+    : m_HeaderFileName( headerFileName ),
+      m_NumberOfRows( numberOfRows ),
+      m_ColumnNames( columnNames ),
+      m_ChunkSize( chunkSize ),
+      m_NumberOfWrittenRows( 0 ),
+      m_NumberOfBufferedRows( 0 )
+  {
+    std::string::size_type extension = headerFileName.find_last_of( "." );
+    std::string::size_type separator = headerFileName.find_last_of( "/\\" );
+    std::string baseName = headerFileName;
+    if( extension != std::string::npos && ( separator == std::string::npos || extension > separator ) )
+      {
+      baseName = headerFileName.substr( 0, extension );
+      }
+    m_DataFileName = baseName + ".raw";
+    m_EmptyTableFileName = baseName + ".csv";
+  }
+
+  const std::string & GetDataFileName() const
+  {
+    return m_DataFileName;
+  }
+
+  // File holding the table: the header, or the CSV file of a table without rows
+  const std::string & GetFileName() const
+  {
+    return m_NumberOfRows > 0 ? m_HeaderFileName : m_EmptyTableFileName;
+  }
+
+  // Writes the header and creates the data file, or writes the CSV file of a table
+  // without rows
+  bool Open()
+  {
+    if( m_ColumnNames.empty() )
+      {
+      return false;
+      }
+    if( m_NumberOfRows == 0 )
+      {
+      std::ofstream table( m_EmptyTableFileName.c_str() );
+      for( std::size_t c = 0; c < m_ColumnNames.size(); ++c )
+        {
+        table << ( c ? "," : "" ) << m_ColumnNames[c];
+        }
+      table << std::endl;
+      return table.good();
+      }
+    std::ofstream header( m_HeaderFileName.c_str() );
+    if( !header )
+      {
+      return false;
+      }
+    std::string dataFileName = m_DataFileName;
+    std::string::size_type separator = dataFileName.find_last_of( "/\\" );
+    if( separator != std::string::npos )
+      {
+      dataFileName = dataFileName.substr( separator + 1 );
+      }
+    const unsigned int one = 1;
+    const bool littleEndian = *reinterpret_cast< const unsigned char * >( &one ) == 1;
+
+    header << "NRRD0004" << std::endl;
+    header << "# Complete NRRD file format specification at:" << std::endl;
+    header << "# http://teem.sourceforge.net/nrrd/format.html" << std::endl;
+    header << "type: float" << std::endl;
+    header << "dimension: 2" << std::endl;
+    header << "sizes: " << m_NumberOfRows << " " << m_ColumnNames.size() << std::endl;
+    header << "kinds: domain domain" << std::endl;
+    header << "labels: \"row\" \"column\"" << std::endl;
+    header << "endian: " << ( littleEndian ? "little" : "big" ) << std::endl;
+    header << "encoding: raw" << std::endl;
+    header << "columns:=";
+    for( std::size_t c = 0; c < m_ColumnNames.size(); ++c )
+      {
+      header << ( c ? "," : "" ) << m_ColumnNames[c];
+      }
+    header << std::endl;
+    header << "data file: " << dataFileName << std::endl;
+    if( !header )
+      {
+      return false;
+      }
+
+    m_DataFile.open( m_DataFileName.c_str(), std::ios::out | std::ios::binary | std::ios::trunc );
+    // No more rows than the table are buffered
+    m_ChunkSize = std::min( m_ChunkSize, m_NumberOfRows );
+    m_Buffer.assign( m_ChunkSize * m_ColumnNames.size(), 0.0f );
+    return m_DataFile.good();
+  }
+
+  // Adds a row of GetNumberOfColumns() values
+  bool AddRow( const float * values )
+  {
+    if( m_NumberOfWrittenRows + m_NumberOfBufferedRows >= m_NumberOfRows )
+      {
+      return false;
+      }
+    // The buffer is stored column after column, like the data file
+    for( std::size_t c = 0; c < m_ColumnNames.size(); ++c )
+      {
+      m_Buffer[c * m_ChunkSize + m_NumberOfBufferedRows] = values[c];
+      }
+    if( ++m_NumberOfBufferedRows == m_ChunkSize )
+      {
+      return this->Flush();
+      }
+    return true;
+  }
+
+  // Writes the buffered rows and closes the data file
+  bool Close()
+  {
+    if( m_NumberOfRows == 0 )
+      {
+      return true;
+      }
+    bool success = this->Flush() && m_NumberOfWrittenRows == m_NumberOfRows;
+    m_DataFile.close();
+    return success;
+  }
+
+  std::size_t GetNumberOfColumns() const
+  {
+    return m_ColumnNames.size();
+  }
+
+private:
+  bool Flush()
+  {
+    if( m_NumberOfBufferedRows == 0 )
+      {
+      return m_DataFile.good();
+      }
+    for( std::size_t c = 0; c < m_ColumnNames.size(); ++c )
+      {
+      const std::streamoff position = static_cast< std::streamoff >( ( c * m_NumberOfRows + m_NumberOfWrittenRows ) * sizeof( float ) );
+      m_DataFile.seekp( position );
+      m_DataFile.write( reinterpret_cast< const char * >( &m_Buffer[c * m_ChunkSize] ),
+                        static_cast< std::streamsize >( m_NumberOfBufferedRows * sizeof( float ) ) );
+      }
+    m_NumberOfWrittenRows += m_NumberOfBufferedRows;
+    m_NumberOfBufferedRows = 0;
+    return m_DataFile.good();
+  }
+
+  std::string                m_HeaderFileName;
+  std::string                m_DataFileName;
+  std::string                m_EmptyTableFileName;
+  std::size_t                m_NumberOfRows;
+  std::vector< std::string > m_ColumnNames;
+  std::size_t                m_ChunkSize;
+  std::size_t                m_NumberOfWrittenRows;
+  std::size_t                m_NumberOfBufferedRows;
+  std::vector< float >       m_Buffer;
+  std::ofstream              m_DataFile;
+};
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,193 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef CompactMask_h
+#define CompactMask_h
+
+// Masks are read as compact images, typically of unsigned char, whatever the pixel type of
+// their file: the feature filters only need to know which voxels are in the mask. A voxel
+// holds MaskInsideValue where the label of the file is the inside value given to the CLI,
+// MaskOtherLabelValue where it is another non-zero label, and 0 elsewhere. The filters
+// comparing the mask to an inside value (given MaskInsideValue) and the ones using its
+// non-zero voxels thus select the same voxels as with the labels of the file.
+
+#include "itkImage.h"
+#include "itkImageFileReader.h"
+#include "itkImageRegionConstIterator.h"
+#include "itkImageRegionIterator.h"
+#include "itkMacro.h"
+#include "itkRegionOfInterestImageFilter.h"
+
+#include "itkPluginUtilities.h"
+
+#include <memory>
+#include <string>
+
+namespace BoneTexture
+{
+
+const unsigned char MaskInsideValue = 1;
+const unsigned char MaskOtherLabelValue = 2;
+
+// Compact mask of the given labels
+template< typename TLabelImage, typename TMaskImage >
+typename TMaskImage::Pointer
+ConvertLabelsToMask( const TLabelImage * labels, double insideValue )
+{
+  typename TMaskImage::Pointer mask = TMaskImage::New();
+  mask->CopyInformation( labels );
+  mask->SetRegions( labels->GetBufferedRegion() );
+  mask->Allocate();
+
+  itk::ImageRegionConstIterator< TLabelImage > inIt( labels, labels->GetBufferedRegion() );
+  itk::ImageRegionIterator< TMaskImage > outIt( mask, mask->GetBufferedRegion() );
+  for( inIt.GoToBegin(), outIt.GoToBegin(); !inIt.IsAtEnd(); ++inIt, ++outIt )
+    {
+    const double label = static_cast< double >( inIt.Get() );
+    outIt.Set( label == insideValue ? MaskInsideValue : ( label != 0 ? MaskOtherLabelValue : 0 ) );
+    }
+  return mask;
+}
+
+// Reads a mask file as compact masks of the whole volume or of regions of it, the labels
+// being read with the pixel type of the file. The file is only read once when its image
+// IO cannot stream, otherwise each region is read from the file. Throws an
+// itk::ExceptionObject on failure.
+template< typename TMaskImage >
+class CompactMaskReader
+{
+public:
+  typedef typename TMaskImage::RegionType RegionType;
+  static const unsigned int ImageDimension = TMaskImage::ImageDimension;
+
+  CompactMaskReader( const std::string & fileName, double insideValue )
+  {
+    itk::ImageIOBase::IOPixelType     pixelType;
+    itk::ImageIOBase::IOComponentType componentType;
+    itk::GetImageType( fileName, pixelType, componentType );
+    switch( componentType )
+      {
+      case itk::ImageIOBase::UCHAR:
+        m_Reader.reset( new LabelReader< unsigned char >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::CHAR:
+        m_Reader.reset( new LabelReader< char >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::USHORT:
+        m_Reader.reset( new LabelReader< unsigned short >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::SHORT:
+        m_Reader.reset( new LabelReader< short >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::UINT:
+        m_Reader.reset( new LabelReader< unsigned int >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::FLOAT:
+        m_Reader.reset( new LabelReader< float >( fileName, insideValue ) );
+        break;
+      case itk::ImageIOBase::DOUBLE:
+        m_Reader.reset( new LabelReader< double >( fileName, insideValue ) );
+        break;
+      default:
+        m_Reader.reset( new LabelReader< int >( fileName, insideValue ) );
+        break;
+      }
+  }
+
+  RegionType GetLargestPossibleRegion() const
+  {
+    return m_Reader->GetLargestPossibleRegion();
+  }
+
+  typename TMaskImage::Pointer Read() const
+  {
+    return m_Reader->Read( this->GetLargestPossibleRegion() );
+  }
+
+  typename TMaskImage::Pointer Read( const RegionType & region ) const
+  {
+    return m_Reader->Read( region );
+  }
+
+private:
+  class LabelReaderBase
+  {
+  public:
+    virtual ~LabelReaderBase() {}
+    virtual RegionType GetLargestPossibleRegion() const = 0;
+    virtual typename TMaskImage::Pointer Read( const RegionType & region ) const = 0;
+  };
+
+  template< typename TLabel >
+  class LabelReader : public LabelReaderBase
+  {
+  public:
+    typedef itk::Image< TLabel, ImageDimension >   LabelImageType;
+    typedef itk::ImageFileReader< LabelImageType > ReaderType;
+
+    LabelReader( const std::string & fileName, double insideValue )
+      : m_InsideValue( insideValue )
+    {
+      m_Reader = ReaderType::New();
+      m_Reader->SetFileName( fileName );
+      m_Reader->UpdateOutputInformation();
+      if( !m_Reader->GetImageIO()->CanStreamRead() )
+        {
+        m_Reader->Update();
+        }
+    }
+
+    RegionType GetLargestPossibleRegion() const override
+    {
+      return m_Reader->GetOutput()->GetLargestPossibleRegion();
+    }
+
+    typename TMaskImage::Pointer Read( const RegionType & region ) const override
+    {
+      if( region == this->GetLargestPossibleRegion() )
+        {
+        m_Reader->Update();
+        return ConvertLabelsToMask< LabelImageType, TMaskImage >( m_Reader->GetOutput(), m_InsideValue );
+        }
+      typedef itk::RegionOfInterestImageFilter< LabelImageType, LabelImageType > ExtractFilterType;
+      typename ExtractFilterType::Pointer extract = ExtractFilterType::New();
+      extract->SetInput( m_Reader->GetOutput() );
+      extract->SetRegionOfInterest( region );
+      extract->Update();
+      return ConvertLabelsToMask< LabelImageType, TMaskImage >( extract->GetOutput(), m_InsideValue );
+    }
+
+  private:
+    typename ReaderType::Pointer m_Reader;
+    double                       m_InsideValue;
+  };
+
+  std::unique_ptr< LabelReaderBase > m_Reader;
+};
+
+// Compact mask of the whole mask file
+template< typename TMaskImage >
+typename TMaskImage::Pointer
+ReadCompactMask( const std::string & fileName, double insideValue )
+{
+  return CompactMaskReader< TMaskImage >( fileName, insideValue ).Read();
+}
+
+} // end of namespace BoneTexture
+
+#endif
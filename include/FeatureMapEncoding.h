@@ -0,0 +1,236 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapEncoding_h
+#define FeatureMapEncoding_h
+
+// Storage of the feature maps on 16 bits. The values are stored as unsigned short in the
+// NRRD file, the header giving how to decode them:
+//   BoneTexture_encoding:=float16   half precision floats (IEEE 754 binary16)
+//   BoneTexture_encoding:=fixed16   value = offset + scale * code, with one scale and one
+//                                   offset per component, given by the BoneTexture_scale
+//                                   and BoneTexture_offset fields
+// The fixed point codes span the range of the finite values of each component. Non
+// finite values are clamped to the range, NaN being stored as its minimum.
+// The conversions never compare NaN values nor divide by zero, so that the CLIs can
+// keep the floating point exceptions enabled.
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <limits>
+#include <sstream>
+#include <string>
+#include <vector>
+
+namespace BoneTexture
+{
+
+const char * const FeatureMapEncodingKey = "BoneTexture_encoding";
+const char * const FeatureMapScaleKey = "BoneTexture_scale";
+const char * const FeatureMapOffsetKey = "BoneTexture_offset";
+
+// Half precision float closest to the value (round to nearest even)
+inline unsigned short
+FloatToHalf( float value )
+{
+  unsigned int bits;
+  std::memcpy( &bits, &value, sizeof( bits ) );
+  const unsigned int sign = ( bits >> 16 ) & 0x8000u;
+  const unsigned int exponent = ( bits >> 23 ) & 0xffu;
+  unsigned int mantissa = bits & 0x7fffffu;
+
+  if( exponent == 0xffu )
+    {
+    // Infinite or NaN
+    return static_cast< unsigned short >( sign | 0x7c00u | ( mantissa ? 0x200u : 0u ) );
+    }
+  const int halfExponent = static_cast< int >( exponent ) - 127 + 15;
+  if( halfExponent >= 0x1f )
+    {
+    return static_cast< unsigned short >( sign | 0x7c00u );
+    }
+  if( halfExponent <= 0 )
+    {
+    // Subnormal half or zero
+    if( halfExponent < -10 )
+      {
+      return static_cast< unsigned short >( sign );
+      }
+    mantissa |= 0x800000u;
+    const unsigned int shift = static_cast< unsigned int >( 14 - halfExponent );
+    unsigned int half = mantissa >> shift;
+    const unsigned int remainder = mantissa & ( ( 1u << shift ) - 1u );
+    const unsigned int halfway = 1u << ( shift - 1 );
+    if( remainder > halfway || ( remainder == halfway && ( half & 1u ) ) )
+      {
+      ++half;
+      }
+    return static_cast< unsigned short >( sign | half );
+    }
+  unsigned int half = ( static_cast< unsigned int >( halfExponent ) << 10 ) | ( mantissa >> 13 );
+  const unsigned int remainder = mantissa & 0x1fffu;
+  if( remainder > 0x1000u || ( remainder == 0x1000u && ( half & 1u ) ) )
+    {
+    // May carry into the exponent, up to infinity, which is the expected rounding
+    ++half;
+    }
+  return static_cast< unsigned short >( sign | half );
+}
+
+inline float
+HalfToFloat( unsigned short half )
+{
+  const unsigned int sign = ( static_cast< unsigned int >( half ) & 0x8000u ) << 16;
+  unsigned int exponent = ( half >> 10 ) & 0x1fu;
+  unsigned int mantissa = half & 0x3ffu;
+  unsigned int bits;
+  if( exponent == 0x1fu )
+    {
+    bits = sign | 0x7f800000u | ( mantissa << 13 );
+    }
+  else if( exponent == 0 )
+    {
+    if( mantissa == 0 )
+      {
+      bits = sign;
+      }
+    else
+      {
+      // Subnormal half: normalize it
+      exponent = 127 - 15 + 1;
+      while( !( mantissa & 0x400u ) )
+        {
+        mantissa <<= 1;
+        --exponent;
+        }
+      bits = sign | ( exponent << 23 ) | ( ( mantissa & 0x3ffu ) << 13 );
+      }
+    }
+  else
+    {
+    bits = sign | ( ( exponent + 127 - 15 ) << 23 ) | ( mantissa << 13 );
+    }
+  float value;
+  std::memcpy( &value, &bits, sizeof( value ) );
+  return value;
+}
+
+// Fixed point encoding of each component of a vector image, fitted to the range of its values
+class FixedPointEncoding
+{
+public:
+  static const unsigned int MaximumCode = 65535;
+
+  // values holds numberOfVectors vectors of numberOfComponents values
+  FixedPointEncoding( const float * values, unsigned long numberOfVectors, unsigned int numberOfComponents )
+    : m_Scales( numberOfComponents, 0.0 ),
+      m_Offsets( numberOfComponents, 0.0 )
+  {
+    for( unsigned int c = 0; c < numberOfComponents; ++c )
+      {
+      bool found = false;
+      double minimum = 0;
+      double maximum = 0;
+      for( unsigned long i = 0; i < numberOfVectors; ++i )
+        {
+        const float value = values[i * numberOfComponents + c];
+        if( !std::isfinite( value ) )
+          {
+          continue;
+          }
+        minimum = found ? std::min< double >( minimum, value ) : value;
+        maximum = found ? std::max< double >( maximum, value ) : value;
+        found = true;
+        }
+      m_Offsets[c] = minimum;
+      m_Scales[c] = ( maximum - minimum ) / MaximumCode;
+      }
+  }
+
+  // Encoding read from the fields of a header
+  FixedPointEncoding( const std::string & scales, const std::string & offsets )
+  {
+    std::istringstream scaleStream( scales );
+    std::istringstream offsetStream( offsets );
+    double scale;
+    double offset;
+    while( scaleStream >> scale && offsetStream >> offset )
+      {
+      m_Scales.push_back( scale );
+      m_Offsets.push_back( offset );
+      }
+  }
+
+  unsigned int GetNumberOfComponents() const
+  {
+    return static_cast< unsigned int >( m_Scales.size() );
+  }
+
+  unsigned short Encode( float value, unsigned int component ) const
+  {
+    if( std::isnan( value ) || m_Scales[component] == 0 )
+      {
+      return 0;
+      }
+    const double code = ( value - m_Offsets[component] ) / m_Scales[component];
+    if( !( code > 0 ) )
+      {
+      return 0;
+      }
+    if( !( code < MaximumCode ) )
+      {
+      return MaximumCode;
+      }
+    return static_cast< unsigned short >( code + 0.5 );
+  }
+
+  float Decode( unsigned short code, unsigned int component ) const
+  {
+    return static_cast< float >( m_Offsets[component] + m_Scales[component] * code );
+  }
+
+  // Values of the BoneTexture_scale and BoneTexture_offset fields
+  std::string GetScales() const
+  {
+    return Format( m_Scales );
+  }
+  std::string GetOffsets() const
+  {
+    return Format( m_Offsets );
+  }
+
+private:
+  static std::string Format( const std::vector< double > & values )
+  {
+    std::ostringstream text;
+    text.precision( std::numeric_limits< double >::max_digits10 );
+    for( unsigned int i = 0; i < values.size(); ++i )
+      {
+      text << ( i ? " " : "" ) << values[i];
+      }
+    return text.str();
+  }
+
+  std::vector< double > m_Scales;
+  std::vector< double > m_Offsets;
+};
+
+} // end of namespace BoneTexture
+
+#endif
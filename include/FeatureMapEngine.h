@@ -0,0 +1,73 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapEngine_h
+#define FeatureMapEngine_h
+
+// Runs the feature map engines of the extension, which work on plain buffers, on ITK images.
+
+#include "itkImage.h"
+#include "itkMultiThreaderBase.h"
+#include "itkVectorImage.h"
+
+namespace BoneTexture
+{
+
+// Feature map of the given region of the input, computed by an engine such as
+// SlidingCoocurrenceFeatures. The map has the geometry of the input, its buffer only
+// holding the region. The mask, of the size of the input, can be null. The engine runs in
+// numberOfThreads threads, 0 using the default number of threads of ITK, which follows
+// ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS as the filters do.
+template< typename TInputImage, typename TOutputImage, typename TMaskImage, typename TEngine >
+typename TOutputImage::Pointer
+ComputeFeatureMapWithEngine( const TEngine & engine,
+                             const TInputImage * input,
+                             const TMaskImage * mask,
+                             const typename TInputImage::RegionType & region,
+                             unsigned int numberOfThreads = 0 )
+{
+  if( numberOfThreads == 0 )
+    {
+    numberOfThreads = itk::MultiThreaderBase::GetGlobalDefaultNumberOfThreads();
+    }
+
+  typename TOutputImage::Pointer featureMap = TOutputImage::New();
+  featureMap->CopyInformation( input );
+  featureMap->SetRegions( region );
+  featureMap->SetLargestPossibleRegion( input->GetLargestPossibleRegion() );
+  featureMap->SetNumberOfComponentsPerPixel( TEngine::NumberOfFeatures );
+  featureMap->Allocate();
+
+  const typename TInputImage::RegionType & bufferedRegion = input->GetBufferedRegion();
+  unsigned long size[3];
+  long regionIndex[3];
+  unsigned long regionSize[3];
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    size[d] = bufferedRegion.GetSize()[d];
+    regionIndex[d] = region.GetIndex()[d] - bufferedRegion.GetIndex()[d];
+    regionSize[d] = region.GetSize()[d];
+    }
+  engine.Compute( input->GetBufferPointer(), mask ? mask->GetBufferPointer() : 0,
+                  size, regionIndex, regionSize, featureMap->GetBufferPointer(), numberOfThreads );
+  return featureMap;
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,145 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapEngineTesting_h
+#define FeatureMapEngineTesting_h
+
+// Helpers of the tests comparing the feature map engines of the extension with the ITK
+// filters they replace, on small synthetic volumes.
+
+#include "itkImage.h"
+#include "itkImageRegionConstIteratorWithIndex.h"
+#include "itkImageRegionIteratorWithIndex.h"
+#include "itkVectorImage.h"
+
+#include <algorithm>
+#include <cmath>
+#include <iostream>
+
+namespace BoneTexture
+{
+
+// Volume of plates along x, y and z of different periods, plus a deterministic noise, with
+// values in [100, 900) and an anisotropic spacing. The volume has 'size' voxels along x, y
+// and z, and starts at index 0.
+template< typename TImage >
+typename TImage::Pointer
+CreateTestVolume( unsigned int size )
+{
+  typename TImage::Pointer volume = TImage::New();
+  typename TImage::SizeType volumeSize;
+  volumeSize.Fill( size );
+  volume->SetRegions( volumeSize );
+  typename TImage::SpacingType spacing;
+  spacing[0] = 0.5;
+  spacing[1] = 0.5;
+  spacing[2] = 1.0;
+  volume->SetSpacing( spacing );
+  volume->Allocate();
+
+  unsigned int random = 12345;
+  itk::ImageRegionIteratorWithIndex< TImage > it( volume, volume->GetLargestPossibleRegion() );
+  for( it.GoToBegin(); !it.IsAtEnd(); ++it )
+    {
+    const typename TImage::IndexType index = it.GetIndex();
+    random = random * 1103515245u + 12345u;
+    const int noise = static_cast< int >( ( random >> 16 ) % 200 );
+    const bool plate = ( index[0] % 5 ) < 2 || ( index[1] % 7 ) < 3 || ( index[2] % 4 ) == 0;
+    it.Set( static_cast< typename TImage::PixelType >( ( plate ? 700 : 100 ) + noise ) );
+    }
+  return volume;
+}
+
+// Mask of the voxels of a ball centered in the volume, of the given radius in voxels
+template< typename TMaskImage >
+typename TMaskImage::Pointer
+CreateTestMask( unsigned int size, double radius, typename TMaskImage::PixelType insideValue )
+{
+  typename TMaskImage::Pointer mask = TMaskImage::New();
+  typename TMaskImage::SizeType maskSize;
+  maskSize.Fill( size );
+  mask->SetRegions( maskSize );
+  typename TMaskImage::SpacingType spacing;
+  spacing[0] = 0.5;
+  spacing[1] = 0.5;
+  spacing[2] = 1.0;
+  mask->SetSpacing( spacing );
+  mask->Allocate();
+
+  const double center = ( size - 1 ) / 2.0;
+  itk::ImageRegionIteratorWithIndex< TMaskImage > it( mask, mask->GetLargestPossibleRegion() );
+  for( it.GoToBegin(); !it.IsAtEnd(); ++it )
+    {
+    double distance = 0.0;
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      distance += ( it.GetIndex()[d] - center ) * ( it.GetIndex()[d] - center );
+      }
+    it.Set( distance <= radius * radius ? insideValue : 0 );
+    }
+  return mask;
+}
+
+// Compares two feature maps of the same region, value by value, within a relative tolerance
+// (relative to 1 for values smaller than 1). NaN and infinite values must be the same in both
+// maps. Prints the first differences and returns the number of different values.
+template< typename TFeatureMap >
+unsigned long
+CompareFeatureMaps( const TFeatureMap * expected, const TFeatureMap * actual, double tolerance )
+{
+  const typename TFeatureMap::RegionType region = expected->GetBufferedRegion();
+  const unsigned int numberOfComponents = expected->GetNumberOfComponentsPerPixel();
+  if( actual->GetBufferedRegion() != region || actual->GetNumberOfComponentsPerPixel() != numberOfComponents )
+    {
+    std::cerr << "The feature maps do not have the same region or number of features" << std::endl;
+    return region.GetNumberOfPixels() * numberOfComponents;
+    }
+
+  unsigned long numberOfDifferences = 0;
+  itk::ImageRegionConstIteratorWithIndex< TFeatureMap > expectedIt( expected, region );
+  itk::ImageRegionConstIterator< TFeatureMap > actualIt( actual, region );
+  for( expectedIt.GoToBegin(), actualIt.GoToBegin(); !expectedIt.IsAtEnd(); ++expectedIt, ++actualIt )
+    {
+    const typename TFeatureMap::PixelType expectedValues = expectedIt.Get();
+    const typename TFeatureMap::PixelType actualValues = actualIt.Get();
+    for( unsigned int c = 0; c < numberOfComponents; ++c )
+      {
+      const double e = expectedValues[c];
+      const double a = actualValues[c];
+      const bool same = ( e != e ) ? ( a != a )
+                      : ( a == e || std::fabs( a - e ) <= tolerance * std::max( 1.0, std::fabs( e ) ) );
+      if( same )
+        {
+        continue;
+        }
+      if( ++numberOfDifferences <= 10 )
+        {
+        std::cerr << "Feature " << c << " at " << expectedIt.GetIndex() << ": expected " << e << ", got " << a << std::endl;
+        }
+      }
+    }
+  if( numberOfDifferences > 0 )
+    {
+    std::cerr << numberOfDifferences << " different feature values" << std::endl;
+    }
+  return numberOfDifferences;
+}
+
+} // end of namespace BoneTexture
+
+#endif
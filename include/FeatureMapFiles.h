@@ -0,0 +1,225 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapFiles_h
+#define FeatureMapFiles_h
+
+// Writing and reading of the feature map files with the output options of the CLIs:
+//   outputPrecision    "float32", "float16" or "fixed16" (see FeatureMapEncoding.h)
+//   outputCompression  "default", "fast" (lowest gzip level) or "none"
+// The maps stored on 16 bits are decoded by ReadFeatureMap, other applications reading
+// the codes without decoding them. The maps passed to Slicer through memory (see
+// IsInMemoryImage) are always given as floats.
+
+#include "itkImageFileReader.h"
+#include "itkImageFileWriter.h"
+#include "itkImageIOBase.h"
+#include "itkImageIOFactory.h"
+#include "itkMacro.h"
+#include "itkMetaDataObject.h"
+#include "itkVectorImage.h"
+
+#include "FeatureMapEncoding.h"
+
+#include <string>
+
+namespace BoneTexture
+{
+
+// gzip compression level of the outputCompression option, 0 meaning no compression
+inline int
+GetCompressionLevel( const std::string & outputCompression )
+{
+  if( outputCompression == "none" )
+    {
+    return 0;
+    }
+  return outputCompression == "fast" ? 1 : 6;
+}
+
+// Whether the image is passed through memory: Slicer gives the images of the CLIs it runs
+// in-process (shared object modules) as "slicer:<scene>#<node ID>" URIs, that its MRML
+// image IO reads and writes in the nodes of the scene instead of files.
+inline bool
+IsInMemoryImage( const std::string & fileName )
+{
+  return fileName.compare( 0, 7, "slicer:" ) == 0;
+}
+
+// Value of the BoneTexture_encoding field of the file, empty when its values are stored as is
+inline std::string
+GetFeatureMapEncoding( const std::string & fileName )
+{
+  itk::ImageIOBase::Pointer imageIO = itk::ImageIOFactory::CreateImageIO( fileName.c_str(), itk::ImageIOFactory::ReadMode );
+  if( !imageIO )
+    {
+    itkGenericExceptionMacro( "Could not read " << fileName );
+    }
+  imageIO->SetFileName( fileName );
+  imageIO->ReadImageInformation();
+  std::string encoding;
+  itk::ExposeMetaData< std::string >( imageIO->GetMetaDataDictionary(), FeatureMapEncodingKey, encoding );
+  return encoding;
+}
+
+// Writes the image with the outputCompression option
+template< typename TImage >
+void
+WriteCompressedImage( const TImage * image, const std::string & fileName, const std::string & outputCompression )
+{
+  typedef itk::ImageFileWriter< TImage > WriterType;
+  typename WriterType::Pointer writer = WriterType::New();
+  writer->SetFileName( fileName );
+  writer->SetInput( image );
+  writer->SetUseCompression( GetCompressionLevel( outputCompression ) > 0 );
+#if ITK_VERSION_MAJOR > 5 || ( ITK_VERSION_MAJOR == 5 && ITK_VERSION_MINOR >= 1 )
+  if( outputCompression == "fast" )
+    {
+    writer->SetCompressionLevel( GetCompressionLevel( outputCompression ) );
+    }
+#endif
+  writer->Update();
+}
+
+// Writes the feature map (an itk::VectorImage< float >) with the output options of the
+// CLIs. Throws an itk::ExceptionObject on failure.
+template< typename TImage >
+void
+WriteFeatureMap( const TImage * featureMap,
+                 const std::string & fileName,
+                 const std::string & outputPrecision,
+                 const std::string & outputCompression )
+{
+  typedef itk::VectorImage< unsigned short, TImage::ImageDimension > EncodedImageType;
+
+  if( ( outputPrecision != "float16" && outputPrecision != "fixed16" ) || IsInMemoryImage( fileName ) )
+    {
+    WriteCompressedImage( featureMap, fileName, outputCompression );
+    return;
+    }
+
+  const unsigned int numberOfComponents = featureMap->GetNumberOfComponentsPerPixel();
+  typename EncodedImageType::Pointer encoded = EncodedImageType::New();
+  encoded->CopyInformation( featureMap );
+  encoded->SetRegions( featureMap->GetBufferedRegion() );
+  encoded->SetNumberOfComponentsPerPixel( numberOfComponents );
+  encoded->Allocate();
+
+  const unsigned long numberOfVectors = featureMap->GetBufferedRegion().GetNumberOfPixels();
+  const unsigned long numberOfValues = numberOfVectors * numberOfComponents;
+  const float * values = featureMap->GetBufferPointer();
+  unsigned short * codes = encoded->GetBufferPointer();
+  itk::MetaDataDictionary dictionary = featureMap->GetMetaDataDictionary();
+  if( outputPrecision == "float16" )
+    {
+    for( unsigned long i = 0; i < numberOfValues; ++i )
+      {
+      codes[i] = FloatToHalf( values[i] );
+      }
+    itk::EncapsulateMetaData< std::string >( dictionary, FeatureMapEncodingKey, "float16" );
+    }
+  else
+    {
+    const FixedPointEncoding encoding( values, numberOfVectors, numberOfComponents );
+    for( unsigned long i = 0; i < numberOfValues; ++i )
+      {
+      codes[i] = encoding.Encode( values[i], i % numberOfComponents );
+      }
+    itk::EncapsulateMetaData< std::string >( dictionary, FeatureMapEncodingKey, "fixed16" );
+    itk::EncapsulateMetaData< std::string >( dictionary, FeatureMapScaleKey, encoding.GetScales() );
+    itk::EncapsulateMetaData< std::string >( dictionary, FeatureMapOffsetKey, encoding.GetOffsets() );
+    }
+  encoded->SetMetaDataDictionary( dictionary );
+  WriteCompressedImage( encoded.GetPointer(), fileName, outputCompression );
+}
+
+// Reads a feature map file as a vector image (an itk::VectorImage), decoding the maps
+// stored on 16 bits. Throws an itk::ExceptionObject on failure.
+template< typename TImage >
+typename TImage::Pointer
+ReadFeatureMap( const std::string & fileName )
+{
+  typedef itk::VectorImage< unsigned short, TImage::ImageDimension > EncodedImageType;
+  typedef typename TImage::InternalPixelType                         ValueType;
+
+  const std::string encoding = GetFeatureMapEncoding( fileName );
+  if( encoding.empty() )
+    {
+    typedef itk::ImageFileReader< TImage > ReaderType;
+    typename ReaderType::Pointer reader = ReaderType::New();
+    reader->SetFileName( fileName );
+    reader->Update();
+    return reader->GetOutput();
+    }
+  if( encoding != "float16" && encoding != "fixed16" )
+    {
+    itkGenericExceptionMacro( "Unknown encoding " << encoding << " of " << fileName );
+    }
+
+  typedef itk::ImageFileReader< EncodedImageType > ReaderType;
+  typename ReaderType::Pointer reader = ReaderType::New();
+  reader->SetFileName( fileName );
+  reader->Update();
+  const EncodedImageType * encoded = reader->GetOutput();
+  itk::MetaDataDictionary dictionary = encoded->GetMetaDataDictionary();
+
+  const unsigned int numberOfComponents = encoded->GetNumberOfComponentsPerPixel();
+  typename TImage::Pointer featureMap = TImage::New();
+  featureMap->CopyInformation( encoded );
+  featureMap->SetRegions( encoded->GetBufferedRegion() );
+  featureMap->SetNumberOfComponentsPerPixel( numberOfComponents );
+  featureMap->Allocate();
+
+  const unsigned long numberOfValues = encoded->GetBufferedRegion().GetNumberOfPixels() * numberOfComponents;
+  const unsigned short * codes = encoded->GetBufferPointer();
+  ValueType * values = featureMap->GetBufferPointer();
+  if( encoding == "float16" )
+    {
+    for( unsigned long i = 0; i < numberOfValues; ++i )
+      {
+      values[i] = static_cast< ValueType >( HalfToFloat( codes[i] ) );
+      }
+    }
+  else
+    {
+    std::string scales;
+    std::string offsets;
+    itk::ExposeMetaData< std::string >( dictionary, FeatureMapScaleKey, scales );
+    itk::ExposeMetaData< std::string >( dictionary, FeatureMapOffsetKey, offsets );
+    const FixedPointEncoding fixedPoint( scales, offsets );
+    if( fixedPoint.GetNumberOfComponents() != numberOfComponents )
+      {
+      itkGenericExceptionMacro( "The scales and offsets of " << fileName << " do not match its number of components" );
+      }
+    for( unsigned long i = 0; i < numberOfValues; ++i )
+      {
+      values[i] = static_cast< ValueType >( fixedPoint.Decode( codes[i], i % numberOfComponents ) );
+      }
+    }
+
+  // The decoded map is stored as is
+  dictionary.Erase( FeatureMapEncodingKey );
+  dictionary.Erase( FeatureMapScaleKey );
+  dictionary.Erase( FeatureMapOffsetKey );
+  featureMap->SetMetaDataDictionary( dictionary );
+  return featureMap;
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,177 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapPipeline_h
+#define FeatureMapPipeline_h
+
+// Pipeline shared by the feature map CLIs: reading the input and the mask, cropping to the
+// mask, sampling every samplingStride voxels, computing by slabs, and writing the map with
+// its encoding. The CLIs only give the feature map of a region of an input.
+
+#include "itkImageFileReader.h"
+#include "itkMetaDataDictionary.h"
+#include "itkMetaDataObject.h"
+
+#include "CompactMask.h"
+#include "FeatureMapFiles.h"
+#include "FeatureMapSlabs.h"
+#include "MaskCropping.h"
+#include "StridedFeatureMaps.h"
+
+#include <algorithm>
+#include <cstdlib>
+#include <iostream>
+#include <map>
+#include <string>
+
+namespace BoneTexture
+{
+
+// Parameters of the feature map CLIs that are not specific to a feature family, as
+// described in their XML files
+struct FeatureMapPipelineOptions
+{
+  std::string  inputVolume;
+  std::string  inputMask;
+  double       insideMask;
+  std::string  outputVolume;
+  unsigned int neighborhoodRadius;
+  int          samplingStride;
+  std::string  samplingOutput;
+  std::string  maskCropping;
+  int          slabSize;
+  std::string  outputPrecision;
+  std::string  outputCompression;
+};
+
+// Computes the feature map of options.inputVolume and writes it in options.outputVolume.
+// computeFeatureMap( input, mask, region ) returns the feature map (an itk::VectorImage)
+// of the given region of an input and of its compact mask (null when there is no mask),
+// with the geometry of the input, as BoneTexture::ComputeFeatureMapWithEngine does.
+// Returns EXIT_FAILURE, with a message, for the options that cannot be used together,
+// EXIT_SUCCESS otherwise. Throws an itk::ExceptionObject on failure.
+template< typename TInputImage, typename TOutputImage, typename TMaskImage, typename TFeatureMapFunctor >
+int
+ComputeFeatureMapPipeline( const FeatureMapPipelineOptions & options, TFeatureMapFunctor computeFeatureMap )
+{
+  typedef typename TOutputImage::Pointer OutputImagePointer;
+
+  const bool coarseOutput = options.samplingStride > 1 && options.samplingOutput == "coarse";
+  if( coarseOutput && options.slabSize > 0 )
+    {
+    std::cerr << "The coarse feature maps cannot be computed by slabs. Use the interpolated sampling output." << std::endl;
+    return EXIT_FAILURE;
+    }
+  if( options.outputPrecision == "fixed16" && options.slabSize > 0 )
+    {
+    std::cerr << "The fixed point encoding needs the whole feature map and cannot be used with the slabs. Use float16." << std::endl;
+    return EXIT_FAILURE;
+    }
+
+  // The samples are taken every samplingStride voxels of the whole input, from its first voxel, whatever
+  // the crop or the slab they are computed in, which are padded to hold the neighborhoods of the samples
+  // around their voxels
+  typedef itk::ImageFileReader< TInputImage > ReaderType;
+  typename ReaderType::Pointer reader = ReaderType::New();
+  reader->SetFileName( options.inputVolume );
+  reader->UpdateOutputInformation();
+  const typename TInputImage::PointType samplingOrigin = reader->GetOutput()->GetOrigin();
+  const unsigned int samplingStride = static_cast< unsigned int >( std::max( options.samplingStride, 1 ) );
+  const unsigned int padding = options.neighborhoodRadius + samplingStride;
+
+  // Feature map of the whole input, evaluated every samplingStride voxels and interpolated in between
+  auto computeSampledFeatureMap = [&]( const TInputImage * input, const TMaskImage * mask ) -> OutputImagePointer
+  {
+    if( samplingStride <= 1 )
+      {
+      return computeFeatureMap( input, mask, input->GetLargestPossibleRegion() );
+      }
+    OutputImagePointer coarseMap = ComputeStridedFeatureMap< TInputImage, TOutputImage >(
+      input, mask, samplingStride, options.neighborhoodRadius + 1, samplingOrigin, computeFeatureMap );
+    return InterpolateStridedFeatureMap< TInputImage, TOutputImage >(
+      coarseMap, input, mask, samplingStride, samplingOrigin );
+  };
+
+  std::map< std::string, std::string > keyValues;
+  keyValues["DWMRI_b-value"] = "1.0";
+  keyValues["modality"] = "DWMRI";
+
+  if( options.slabSize > 0 )
+    {
+    // Only the bounding box of the mask is computed, the slabs being pasted in the whole volume
+    auto computeSlabFeatureMap = [&]( const TInputImage * input, const TMaskImage * mask ) -> OutputImagePointer
+    {
+      if( options.maskCropping == "none" )
+        {
+        return computeSampledFeatureMap( input, mask );
+        }
+      return ComputeFeatureMapInMaskRegion< TInputImage, TOutputImage >(
+        input, mask, padding, true, computeSampledFeatureMap );
+    };
+    ComputeFeatureMapBySlabs< TInputImage, TOutputImage, TMaskImage >(
+      options.inputVolume, options.inputMask, options.insideMask, options.outputVolume, options.slabSize, padding,
+      keyValues, options.outputPrecision, options.outputCompression, computeSlabFeatureMap );
+    return EXIT_SUCCESS;
+    }
+
+  reader->Update();
+
+  typename TMaskImage::Pointer mask;
+  if( options.inputMask != "" )
+    {
+    mask = ReadCompactMask< TMaskImage >( options.inputMask, options.insideMask );
+    }
+
+  // The coarse maps keep the grid of the samples, cropped to the mask unless maskCropping is "none"
+  auto computeOutputFeatureMap = [&]( const TInputImage * input, const TMaskImage * mask ) -> OutputImagePointer
+  {
+    if( coarseOutput )
+      {
+      return ComputeStridedFeatureMap< TInputImage, TOutputImage >(
+        input, mask, samplingStride, options.neighborhoodRadius + 1, samplingOrigin, computeFeatureMap );
+      }
+    return computeSampledFeatureMap( input, mask );
+  };
+
+  OutputImagePointer featureMap;
+  if( options.maskCropping == "none" )
+    {
+    featureMap = computeOutputFeatureMap( reader->GetOutput(), mask.GetPointer() );
+    }
+  else
+    {
+    featureMap = ComputeFeatureMapInMaskRegion< TInputImage, TOutputImage >(
+      reader->GetOutput(), mask.GetPointer(), padding, options.maskCropping == "pasted" && !coarseOutput,
+      computeOutputFeatureMap );
+    }
+
+  itk::MetaDataDictionary dictionary;
+  for( std::map< std::string, std::string >::const_iterator it = keyValues.begin(); it != keyValues.end(); ++it )
+    {
+    itk::EncapsulateMetaData< std::string >( dictionary, it->first, it->second );
+    }
+  featureMap->SetMetaDataDictionary( dictionary );
+
+  WriteFeatureMap< TOutputImage >( featureMap.GetPointer(), options.outputVolume, options.outputPrecision,
+                                   options.outputCompression );
+  return EXIT_SUCCESS;
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,209 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef FeatureMapSlabs_h
+#define FeatureMapSlabs_h
+
+// Out-of-core computation of the feature maps: the volume is processed by slabs of
+// slices, each slab being padded by the neighborhood radius so that its feature map is
+// the same as in the whole volume, and written to the output file as soon as it is done.
+// The peak memory is bounded by the size of a slab instead of the size of the volume.
+
+#include "itkImageFileReader.h"
+#include "itkImageIOBase.h"
+#include "itkMacro.h"
+#include "itkMetaDataObject.h"
+#include "itkRegionOfInterestImageFilter.h"
+
+#include "CompactMask.h"
+#include "FeatureMapFiles.h"
+#include "StreamingNrrdWriter.h"
+
+#include <algorithm>
+#include <map>
+#include <memory>
+#include <string>
+
+namespace BoneTexture
+{
+
+// Sub-region of the reader output, read from the file only when the image IO can
+// stream (otherwise the reader output is read once and kept in memory).
+template< typename TImage >
+typename TImage::Pointer
+ExtractSlab( itk::ImageFileReader< TImage > * reader, const typename TImage::RegionType & region )
+{
+  typedef itk::RegionOfInterestImageFilter< TImage, TImage > ExtractFilterType;
+  typename ExtractFilterType::Pointer extract = ExtractFilterType::New();
+  extract->SetInput( reader->GetOutput() );
+  extract->SetRegionOfInterest( region );
+  extract->Update();
+
+  typename TImage::Pointer slab = extract->GetOutput();
+  slab->DisconnectPipeline();
+  return slab;
+}
+
+// Computes the feature map of the input volume slab by slab and writes it in outputVolume.
+// computeFeatureMap( input, mask ) returns the feature map (an itk::VectorImage< float >)
+// of an input slab and of the mask slab (null when there is no mask), read as a compact
+// mask (see CompactMask.h) for the given inside value. Slabs hold slabSize slices along
+// the last axis, plus padding slices on each side that are only used as neighbors.
+// keyValues are added to the header of the output (e.g. the DWMRI fields).
+// outputPrecision and outputCompression are the output options of the CLIs (see
+// FeatureMapFiles.h), except "fixed16" which needs the range of the whole map. When the
+// output is passed to Slicer through memory, the slabs are gathered in the output image.
+// Throws an itk::ExceptionObject on failure.
+template< typename TInputImage, typename TOutputImage, typename TMaskImage, typename TFeatureMapFunctor >
+void
+ComputeFeatureMapBySlabs( const std::string & inputVolume,
+                          const std::string & inputMask,
+                          double maskInsideValue,
+                          const std::string & outputVolume,
+                          unsigned int slabSize,
+                          unsigned int padding,
+                          const std::map< std::string, std::string > & keyValues,
+                          const std::string & outputPrecision,
+                          const std::string & outputCompression,
+                          TFeatureMapFunctor computeFeatureMap )
+{
+  typedef itk::ImageFileReader< TInputImage > ReaderType;
+  typedef typename TInputImage::RegionType    RegionType;
+  const unsigned int SlabAxis = TInputImage::ImageDimension - 1;
+
+  typename ReaderType::Pointer reader = ReaderType::New();
+  reader->SetFileName( inputVolume );
+  reader->UpdateOutputInformation();
+  if( !reader->GetImageIO()->CanStreamRead() )
+    {
+    reader->Update();
+    }
+
+  std::unique_ptr< CompactMaskReader< TMaskImage > > maskReader;
+  if( !inputMask.empty() )
+    {
+    maskReader.reset( new CompactMaskReader< TMaskImage >( inputMask, maskInsideValue ) );
+    }
+
+  const TInputImage * information = reader->GetOutput();
+  const RegionType largestRegion = information->GetLargestPossibleRegion();
+  if( maskReader && maskReader->GetLargestPossibleRegion().GetSize() != largestRegion.GetSize() )
+    {
+    itkGenericExceptionMacro( "The input volume and the input mask must have the same size" );
+    }
+
+  unsigned long size[3];
+  double spacing[3];
+  double origin[3];
+  double direction[9];
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    size[d] = largestRegion.GetSize()[d];
+    spacing[d] = information->GetSpacing()[d];
+    origin[d] = information->GetOrigin()[d];
+    for( unsigned int e = 0; e < 3; ++e )
+      {
+      direction[3 * d + e] = information->GetDirection()[d][e];
+      }
+    }
+
+  const long firstSlice = largestRegion.GetIndex()[SlabAxis];
+  const long endSlice = firstSlice + static_cast< long >( largestRegion.GetSize()[SlabAxis] );
+  slabSize = std::max( slabSize, 1u );
+
+  // The writer (or the in-memory output) is created with the first feature map, that
+  // gives the number of components
+  const bool inMemoryOutput = IsInMemoryImage( outputVolume );
+  std::unique_ptr< StreamingNrrdWriter > writer;
+  typename TOutputImage::Pointer output;
+  for( long slabStart = firstSlice; slabStart < endSlice; slabStart += slabSize )
+    {
+    const long slabEnd = std::min( slabStart + static_cast< long >( slabSize ), endSlice );
+    const long paddedStart = std::max( slabStart - static_cast< long >( padding ), firstSlice );
+    const long paddedEnd = std::min( slabEnd + static_cast< long >( padding ), endSlice );
+
+    RegionType paddedRegion = largestRegion;
+    paddedRegion.SetIndex( SlabAxis, paddedStart );
+    paddedRegion.SetSize( SlabAxis, paddedEnd - paddedStart );
+
+    typename TInputImage::Pointer input = ExtractSlab< TInputImage >( reader, paddedRegion );
+    typename TMaskImage::Pointer mask;
+    if( maskReader )
+      {
+      mask = maskReader->Read( paddedRegion );
+      }
+
+    typename TOutputImage::Pointer featureMap = computeFeatureMap( input.GetPointer(), mask.GetPointer() );
+    const unsigned int numberOfComponents = featureMap->GetNumberOfComponentsPerPixel();
+
+    // The slices of the slab are contiguous in the buffer of the padded feature map
+    const unsigned long sliceLength = size[0] * size[1] * numberOfComponents;
+    const float * slab = featureMap->GetBufferPointer() + ( slabStart - paddedStart ) * sliceLength;
+
+    if( inMemoryOutput )
+      {
+      if( !output )
+        {
+        output = TOutputImage::New();
+        output->CopyInformation( information );
+        output->SetRegions( largestRegion );
+        output->SetNumberOfComponentsPerPixel( numberOfComponents );
+        output->Allocate();
+        }
+      std::copy( slab, slab + ( slabEnd - slabStart ) * sliceLength,
+                 output->GetBufferPointer() + ( slabStart - firstSlice ) * sliceLength );
+      continue;
+      }
+
+    if( !writer )
+      {
+      writer.reset( new StreamingNrrdWriter( outputVolume, numberOfComponents, size, spacing, origin, direction, keyValues ) );
+      writer->SetHalfPrecision( outputPrecision == "float16" );
+      writer->SetCompressionLevel( GetCompressionLevel( outputCompression ) );
+      if( !writer->Open() )
+        {
+        itkGenericExceptionMacro( "Could not write " << outputVolume );
+        }
+      }
+
+    if( !writer->WriteSlab( slab, slabEnd - slabStart ) )
+      {
+      itkGenericExceptionMacro( "Could not write " << outputVolume );
+      }
+    }
+
+  if( output )
+    {
+    itk::MetaDataDictionary dictionary;
+    for( std::map< std::string, std::string >::const_iterator it = keyValues.begin(); it != keyValues.end(); ++it )
+      {
+      itk::EncapsulateMetaData< std::string >( dictionary, it->first, it->second );
+      }
+    output->SetMetaDataDictionary( dictionary );
+    WriteFeatureMap< TOutputImage >( output.GetPointer(), outputVolume, outputPrecision, outputCompression );
+    return;
+    }
+  if( !writer || !writer->Close() )
+    {
+    itkGenericExceptionMacro( "Could not write " << outputVolume );
+    }
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,297 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef IntegralBoneMorphometryFeatures_h
+#define IntegralBoneMorphometryFeatures_h
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <functional>
+#include <limits>
+#include <thread>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Computation of the bone morphometry feature maps from summed-area tables.
+// The features of a neighborhood only depend on counts of its voxels: its number of voxels,
+// of bone voxels (value >= threshold), and along each axis its number of voxels whose next
+// voxel along the axis is on the other side of the bone surface. Each count is the sum of an
+// indicator image over a box, read in O(1) from the 3D summed-area table of the indicator,
+// built once. The features are those of the parallel plate model, normalized as in
+// itk::BoneMorphometryFeaturesFilter (and computeBMFeatures of the BoneTexture module):
+//   BV/TV = bone voxels / voxels
+//   Tb.N  = mean over the axes of (surface crossings / (voxels * spacing))
+//   Tb.Th = BV/TV / Tb.N
+//   Tb.Sp = (1 - BV/TV) / Tb.N
+//   BS/BV = 2 Tb.N / (BV/TV)
+// Only the voxels of the mask (non-zero) are counted, and the feature vector of the voxels
+// out of the mask is null. The next voxel of a counted voxel is bone or background whether
+// it is in the mask and the neighborhood or not, and background out of the image. Voxels of
+// the neighborhood out of the image are not counted. Undefined ratios are NaN or infinite,
+// as with the ITK filter, and are meant to be replaced by
+// itk::ReplaceFeatureMapNanInfImageFilter. They are produced without dividing by zero, so
+// that floating point exceptions can be enabled.
+// Images are given as buffers of size[0] * size[1] * size[2] pixels, x being the fastest.
+template< typename TPixel, typename TMask >
+class IntegralBoneMorphometryFeatures
+{
+public:
+  // BV/TV, Tb.Th, Tb.Sp, Tb.N, BS/BV
+  static const unsigned int NumberOfFeatures = 5;
+
+  IntegralBoneMorphometryFeatures( unsigned int radius, TPixel threshold, const double spacing[3] )
+    : m_Radius( radius ),
+      m_Threshold( threshold )
+  {
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      m_Spacing[d] = spacing[d];
+      }
+  }
+
+  // Computes the features of the voxels of the region (regionIndex, regionSize) of the
+  // input in output, which holds NumberOfFeatures values per voxel of the region. mask
+  // can be null. numberOfThreads = 0 uses all the cores.
+  void Compute( const TPixel * input,
+                const TMask * mask,
+                const unsigned long size[3],
+                const long regionIndex[3],
+                const unsigned long regionSize[3],
+                float * output,
+                unsigned int numberOfThreads = 0 ) const
+  {
+    if( numberOfThreads == 0 )
+      {
+      numberOfThreads = std::max( std::thread::hardware_concurrency(), 1u );
+      }
+
+    // Region and the neighborhoods of its voxels, plus the next voxel of their last voxels.
+    // The voxels out of the image are neither inside nor bone.
+    const long radius = static_cast< long >( m_Radius );
+    long origin[3];
+    long paddedSize[3];
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      origin[d] = regionIndex[d] - radius;
+      paddedSize[d] = static_cast< long >( regionSize[d] ) + 2 * radius + 1;
+      }
+    const long numberOfVoxels = paddedSize[0] * paddedSize[1] * paddedSize[2];
+    std::vector< unsigned char > inside( numberOfVoxels, 0 );
+    std::vector< unsigned char > bone( numberOfVoxels, 0 );
+    long voxel = 0;
+    for( long z = 0; z < paddedSize[2]; ++z )
+      {
+      const long k = origin[2] + z;
+      for( long y = 0; y < paddedSize[1]; ++y )
+        {
+        const long j = origin[1] + y;
+        for( long x = 0; x < paddedSize[0]; ++x, ++voxel )
+          {
+          const long i = origin[0] + x;
+          if( i < 0 || j < 0 || k < 0 || i >= static_cast< long >( size[0] ) || j >= static_cast< long >( size[1] )
+              || k >= static_cast< long >( size[2] ) )
+            {
+            continue;
+            }
+          const unsigned long pixel = ( k * size[1] + j ) * size[0] + i;
+          inside[voxel] = !mask || mask[pixel] != 0;
+          bone[voxel] = input[pixel] >= m_Threshold;
+          }
+        }
+      }
+
+    // Tables of the voxels, of the bone voxels, and along each axis of the voxels whose next
+    // voxel is on the other side of the surface
+    const long stride[3] = { 1, paddedSize[0], paddedSize[0] * paddedSize[1] };
+    std::vector< SummedAreaTable > tables( 5, SummedAreaTable( paddedSize ) );
+    std::atomic< unsigned int > nextTable( 0 );
+    auto buildTables = [&]()
+    {
+      for( unsigned int table = nextTable++; table < tables.size(); table = nextTable++ )
+        {
+        const unsigned int axis = table - 2;
+        tables[table].Build( [&]( long x, long y, long z ) -> unsigned int
+          {
+          const long v = ( z * paddedSize[1] + y ) * paddedSize[0] + x;
+          if( !inside[v] )
+            {
+            return 0;
+            }
+          if( table == 0 )
+            {
+            return 1;
+            }
+          if( table == 1 )
+            {
+            return bone[v];
+            }
+          const long position[3] = { x, y, z };
+          if( position[axis] + 1 >= paddedSize[axis] )
+            {
+            return 0; // never in a neighborhood
+            }
+          return bone[v] != bone[v + stride[axis]];
+          } );
+        }
+    };
+    this->RunInThreads( buildTables, std::min< unsigned int >( numberOfThreads, tables.size() ) );
+
+    const unsigned long numberOfRows = regionSize[1] * regionSize[2];
+    std::atomic< unsigned long > nextRow( 0 );
+    auto computeRows = [&]()
+    {
+      for( unsigned long row = nextRow++; row < numberOfRows; row = nextRow++ )
+        {
+        const long y = radius + static_cast< long >( row % regionSize[1] );
+        const long z = radius + static_cast< long >( row / regionSize[1] );
+        float * rowOutput = output + row * regionSize[0] * NumberOfFeatures;
+        for( long x = radius; x < radius + static_cast< long >( regionSize[0] ); ++x, rowOutput += NumberOfFeatures )
+          {
+          if( !inside[( z * paddedSize[1] + y ) * paddedSize[0] + x] )
+            {
+            std::fill( rowOutput, rowOutput + NumberOfFeatures, 0.0f );
+            continue;
+            }
+          long lower[3] = { x - radius, y - radius, z - radius };
+          long upper[3] = { x + radius, y + radius, z + radius };
+          const double voxels = tables[0].Sum( lower, upper );
+          const double boneVoxels = tables[1].Sum( lower, upper );
+          double intersections = 0;
+          for( unsigned int axis = 0; axis < 3; ++axis )
+            {
+            const double crossings = tables[2 + axis].Sum( lower, upper );
+            intersections += Divide( crossings, voxels * m_Spacing[axis] );
+            }
+          const double bvtv = Divide( boneVoxels, voxels );
+          const double tbn = intersections / 3.0;
+          rowOutput[0] = static_cast< float >( bvtv );
+          rowOutput[1] = static_cast< float >( Divide( bvtv, tbn ) );
+          rowOutput[2] = static_cast< float >( Divide( 1.0 - bvtv, tbn ) );
+          rowOutput[3] = static_cast< float >( tbn );
+          rowOutput[4] = static_cast< float >( Divide( 2.0 * tbn, bvtv ) );
+          }
+        }
+    };
+    this->RunInThreads( computeRows, static_cast< unsigned int >( std::min< unsigned long >( numberOfThreads, std::max( numberOfRows, 1ul ) ) ) );
+  }
+
+private:
+  // 3D summed-area table of an image of counts. The sums wrap around on 32 bits, which
+  // keeps the sums of boxes exact as long as they are below 2^32.
+  class SummedAreaTable
+  {
+  public:
+    explicit SummedAreaTable( const long size[3] )
+    {
+      for( unsigned int d = 0; d < 3; ++d )
+        {
+        m_Size[d] = size[d] + 1;
+        }
+    }
+
+    // value( x, y, z ) gives the image
+    template< typename TValueFunction >
+    void Build( TValueFunction value )
+    {
+      m_Sums.assign( m_Size[0] * m_Size[1] * m_Size[2], 0u );
+      for( long z = 1; z < m_Size[2]; ++z )
+        {
+        for( long y = 1; y < m_Size[1]; ++y )
+          {
+          unsigned int rowSum = 0;
+          for( long x = 1; x < m_Size[0]; ++x )
+            {
+            rowSum += value( x - 1, y - 1, z - 1 );
+            m_Sums[this->Offset( x, y, z )] = rowSum
+              + m_Sums[this->Offset( x, y - 1, z )]
+              + m_Sums[this->Offset( x, y, z - 1 )]
+              - m_Sums[this->Offset( x, y - 1, z - 1 )];
+            }
+          }
+        }
+    }
+
+    // Sum over the box [lower, upper] of the image, bounds included
+    unsigned int Sum( const long lower[3], const long upper[3] ) const
+    {
+      const long x0 = lower[0];
+      const long y0 = lower[1];
+      const long z0 = lower[2];
+      const long x1 = upper[0] + 1;
+      const long y1 = upper[1] + 1;
+      const long z1 = upper[2] + 1;
+      return m_Sums[this->Offset( x1, y1, z1 )]
+           - m_Sums[this->Offset( x0, y1, z1 )]
+           - m_Sums[this->Offset( x1, y0, z1 )]
+           - m_Sums[this->Offset( x1, y1, z0 )]
+           + m_Sums[this->Offset( x0, y0, z1 )]
+           + m_Sums[this->Offset( x0, y1, z0 )]
+           + m_Sums[this->Offset( x1, y0, z0 )]
+           - m_Sums[this->Offset( x0, y0, z0 )];
+    }
+
+  private:
+    long Offset( long x, long y, long z ) const
+    {
+      return ( z * m_Size[1] + y ) * m_Size[0] + x;
+    }
+
+    long                        m_Size[3];
+    std::vector< unsigned int > m_Sums;
+  };
+
+  // a / b, NaN for 0 / 0 and infinite for a / 0
+  static double Divide( double a, double b )
+  {
+    if( b != 0 )
+      {
+      return a / b;
+      }
+    if( a == 0 || a != a )
+      {
+      return std::numeric_limits< double >::quiet_NaN();
+      }
+    return a > 0 ? std::numeric_limits< double >::infinity() : -std::numeric_limits< double >::infinity();
+  }
+
+  template< typename TFunction >
+  static void RunInThreads( TFunction & function, unsigned int numberOfThreads )
+  {
+    std::vector< std::thread > threads;
+    for( unsigned int t = 1; t < numberOfThreads; ++t )
+      {
+      threads.push_back( std::thread( std::ref( function ) ) );
+      }
+    function();
+    for( std::vector< std::thread >::iterator it = threads.begin(); it != threads.end(); ++it )
+      {
+      it->join();
+      }
+  }
+
+  unsigned int m_Radius;
+  TPixel       m_Threshold;
+  double       m_Spacing[3];
+};
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,195 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef LabelFeatureTable_h
+#define LabelFeatureTable_h
+
+// Helpers shared by the scalar feature CLIs to compute the features of every
+// label of a multi-label mask from a single read of the input volume.
+
+#include "itkImage.h"
+#include "itkImageRegionConstIteratorWithIndex.h"
+#include "itkImageRegionConstIterator.h"
+#include "itkImageRegionIterator.h"
+#include "itkRegionOfInterestImageFilter.h"
+
+#include <algorithm>
+#include <fstream>
+#include <limits>
+#include <map>
+#include <string>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Bounding box of each non-zero label of the mask, computed in one pass.
+template< typename TMaskImage >
+std::map< typename TMaskImage::PixelType, typename TMaskImage::RegionType >
+ComputeLabelRegions( const TMaskImage * mask )
+{
+  typedef typename TMaskImage::PixelType  LabelType;
+  typedef typename TMaskImage::IndexType  IndexType;
+  typedef typename TMaskImage::RegionType RegionType;
+  const unsigned int Dimension = TMaskImage::ImageDimension;
+
+  std::map< LabelType, std::pair< IndexType, IndexType > > bounds;
+  itk::ImageRegionConstIteratorWithIndex< TMaskImage > it( mask, mask->GetBufferedRegion() );
+  for( it.GoToBegin(); !it.IsAtEnd(); ++it )
+    {
+    const LabelType label = it.Get();
+    if( label == 0 )
+      {
+      continue;
+      }
+    const IndexType index = it.GetIndex();
+    typename std::map< LabelType, std::pair< IndexType, IndexType > >::iterator found = bounds.find( label );
+    if( found == bounds.end() )
+      {
+      bounds[label] = std::make_pair( index, index );
+      continue;
+      }
+    for( unsigned int d = 0; d < Dimension; ++d )
+      {
+      found->second.first[d] = std::min( found->second.first[d], index[d] );
+      found->second.second[d] = std::max( found->second.second[d], index[d] );
+      }
+    }
+
+  std::map< LabelType, RegionType > regions;
+  for( typename std::map< LabelType, std::pair< IndexType, IndexType > >::const_iterator bIt = bounds.begin(); bIt != bounds.end(); ++bIt )
+    {
+    typename RegionType::SizeType size;
+    for( unsigned int d = 0; d < Dimension; ++d )
+      {
+      size[d] = bIt->second.second[d] - bIt->second.first[d] + 1;
+      }
+    regions[bIt->first] = RegionType( bIt->second.first, size );
+    }
+  return regions;
+}
+
+// Extracts the region of a label, padded by one voxel so that the neighbors used
+// by the feature filters at the border of the label are the same as in the full image.
+template< typename TImage >
+typename TImage::Pointer
+CropToLabelRegion( const TImage * image, typename TImage::RegionType region )
+{
+  region.PadByRadius( 1 );
+  region.Crop( image->GetLargestPossibleRegion() );
+
+  typedef itk::RegionOfInterestImageFilter< TImage, TImage > CropFilterType;
+  typename CropFilterType::Pointer crop = CropFilterType::New();
+  crop->SetInput( image );
+  crop->SetRegionOfInterest( region );
+  crop->Update();
+
+  typename TImage::Pointer output = crop->GetOutput();
+  output->DisconnectPipeline();
+  return output;
+}
+
+// Binary mask (1 inside the label, 0 elsewhere), which can be of a more compact pixel type
+// than the labels.
+template< typename TLabelImage, typename TMaskImage >
+typename TMaskImage::Pointer
+ExtractLabelMask( const TLabelImage * mask, typename TLabelImage::PixelType label )
+{
+  typename TMaskImage::Pointer labelMask = TMaskImage::New();
+  labelMask->CopyInformation( mask );
+  labelMask->SetRegions( mask->GetBufferedRegion() );
+  labelMask->Allocate();
+
+  itk::ImageRegionConstIterator< TLabelImage > inIt( mask, mask->GetBufferedRegion() );
+  itk::ImageRegionIterator< TMaskImage > outIt( labelMask, labelMask->GetBufferedRegion() );
+  for( inIt.GoToBegin(), outIt.GoToBegin(); !inIt.IsAtEnd(); ++inIt, ++outIt )
+    {
+    outIt.Set( inIt.Get() == label ? 1 : 0 );
+    }
+  return labelMask;
+}
+
+// Labels to process: the requested ones, or every label of the mask when none is requested.
+template< typename TLabel, typename TRegion >
+std::vector< TLabel >
+SelectLabels( const std::map< TLabel, TRegion > & regions, const std::vector< int > & requestedLabels )
+{
+  std::vector< TLabel > labels;
+  if( requestedLabels.empty() )
+    {
+    for( typename std::map< TLabel, TRegion >::const_iterator it = regions.begin(); it != regions.end(); ++it )
+      {
+      labels.push_back( it->first );
+      }
+    }
+  else
+    {
+    for( std::vector< int >::const_iterator it = requestedLabels.begin(); it != requestedLabels.end(); ++it )
+      {
+      labels.push_back( static_cast< TLabel >( *it ) );
+      }
+    }
+  return labels;
+}
+
+// Writes one row per label: "Label,<feature names>". Missing labels get NaN features.
+template< typename TLabel >
+bool
+WriteLabelFeatureTable( const std::string & fileName,
+                        const std::vector< std::string > & featureNames,
+                        const std::vector< TLabel > & labels,
+                        const std::map< TLabel, std::vector< double > > & features )
+{
+  std::ofstream table( fileName.c_str() );
+  if( !table )
+    {
+    return false;
+    }
+  table.precision( std::numeric_limits< double >::max_digits10 );
+
+  table << "Label";
+  for( std::vector< std::string >::const_iterator nIt = featureNames.begin(); nIt != featureNames.end(); ++nIt )
+    {
+    table << "," << *nIt;
+    }
+  table << std::endl;
+
+  for( typename std::vector< TLabel >::const_iterator lIt = labels.begin(); lIt != labels.end(); ++lIt )
+    {
+    table << static_cast< double >( *lIt );
+    typename std::map< TLabel, std::vector< double > >::const_iterator found = features.find( *lIt );
+    for( unsigned int i = 0; i < featureNames.size(); ++i )
+      {
+      table << ",";
+      if( found != features.end() && i < found->second.size() )
+        {
+        table << found->second[i];
+        }
+      else
+        {
+        table << "NaN";
+        }
+      }
+    table << std::endl;
+    }
+  return true;
+}
+
+} // end of namespace BoneTexture
+
+#endif
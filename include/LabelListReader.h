@@ -0,0 +1,220 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef LabelListReader_h
+#define LabelListReader_h
+
+#include <cstdio>
+#include <cstring>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Bulk readers of lists of labeled voxels, as written from classifier outputs:
+// - CSV lines "i,j,k,label[,...]", the label being looked up in a table of label names,
+// - binary records of four little-endian int32 values (i, j, k, label).
+// Each voxel is passed to a functor f(i, j, k, value), so that the caller can write
+// directly into its image buffer. The files are read by large blocks.
+class LabelListReader
+{
+public:
+  typedef std::unordered_map< std::string, unsigned int > LabelValuesType;
+
+  static const std::size_t BlockSize = 1 << 22;
+
+  // Returns the number of lines that could not be parsed, or -1 if the file can not be read.
+  // Labels missing from labelValues get the value 0.
+  template< typename TFunctor >
+  static long ReadCSV( const std::string & fileName, const LabelValuesType & labelValues, TFunctor & f )
+  {
+    std::FILE * file = std::fopen( fileName.c_str(), "rb" );
+    if( !file )
+      {
+      return -1;
+      }
+    std::vector< char > buffer( BlockSize );
+    std::string pending;
+    std::string label;
+    long numberOfInvalidLines = 0;
+
+    std::size_t numberOfReadBytes;
+    while( ( numberOfReadBytes = std::fread( &buffer[0], 1, buffer.size(), file ) ) > 0 )
+      {
+      const char * begin = &buffer[0];
+      const char * end = begin + numberOfReadBytes;
+      const char * lineBegin = begin;
+      for( const char * c = begin; c != end; ++c )
+        {
+        if( *c != '\n' )
+          {
+          continue;
+          }
+        if( pending.empty() )
+          {
+          numberOfInvalidLines += !ParseLine( lineBegin, c, labelValues, label, f );
+          }
+        else
+          {
+          // Line split between two blocks
+          pending.append( lineBegin, c );
+          numberOfInvalidLines += !ParseLine( pending.data(), pending.data() + pending.size(), labelValues, label, f );
+          pending.clear();
+          }
+        lineBegin = c + 1;
+        }
+      pending.append( lineBegin, end );
+      }
+    if( !pending.empty() )
+      {
+      numberOfInvalidLines += !ParseLine( pending.data(), pending.data() + pending.size(), labelValues, label, f );
+      }
+    std::fclose( file );
+    return numberOfInvalidLines;
+  }
+
+  // Returns the number of records read, or -1 if the file can not be read or is truncated.
+  template< typename TFunctor >
+  static long ReadBinary( const std::string & fileName, TFunctor & f )
+  {
+    std::FILE * file = std::fopen( fileName.c_str(), "rb" );
+    if( !file )
+      {
+      return -1;
+      }
+    const std::size_t RecordSize = 4 * sizeof( int );
+    std::vector< unsigned char > buffer( BlockSize - BlockSize % RecordSize );
+    long numberOfRecords = 0;
+    std::size_t numberOfReadBytes;
+    bool truncated = false;
+    while( ( numberOfReadBytes = std::fread( &buffer[0], 1, buffer.size(), file ) ) > 0 )
+      {
+      truncated = ( numberOfReadBytes % RecordSize ) != 0;
+      const unsigned char * record = &buffer[0];
+      for( std::size_t r = 0; r < numberOfReadBytes / RecordSize; ++r, record += RecordSize )
+        {
+        f( ReadInt32( record ), ReadInt32( record + 4 ), ReadInt32( record + 8 ), ReadInt32( record + 12 ) );
+        ++numberOfRecords;
+        }
+      }
+    std::fclose( file );
+    return truncated ? -1 : numberOfRecords;
+  }
+
+private:
+  static int ReadInt32( const unsigned char * bytes )
+  {
+    const unsigned int value = static_cast< unsigned int >( bytes[0] )
+                             | ( static_cast< unsigned int >( bytes[1] ) << 8 )
+                             | ( static_cast< unsigned int >( bytes[2] ) << 16 )
+                             | ( static_cast< unsigned int >( bytes[3] ) << 24 );
+    int signedValue;
+    std::memcpy( &signedValue, &value, sizeof( int ) );
+    return signedValue;
+  }
+
+  static bool ParseInt( const char * & c, const char * end, long & value )
+  {
+    while( c != end && ( *c == ' ' || *c == '\t' ) )
+      {
+      ++c;
+      }
+    bool negative = false;
+    if( c != end && ( *c == '-' || *c == '+' ) )
+      {
+      negative = ( *c == '-' );
+      ++c;
+      }
+    if( c == end || *c < '0' || *c > '9' )
+      {
+      return false;
+      }
+    value = 0;
+    while( c != end && *c >= '0' && *c <= '9' )
+      {
+      value = value * 10 + ( *c - '0' );
+      ++c;
+      }
+    // Accept a zero decimal part, as in "12.0", and trailing spaces
+    if( c != end && *c == '.' )
+      {
+      ++c;
+      while( c != end && *c == '0' )
+        {
+        ++c;
+        }
+      }
+    while( c != end && ( *c == ' ' || *c == '\t' || *c == '\r' ) )
+      {
+      ++c;
+      }
+    // Any other character, as in "12abc" or "12.5", is a parse error
+    if( c != end && *c != ',' )
+      {
+      return false;
+      }
+    if( negative )
+      {
+      value = -value;
+      }
+    return true;
+  }
+
+  template< typename TFunctor >
+  static bool ParseLine( const char * c, const char * end, const LabelValuesType & labelValues,
+                         std::string & label, TFunctor & f )
+  {
+    if( c == end || ( end - c == 1 && *c == '\r' ) )
+      {
+      return true; // empty line
+      }
+    long index[3];
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      if( !ParseInt( c, end, index[d] ) || c == end )
+        {
+        return false;
+        }
+      ++c; // ','
+      }
+    // The label stops at the next field, and is stripped of spaces, quotes and carriage return
+    const char * labelEnd = c;
+    while( labelEnd != end && *labelEnd != ',' )
+      {
+      ++labelEnd;
+      }
+    while( c != labelEnd && ( *c == ' ' || *c == '"' ) )
+      {
+      ++c;
+      }
+    while( labelEnd != c && ( labelEnd[-1] == '\r' || labelEnd[-1] == ' ' || labelEnd[-1] == '"' ) )
+      {
+      --labelEnd;
+      }
+    label.assign( c, labelEnd );
+    LabelValuesType::const_iterator found = labelValues.find( label );
+    f( index[0], index[1], index[2], found != labelValues.end() ? found->second : 0 );
+    return true;
+  }
+};
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,160 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef MaskCropping_h
+#define MaskCropping_h
+
+// Helpers to compute the feature maps only around the voxels of a mask, which
+// often cover a small part of the field of view.
+
+#include "itkImage.h"
+#include "itkImageAlgorithm.h"
+#include "itkImageRegionConstIteratorWithIndex.h"
+#include "itkRegionOfInterestImageFilter.h"
+
+#include <algorithm>
+
+namespace BoneTexture
+{
+
+// Bounding box of the non-zero voxels of the mask. Returns false if the mask is empty.
+template< typename TMaskImage >
+bool
+ComputeMaskRegion( const TMaskImage * mask, typename TMaskImage::RegionType & region )
+{
+  typedef typename TMaskImage::IndexType IndexType;
+  const unsigned int Dimension = TMaskImage::ImageDimension;
+
+  IndexType lower;
+  IndexType upper;
+  bool empty = true;
+  itk::ImageRegionConstIteratorWithIndex< TMaskImage > it( mask, mask->GetBufferedRegion() );
+  for( it.GoToBegin(); !it.IsAtEnd(); ++it )
+    {
+    if( it.Get() == 0 )
+      {
+      continue;
+      }
+    const IndexType index = it.GetIndex();
+    if( empty )
+      {
+      lower = index;
+      upper = index;
+      empty = false;
+      continue;
+      }
+    for( unsigned int d = 0; d < Dimension; ++d )
+      {
+      lower[d] = std::min( lower[d], index[d] );
+      upper[d] = std::max( upper[d], index[d] );
+      }
+    }
+  if( empty )
+    {
+    return false;
+    }
+
+  typename TMaskImage::SizeType size;
+  for( unsigned int d = 0; d < Dimension; ++d )
+    {
+    size[d] = upper[d] - lower[d] + 1;
+    }
+  region = typename TMaskImage::RegionType( lower, size );
+  return true;
+}
+
+// Extracts a region of the image, padded by the given number of voxels. The origin of
+// the output is moved so that its voxels keep their physical position.
+template< typename TImage >
+typename TImage::Pointer
+CropToRegion( const TImage * image, typename TImage::RegionType region, unsigned int padding )
+{
+  region.PadByRadius( padding );
+  region.Crop( image->GetLargestPossibleRegion() );
+
+  typedef itk::RegionOfInterestImageFilter< TImage, TImage > CropFilterType;
+  typename CropFilterType::Pointer crop = CropFilterType::New();
+  crop->SetInput( image );
+  crop->SetRegionOfInterest( region );
+  crop->Update();
+
+  typename TImage::Pointer output = crop->GetOutput();
+  output->DisconnectPipeline();
+  return output;
+}
+
+// Computes the feature map of the input only in the bounding box of the mask, padded by
+// 'padding' voxels so that the neighborhoods of the voxels of the mask are the same as in
+// the whole image. computeFeatureMap( input, mask ) returns the feature map (an
+// itk::VectorImage) of an image and of its mask. The feature map of the bounding box is
+// returned, with its origin, or pasted into a map of the input extent, filled with zeros
+// elsewhere, if pasteIntoInput is true. The whole input is used when there is no mask, or
+// when the mask is empty and the map is not pasted.
+template< typename TInputImage, typename TOutputImage, typename TMaskImage, typename TFeatureMapFunctor >
+typename TOutputImage::Pointer
+ComputeFeatureMapInMaskRegion( const TInputImage * input,
+                               const TMaskImage * mask,
+                               unsigned int padding,
+                               bool pasteIntoInput,
+                               TFeatureMapFunctor computeFeatureMap )
+{
+  if( !mask )
+    {
+    return computeFeatureMap( input, mask );
+    }
+  typename TInputImage::RegionType region;
+  if( !ComputeMaskRegion< TMaskImage >( mask, region ) )
+    {
+    if( !pasteIntoInput )
+      {
+      return computeFeatureMap( input, mask );
+      }
+    // Nothing to compute: the first voxel only gives the number of features of the map
+    region = input->GetLargestPossibleRegion();
+    region.SetSize( typename TInputImage::SizeType::Filled( 1 ) );
+    padding = 0;
+    }
+  region.PadByRadius( padding );
+  region.Crop( input->GetLargestPossibleRegion() );
+
+  typename TInputImage::Pointer croppedInput = CropToRegion< TInputImage >( input, region, 0 );
+  typename TMaskImage::Pointer croppedMask = CropToRegion< TMaskImage >( mask, region, 0 );
+  typename TOutputImage::Pointer croppedFeatureMap = computeFeatureMap( croppedInput.GetPointer(), croppedMask.GetPointer() );
+  if( !pasteIntoInput )
+    {
+    return croppedFeatureMap;
+    }
+
+  typename TOutputImage::Pointer featureMap = TOutputImage::New();
+  featureMap->CopyInformation( input );
+  featureMap->SetRegions( input->GetLargestPossibleRegion() );
+  featureMap->SetNumberOfComponentsPerPixel( croppedFeatureMap->GetNumberOfComponentsPerPixel() );
+  featureMap->Allocate();
+  const itk::SizeValueType bufferLength = featureMap->GetBufferedRegion().GetNumberOfPixels()
+                                        * featureMap->GetNumberOfComponentsPerPixel();
+  std::fill( featureMap->GetBufferPointer(), featureMap->GetBufferPointer() + bufferLength,
+             typename TOutputImage::InternalPixelType( 0 ) );
+
+  itk::ImageAlgorithm::Copy( croppedFeatureMap.GetPointer(), featureMap.GetPointer(),
+                             croppedFeatureMap->GetLargestPossibleRegion(), region );
+  return featureMap;
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,53 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef NativePixelTypes_h
+#define NativePixelTypes_h
+
+// The CLIs process the scans with the pixel type of their file, which takes 1 or 2 bytes
+// per voxel for most scans instead of 4. The parameters given in intensities (histogram
+// ranges, thresholds) are pixel values for the filters, so a scan is only processed with
+// its own pixel type when they can be represented by it.
+
+#include "itkNumericTraits.h"
+
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Whether all the values can be represented by the pixel type
+template< typename TPixel >
+bool
+CanRepresentValues( const std::vector< double > & values )
+{
+  for( std::vector< double >::const_iterator it = values.begin(); it != values.end(); ++it )
+    {
+    if( *it < static_cast< double >( itk::NumericTraits< TPixel >::NonpositiveMin() )
+        || *it > static_cast< double >( itk::NumericTraits< TPixel >::max() )
+        || *it != static_cast< double >( static_cast< TPixel >( *it ) ) )
+      {
+      return false;
+      }
+    }
+  return true;
+}
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,474 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef RunLengthIndexFeatures_h
+#define RunLengthIndexFeatures_h
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <functional>
+#include <thread>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Computation of the GLRLM feature maps of itk::Statistics::RunLengthTextureFeaturesImageFilter
+// from an index of the runs of the digitized volume.
+// The filter walks the voxels of each neighborhood along each direction to find its runs,
+// so the runs of an image line are found again by all the neighborhoods crossing it. Here
+// the length of the run following each voxel is computed once per direction, and the runs
+// of a neighborhood are read by jumping from run to run along the lines crossing it: the
+// cost of a voxel is the number of runs in its neighborhood instead of the number of voxels
+// times the number of directions.
+// The conventions of the filter are kept: the 13 directions of the "previous" neighbors of
+// a voxel, runs clipped to the neighborhood, voxels out of the image replaced by the
+// nearest voxel of the image, voxels out of the mask or of [valueMinimum, valueMaximum[
+// breaking the runs, a run of n voxels having a length of (n - 1) steps, and a null
+// feature vector for the voxels out of the mask.
+// Images are given as buffers of size[0] * size[1] * size[2] pixels, x being the fastest.
+template< typename TPixel, typename TMask >
+class RunLengthIndexFeatures
+{
+public:
+  // ShortRunEmphasis, LongRunEmphasis, GreyLevelNonuniformity, RunLengthNonuniformity,
+  // LowGreyLevelRunEmphasis, HighGreyLevelRunEmphasis, ShortRunLowGreyLevelEmphasis,
+  // ShortRunHighGreyLevelEmphasis, LongRunLowGreyLevelEmphasis, LongRunHighGreyLevelEmphasis
+  static const unsigned int NumberOfFeatures = 10;
+
+  RunLengthIndexFeatures( unsigned int radius,
+                          unsigned int numberOfBins,
+                          TPixel valueMinimum,
+                          TPixel valueMaximum,
+                          double distanceMinimum,
+                          double distanceMaximum,
+                          TMask insidePixelValue,
+                          const double spacing[3] )
+    : m_Radius( radius ),
+      m_NumberOfBins( numberOfBins ),
+      m_ValueMinimum( valueMinimum ),
+      m_ValueMaximum( valueMaximum ),
+      m_DistanceMinimum( distanceMinimum ),
+      m_DistanceMaximum( distanceMaximum ),
+      m_InsidePixelValue( insidePixelValue )
+  {
+    for( int z = -1; z <= 1; ++z )
+      {
+      for( int y = -1; y <= 1; ++y )
+        {
+        for( int x = -1; x <= 1; ++x )
+          {
+          if( z < 0 || ( z == 0 && ( y < 0 || ( y == 0 && x < 0 ) ) ) )
+            {
+            // Directions pointing forward in the memory order, as normalized by the filter
+            const int sign = z != 0 ? z : ( y != 0 ? y : x );
+            Direction direction;
+            direction.offset[0] = sign * x;
+            direction.offset[1] = sign * y;
+            direction.offset[2] = sign * z;
+            float offsetDistance = 0;
+            for( unsigned int d = 0; d < 3; ++d )
+              {
+              offsetDistance += ( direction.offset[d] * spacing[d] ) * ( direction.offset[d] * spacing[d] );
+              }
+            offsetDistance = std::sqrt( offsetDistance );
+            // Histogram bin of the runs of each length that fit in a neighborhood, -1 when out of range
+            for( unsigned int pixelDistance = 0; pixelDistance <= 2 * radius; ++pixelDistance )
+              {
+              const int distanceBin = static_cast< int >( ( offsetDistance * pixelDistance - m_DistanceMinimum )
+                / ( ( m_DistanceMaximum - m_DistanceMinimum ) / static_cast< float >( m_NumberOfBins ) ) );
+              direction.distanceBins.push_back(
+                distanceBin < static_cast< int >( m_NumberOfBins ) && distanceBin >= 0 ? distanceBin : -1 );
+              }
+            m_Directions.push_back( direction );
+            }
+          }
+        }
+      }
+  }
+
+  // Computes the features of the voxels of the region (regionIndex, regionSize) of the
+  // input in output, which holds NumberOfFeatures values per voxel of the region. mask
+  // can be null. numberOfThreads = 0 uses all the cores.
+  // The index holds one byte per voxel and direction for the run lengths up to a radius of
+  // 127, and one byte per voxel for the bins up to 127 bins.
+  void Compute( const TPixel * input,
+                const TMask * mask,
+                const unsigned long size[3],
+                const long regionIndex[3],
+                const unsigned long regionSize[3],
+                float * output,
+                unsigned int numberOfThreads = 0 ) const
+  {
+    if( m_NumberOfBins <= 127 )
+      {
+      this->ComputeWithBins< signed char >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+    else if( m_NumberOfBins <= 32767 )
+      {
+      this->ComputeWithBins< short >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+    else
+      {
+      this->ComputeWithBins< int >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+  }
+
+private:
+  struct Direction
+  {
+    int                offset[3];
+    std::vector< int > distanceBins;
+  };
+
+  // Digitized input (bin of each voxel, -1 out of the value range, -10 out of the mask) and
+  // number of voxels following each voxel in its run, for each direction
+  template< typename TBin, typename TFollowing >
+  struct Index
+  {
+    typedef TBin       BinType;
+    typedef TFollowing FollowingType;
+
+    long                                      origin[3];
+    long                                      size[3];
+    std::vector< TBin >                       bins;
+    std::vector< std::vector< TFollowing > >  following;
+
+    long Offset( long x, long y, long z ) const
+    {
+      return ( z * size[1] + y ) * size[0] + x;
+    }
+  };
+
+  template< typename TBin >
+  void ComputeWithBins( const TPixel * input,
+                        const TMask * mask,
+                        const unsigned long size[3],
+                        const long regionIndex[3],
+                        const unsigned long regionSize[3],
+                        float * output,
+                        unsigned int numberOfThreads ) const
+  {
+    if( 2 * m_Radius <= 255 )
+      {
+      this->ComputeWithIndex< Index< TBin, unsigned char > >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+    else
+      {
+      this->ComputeWithIndex< Index< TBin, unsigned short > >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+  }
+
+  template< typename TIndex >
+  void ComputeWithIndex( const TPixel * input,
+                         const TMask * mask,
+                         const unsigned long size[3],
+                         const long regionIndex[3],
+                         const unsigned long regionSize[3],
+                         float * output,
+                         unsigned int numberOfThreads ) const
+  {
+    if( numberOfThreads == 0 )
+      {
+      numberOfThreads = std::max( std::thread::hardware_concurrency(), 1u );
+      }
+
+    // Digitized region and the neighborhoods of its voxels, voxels out of the image being
+    // replaced by the nearest voxel of the image
+    const long radius = static_cast< long >( m_Radius );
+    TIndex index;
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      index.origin[d] = regionIndex[d] - radius;
+      index.size[d] = static_cast< long >( regionSize[d] ) + 2 * radius;
+      }
+    index.bins.resize( index.size[0] * index.size[1] * index.size[2] );
+    typename std::vector< typename TIndex::BinType >::iterator bin = index.bins.begin();
+    for( long z = 0; z < index.size[2]; ++z )
+      {
+      const long k = std::min( std::max( index.origin[2] + z, 0l ), static_cast< long >( size[2] ) - 1 );
+      for( long y = 0; y < index.size[1]; ++y )
+        {
+        const long j = std::min( std::max( index.origin[1] + y, 0l ), static_cast< long >( size[1] ) - 1 );
+        for( long x = 0; x < index.size[0]; ++x, ++bin )
+          {
+          const long i = std::min( std::max( index.origin[0] + x, 0l ), static_cast< long >( size[0] ) - 1 );
+          const unsigned long pixel = ( k * size[1] + j ) * size[0] + i;
+          *bin = static_cast< typename TIndex::BinType >( this->Digitize( input[pixel], !mask || mask[pixel] == m_InsidePixelValue ) );
+          }
+        }
+      }
+
+    // Runs of each direction, computed in parallel
+    index.following.resize( m_Directions.size() );
+    std::atomic< unsigned int > nextDirection( 0 );
+    auto indexDirections = [&]()
+    {
+      for( unsigned int direction = nextDirection++; direction < m_Directions.size(); direction = nextDirection++ )
+        {
+        this->IndexRuns( m_Directions[direction], index, index.following[direction] );
+        }
+    };
+    this->RunInThreads( indexDirections, std::min< unsigned int >( numberOfThreads, m_Directions.size() ) );
+
+    const unsigned long numberOfRows = regionSize[1] * regionSize[2];
+    std::atomic< unsigned long > nextRow( 0 );
+    auto computeRows = [&]()
+    {
+      std::vector< unsigned int > histogram( m_NumberOfBins * m_NumberOfBins );
+      for( unsigned long row = nextRow++; row < numberOfRows; row = nextRow++ )
+        {
+        const long y = radius + static_cast< long >( row % regionSize[1] );
+        const long z = radius + static_cast< long >( row / regionSize[1] );
+        float * rowOutput = output + row * regionSize[0] * NumberOfFeatures;
+        for( long x = radius; x < radius + static_cast< long >( regionSize[0] ); ++x, rowOutput += NumberOfFeatures )
+          {
+          if( index.bins[index.Offset( x, y, z )] < -5 )
+            {
+            std::fill( rowOutput, rowOutput + NumberOfFeatures, 0.0f );
+            continue;
+            }
+          std::fill( histogram.begin(), histogram.end(), 0u );
+          unsigned int totalNumberOfRuns = 0;
+          for( unsigned int direction = 0; direction < m_Directions.size(); ++direction )
+            {
+            this->AddNeighborhoodRuns( index, direction, x, y, z, histogram, totalNumberOfRuns );
+            }
+          this->ComputeFeatures( histogram, totalNumberOfRuns, rowOutput );
+          }
+        }
+    };
+    this->RunInThreads( computeRows, static_cast< unsigned int >( std::min< unsigned long >( numberOfThreads, std::max( numberOfRows, 1ul ) ) ) );
+  }
+
+  template< typename TFunction >
+  static void RunInThreads( TFunction & function, unsigned int numberOfThreads )
+  {
+    std::vector< std::thread > threads;
+    for( unsigned int t = 1; t < numberOfThreads; ++t )
+      {
+      threads.push_back( std::thread( std::ref( function ) ) );
+      }
+    function();
+    for( std::vector< std::thread >::iterator it = threads.begin(); it != threads.end(); ++it )
+      {
+      it->join();
+      }
+  }
+
+  int Digitize( TPixel value, bool inside ) const
+  {
+    if( !inside )
+      {
+      return -10;
+      }
+    if( value < m_ValueMinimum || value >= m_ValueMaximum )
+      {
+      return -1;
+      }
+    const int bin = static_cast< int >( ( value - m_ValueMinimum )
+      / ( ( m_ValueMaximum - m_ValueMinimum ) / static_cast< float >( m_NumberOfBins ) ) );
+    return std::min( bin, static_cast< int >( m_NumberOfBins ) - 1 );
+  }
+
+  // Number of voxels following each voxel with the same value along the direction, up to
+  // the length of a neighborhood. The voxels are visited backwards so that the voxel
+  // following a voxel is done before it.
+  template< typename TIndex >
+  void IndexRuns( const Direction & direction, const TIndex & index,
+                  std::vector< typename TIndex::FollowingType > & following ) const
+  {
+    typedef typename TIndex::FollowingType FollowingType;
+    const FollowingType maximum = static_cast< FollowingType >( 2 * m_Radius );
+    const long step = index.Offset( direction.offset[0], direction.offset[1], direction.offset[2] );
+    following.assign( index.bins.size(), 0 );
+    for( long z = index.size[2] - 1; z >= 0; --z )
+      {
+      const bool zNext = z + direction.offset[2] >= 0 && z + direction.offset[2] < index.size[2];
+      for( long y = index.size[1] - 1; y >= 0; --y )
+        {
+        const bool yNext = zNext && y + direction.offset[1] >= 0 && y + direction.offset[1] < index.size[1];
+        for( long x = index.size[0] - 1; x >= 0; --x )
+          {
+          if( !yNext || x + direction.offset[0] < 0 || x + direction.offset[0] >= index.size[0] )
+            {
+            continue;
+            }
+          const long offset = index.Offset( x, y, z );
+          if( index.bins[offset + step] == index.bins[offset] )
+            {
+            following[offset] = std::min< FollowingType >( following[offset + step] + 1, maximum );
+            }
+          }
+        }
+      }
+  }
+
+  // Adds the runs of the neighborhood of (x, y, z) along a direction to the histogram. The
+  // lines of the direction enter the neighborhood on the faces of the axes along which the
+  // direction moves, each line being counted on the first of these faces it crosses.
+  template< typename TIndex >
+  void AddNeighborhoodRuns( const TIndex & index, unsigned int directionIndex, long x, long y, long z,
+                            std::vector< unsigned int > & histogram, unsigned int & totalNumberOfRuns ) const
+  {
+    const Direction & direction = m_Directions[directionIndex];
+    const std::vector< typename TIndex::FollowingType > & following = index.following[directionIndex];
+    const long radius = static_cast< long >( m_Radius );
+    const long center[3] = { x, y, z };
+    long lower[3];
+    long upper[3];
+    long entry[3];
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      lower[d] = center[d] - radius;
+      upper[d] = center[d] + radius;
+      entry[d] = direction.offset[d] > 0 ? lower[d] : upper[d];
+      }
+    const long step = index.Offset( direction.offset[0], direction.offset[1], direction.offset[2] );
+
+    for( unsigned int face = 0; face < 3; ++face )
+      {
+      if( direction.offset[face] == 0 )
+        {
+        continue;
+        }
+      const unsigned int axis1 = ( face + 1 ) % 3;
+      const unsigned int axis2 = ( face + 2 ) % 3;
+      long start[3];
+      start[face] = entry[face];
+      for( start[axis2] = lower[axis2]; start[axis2] <= upper[axis2]; ++start[axis2] )
+        {
+        for( start[axis1] = lower[axis1]; start[axis1] <= upper[axis1]; ++start[axis1] )
+          {
+          // Lines already counted on a previous face
+          bool counted = false;
+          for( unsigned int d = 0; d < face; ++d )
+            {
+            counted = counted || ( direction.offset[d] != 0 && start[d] == entry[d] );
+            }
+          if( counted )
+            {
+            continue;
+            }
+
+          // Number of voxels of the line in the neighborhood from the start
+          long remaining = 2 * radius + 1;
+          for( unsigned int d = 0; d < 3; ++d )
+            {
+            if( direction.offset[d] > 0 )
+              {
+              remaining = std::min( remaining, upper[d] - start[d] + 1 );
+              }
+            else if( direction.offset[d] < 0 )
+              {
+              remaining = std::min( remaining, start[d] - lower[d] + 1 );
+              }
+            }
+
+          long offset = index.Offset( start[0], start[1], start[2] );
+          while( remaining > 0 )
+            {
+            const long length = std::min< long >( following[offset] + 1, remaining );
+            const int bin = index.bins[offset];
+            const int distanceBin = direction.distanceBins[length - 1];
+            if( bin >= 0 && distanceBin >= 0 )
+              {
+              ++totalNumberOfRuns;
+              ++histogram[bin * m_NumberOfBins + distanceBin];
+              }
+            remaining -= length;
+            offset += length * step;
+            }
+          }
+        }
+      }
+  }
+
+  // Same computations as the filter, for the results to match
+  void ComputeFeatures( const std::vector< unsigned int > & histogram, unsigned int totalNumberOfRuns, float * output ) const
+  {
+    double shortRunEmphasis = 0;
+    double longRunEmphasis = 0;
+    double lowGreyLevelRunEmphasis = 0;
+    double highGreyLevelRunEmphasis = 0;
+    double shortRunLowGreyLevelEmphasis = 0;
+    double shortRunHighGreyLevelEmphasis = 0;
+    double longRunLowGreyLevelEmphasis = 0;
+    double longRunHighGreyLevelEmphasis = 0;
+    std::vector< double > greyLevelNonuniformityVector( m_NumberOfBins, 0.0 );
+    std::vector< double > runLengthNonuniformityVector( m_NumberOfBins, 0.0 );
+
+    for( unsigned int a = 0; a < m_NumberOfBins; ++a )
+      {
+      for( unsigned int b = 0; b < m_NumberOfBins; ++b )
+        {
+        const double frequency = histogram[a * m_NumberOfBins + b];
+        if( frequency == 0 )
+          {
+          continue;
+          }
+        const double i2 = static_cast< double >( ( a + 1 ) * ( a + 1 ) );
+        const double j2 = static_cast< double >( ( b + 1 ) * ( b + 1 ) );
+
+        shortRunEmphasis += frequency / j2;
+        longRunEmphasis += frequency * j2;
+        greyLevelNonuniformityVector[a] += frequency;
+        runLengthNonuniformityVector[b] += frequency;
+        lowGreyLevelRunEmphasis += frequency / i2;
+        highGreyLevelRunEmphasis += frequency * i2;
+        shortRunLowGreyLevelEmphasis += frequency / ( i2 * j2 );
+        shortRunHighGreyLevelEmphasis += frequency * i2 / j2;
+        longRunLowGreyLevelEmphasis += frequency * j2 / i2;
+        longRunHighGreyLevelEmphasis += frequency * i2 * j2;
+        }
+      }
+    double greyLevelNonuniformity = 0;
+    double runLengthNonuniformity = 0;
+    for( unsigned int a = 0; a < m_NumberOfBins; ++a )
+      {
+      greyLevelNonuniformity += greyLevelNonuniformityVector[a] * greyLevelNonuniformityVector[a];
+      runLengthNonuniformity += runLengthNonuniformityVector[a] * runLengthNonuniformityVector[a];
+      }
+
+    const double total = static_cast< double >( totalNumberOfRuns );
+    output[0] = static_cast< float >( shortRunEmphasis / total );
+    output[1] = static_cast< float >( longRunEmphasis / total );
+    output[2] = static_cast< float >( greyLevelNonuniformity / total );
+    output[3] = static_cast< float >( runLengthNonuniformity / total );
+    output[4] = static_cast< float >( lowGreyLevelRunEmphasis / total );
+    output[5] = static_cast< float >( highGreyLevelRunEmphasis / total );
+    output[6] = static_cast< float >( shortRunLowGreyLevelEmphasis / total );
+    output[7] = static_cast< float >( shortRunHighGreyLevelEmphasis / total );
+    output[8] = static_cast< float >( longRunLowGreyLevelEmphasis / total );
+    output[9] = static_cast< float >( longRunHighGreyLevelEmphasis / total );
+  }
+
+  unsigned int             m_Radius;
+  unsigned int             m_NumberOfBins;
+  TPixel                   m_ValueMinimum;
+  TPixel                   m_ValueMaximum;
+  double                   m_DistanceMinimum;
+  double                   m_DistanceMaximum;
+  TMask                    m_InsidePixelValue;
+  std::vector< Direction > m_Directions;
+};
+
+} // end of namespace BoneTexture
+
+#endif
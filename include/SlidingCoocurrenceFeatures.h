@@ -0,0 +1,393 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef SlidingCoocurrenceFeatures_h
+#define SlidingCoocurrenceFeatures_h
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <thread>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Incremental computation of the GLCM feature maps of
+// itk::Statistics::CoocurrenceTextureFeaturesImageFilter.
+// The filter builds the co-occurrence matrix of each neighborhood from scratch, in O(r^3)
+// per voxel. Here the voxels of a row are visited in order and the matrix of a voxel is
+// obtained from the matrix of the previous one, by removing the pairs of voxels that
+// leave the neighborhood and adding the ones that enter it, in O(r^2) per voxel.
+// The conventions of the filter are kept: the 13 offsets of the "previous" neighbors of a
+// voxel (the other 13 being counted by symmetry), pairs counted only if both voxels are in
+// the neighborhood, voxels out of the image replaced by the nearest voxel of the image,
+// voxels out of the mask or of [histogramMinimum, histogramMaximum[ ignored, and a null
+// feature vector for the voxels out of the mask.
+// Images are given as buffers of size[0] * size[1] * size[2] pixels, x being the fastest.
+template< typename TPixel, typename TMask >
+class SlidingCoocurrenceFeatures
+{
+public:
+  // Energy, Entropy, Correlation, InverseDifferenceMoment, Inertia, ClusterShade,
+  // ClusterProminence, HaralickCorrelation
+  static const unsigned int NumberOfFeatures = 8;
+
+  SlidingCoocurrenceFeatures( unsigned int radius,
+                              unsigned int numberOfBins,
+                              TPixel histogramMinimum,
+                              TPixel histogramMaximum,
+                              TMask insidePixelValue )
+    : m_Radius( radius ),
+      m_NumberOfBins( numberOfBins ),
+      m_HistogramMinimum( histogramMinimum ),
+      m_HistogramMaximum( histogramMaximum ),
+      m_InsidePixelValue( insidePixelValue )
+  {
+    for( int z = -1; z <= 1; ++z )
+      {
+      for( int y = -1; y <= 1; ++y )
+        {
+        for( int x = -1; x <= 1; ++x )
+          {
+          // Neighbors preceding the voxel in the memory order
+          if( z < 0 || ( z == 0 && ( y < 0 || ( y == 0 && x < 0 ) ) ) )
+            {
+            Offset offset = { { x, y, z } };
+            m_Offsets.push_back( offset );
+            }
+          }
+        }
+      }
+  }
+
+  // Computes the features of the voxels of the region (regionIndex, regionSize) of the
+  // input in output, which holds NumberOfFeatures values per voxel of the region. mask
+  // can be null. numberOfThreads = 0 uses all the cores.
+  // Only the region and the neighborhoods of its voxels are digitized, with one byte per
+  // voxel up to 127 bins.
+  void Compute( const TPixel * input,
+                const TMask * mask,
+                const unsigned long size[3],
+                const long regionIndex[3],
+                const unsigned long regionSize[3],
+                float * output,
+                unsigned int numberOfThreads = 0 ) const
+  {
+    if( regionSize[0] * regionSize[1] * regionSize[2] == 0 )
+      {
+      return;
+      }
+    if( m_NumberOfBins <= 127 )
+      {
+      this->ComputeWithBins< signed char >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+    else if( m_NumberOfBins <= 32767 )
+      {
+      this->ComputeWithBins< short >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+    else
+      {
+      this->ComputeWithBins< int >( input, mask, size, regionIndex, regionSize, output, numberOfThreads );
+      }
+  }
+
+private:
+  struct Offset
+  {
+    int value[3];
+  };
+
+  // Digitized input in the box [first, last] of the image: bin of each voxel, -1 out of the
+  // histogram range, -10 out of the mask. Voxels out of the box are replaced by the nearest
+  // voxel of the box, which holds the nearest voxel of the image.
+  template< typename TBin >
+  struct Volume
+  {
+    long first[3];
+    long last[3];
+    std::vector< TBin > bins;
+
+    int Get( long x, long y, long z ) const
+    {
+      x = std::min( std::max( x, first[0] ), last[0] ) - first[0];
+      y = std::min( std::max( y, first[1] ), last[1] ) - first[1];
+      z = std::min( std::max( z, first[2] ), last[2] ) - first[2];
+      return bins[( z * ( last[1] - first[1] + 1 ) + y ) * ( last[0] - first[0] + 1 ) + x];
+    }
+  };
+
+  template< typename TBin >
+  void ComputeWithBins( const TPixel * input,
+                        const TMask * mask,
+                        const unsigned long size[3],
+                        const long regionIndex[3],
+                        const unsigned long regionSize[3],
+                        float * output,
+                        unsigned int numberOfThreads ) const
+  {
+    // The pairs of the neighborhoods are at most the radius away from the region
+    Volume< TBin > volume;
+    const long radius = static_cast< long >( m_Radius );
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      volume.first[d] = std::max( regionIndex[d] - radius, 0l );
+      volume.last[d] = std::min( regionIndex[d] + static_cast< long >( regionSize[d] ) - 1 + radius,
+                                 static_cast< long >( size[d] ) - 1 );
+      }
+    volume.bins.resize( ( volume.last[0] - volume.first[0] + 1 ) * ( volume.last[1] - volume.first[1] + 1 )
+                        * ( volume.last[2] - volume.first[2] + 1 ) );
+    typename std::vector< TBin >::iterator bin = volume.bins.begin();
+    for( long z = volume.first[2]; z <= volume.last[2]; ++z )
+      {
+      for( long y = volume.first[1]; y <= volume.last[1]; ++y )
+        {
+        const unsigned long rowOffset = ( z * size[1] + y ) * size[0];
+        for( long x = volume.first[0]; x <= volume.last[0]; ++x, ++bin )
+          {
+          const unsigned long i = rowOffset + x;
+          *bin = static_cast< TBin >( this->Digitize( input[i], !mask || mask[i] == m_InsidePixelValue ) );
+          }
+        }
+      }
+
+    const unsigned long numberOfRows = regionSize[1] * regionSize[2];
+    if( numberOfThreads == 0 )
+      {
+      numberOfThreads = std::max( std::thread::hardware_concurrency(), 1u );
+      }
+    numberOfThreads = static_cast< unsigned int >( std::min< unsigned long >( numberOfThreads, std::max( numberOfRows, 1ul ) ) );
+
+    std::atomic< unsigned long > nextRow( 0 );
+    auto computeRows = [&]()
+    {
+      std::vector< unsigned int > histogram( m_NumberOfBins * m_NumberOfBins );
+      for( unsigned long row = nextRow++; row < numberOfRows; row = nextRow++ )
+        {
+        const long y = regionIndex[1] + static_cast< long >( row % regionSize[1] );
+        const long z = regionIndex[2] + static_cast< long >( row / regionSize[1] );
+        this->ComputeRow( volume, y, z, regionIndex[0], regionSize[0], histogram,
+                          output + row * regionSize[0] * NumberOfFeatures );
+        }
+    };
+    std::vector< std::thread > threads;
+    for( unsigned int t = 1; t < numberOfThreads; ++t )
+      {
+      threads.push_back( std::thread( computeRows ) );
+      }
+    computeRows();
+    for( std::vector< std::thread >::iterator it = threads.begin(); it != threads.end(); ++it )
+      {
+      it->join();
+      }
+  }
+
+  int Digitize( TPixel value, bool inside ) const
+  {
+    if( !inside )
+      {
+      return -10;
+      }
+    if( value < m_HistogramMinimum || value >= m_HistogramMaximum )
+      {
+      return -1;
+      }
+    const int bin = static_cast< int >( ( value - m_HistogramMinimum )
+      / ( ( m_HistogramMaximum - m_HistogramMinimum ) / static_cast< float >( m_NumberOfBins ) ) );
+    return std::min( bin, static_cast< int >( m_NumberOfBins ) - 1 );
+  }
+
+  // Adds (sign = 1) or removes (sign = -1) the pairs (voxel, voxel + offset) whose first
+  // voxel is in the box [first, last]
+  template< typename TBin >
+  void UpdateHistogram( const Volume< TBin > & volume, const Offset & offset, const long first[3], const long last[3],
+                        int sign, std::vector< unsigned int > & histogram, unsigned int & total ) const
+  {
+    for( long z = first[2]; z <= last[2]; ++z )
+      {
+      for( long y = first[1]; y <= last[1]; ++y )
+        {
+        for( long x = first[0]; x <= last[0]; ++x )
+          {
+          const int a = volume.Get( x, y, z );
+          if( a < 0 )
+            {
+            continue;
+            }
+          const int b = volume.Get( x + offset.value[0], y + offset.value[1], z + offset.value[2] );
+          if( b < 0 )
+            {
+            continue;
+            }
+          histogram[a * m_NumberOfBins + b] += sign;
+          histogram[b * m_NumberOfBins + a] += sign;
+          total += 2 * sign;
+          }
+        }
+      }
+  }
+
+  // Box of the first voxels of the pairs of the neighborhood of (x, y, z) for an offset
+  void PairBox( const Offset & offset, long x, long y, long z, long first[3], long last[3] ) const
+  {
+    const long center[3] = { x, y, z };
+    const long radius = static_cast< long >( m_Radius );
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      first[d] = center[d] - radius + std::max( 0, -offset.value[d] );
+      last[d] = center[d] + radius - std::max( 0, offset.value[d] );
+      }
+  }
+
+  template< typename TBin >
+  void ComputeRow( const Volume< TBin > & volume, long y, long z, long firstX, unsigned long length,
+                   std::vector< unsigned int > & histogram, float * output ) const
+  {
+    unsigned int total = 0;
+    bool upToDate = false;
+    for( long x = firstX; x < firstX + static_cast< long >( length ); ++x, output += NumberOfFeatures )
+      {
+      if( volume.Get( x, y, z ) < -5 )
+        {
+        std::fill( output, output + NumberOfFeatures, 0.0f );
+        upToDate = false;
+        continue;
+        }
+
+      for( typename std::vector< Offset >::const_iterator offset = m_Offsets.begin(); offset != m_Offsets.end(); ++offset )
+        {
+        long first[3];
+        long last[3];
+        this->PairBox( *offset, x, y, z, first, last );
+        if( !upToDate )
+          {
+          if( offset == m_Offsets.begin() )
+            {
+            std::fill( histogram.begin(), histogram.end(), 0u );
+            total = 0;
+            }
+          this->UpdateHistogram( volume, *offset, first, last, 1, histogram, total );
+          continue;
+          }
+        // Plane leaving the neighborhood of x - 1, and plane entering the one of x
+        const long entering = last[0];
+        last[0] = first[0] - 1;
+        first[0] = last[0];
+        this->UpdateHistogram( volume, *offset, first, last, -1, histogram, total );
+        first[0] = entering;
+        last[0] = entering;
+        this->UpdateHistogram( volume, *offset, first, last, 1, histogram, total );
+        }
+      upToDate = true;
+
+      this->ComputeFeatures( histogram, total, output );
+      }
+  }
+
+  // Same computations as the filter, for the results to match
+  void ComputeFeatures( const std::vector< unsigned int > & histogram, unsigned int total, float * output ) const
+  {
+    const unsigned int bins = m_NumberOfBins;
+    const double totalNumberOfFreq = total;
+
+    double pixelMean = 0;
+    std::vector< double > marginalSums( bins, 0 );
+    for( unsigned int i = 0; i < bins; ++i )
+      {
+      for( unsigned int j = 0; j < bins; ++j )
+        {
+        const double frequency = histogram[i * bins + j] / totalNumberOfFreq;
+        pixelMean += i * frequency;
+        marginalSums[i] += frequency;
+        }
+      }
+
+    // Mean and deviation of the marginal sums, computed incrementally
+    double marginalMean = marginalSums[0];
+    double marginalDevSquared = 0;
+    for( unsigned int k = 2; k <= bins; ++k )
+      {
+      const double x = marginalSums[k - 1];
+      const double mean = marginalMean + ( x - marginalMean ) / k;
+      marginalDevSquared += ( x - marginalMean ) * ( x - mean );
+      marginalMean = mean;
+      }
+    marginalDevSquared = marginalDevSquared / bins;
+
+    double pixelVariance = 0;
+    for( unsigned int i = 0; i < bins; ++i )
+      {
+      for( unsigned int j = 0; j < bins; ++j )
+        {
+        const double frequency = histogram[i * bins + j] / totalNumberOfFreq;
+        pixelVariance += ( i - pixelMean ) * ( i - pixelMean ) * frequency;
+        }
+      }
+
+    double energy = 0;
+    double entropy = 0;
+    double correlation = 0;
+    double inverseDifferenceMoment = 0;
+    double inertia = 0;
+    double clusterShade = 0;
+    double clusterProminence = 0;
+    double haralickCorrelation = 0;
+    const double log2 = std::log( 2.0 );
+    for( unsigned int i = 0; i < bins; ++i )
+      {
+      for( unsigned int j = 0; j < bins; ++j )
+        {
+        const double frequency = histogram[i * bins + j] / totalNumberOfFreq;
+        if( frequency == 0 )
+          {
+          continue;
+          }
+        const double difference = static_cast< double >( i ) - static_cast< double >( j );
+        energy += frequency * frequency;
+        entropy -= ( frequency > 0.0001 ) ? frequency * std::log( frequency ) / log2 : 0;
+        correlation += ( ( i - pixelMean ) * ( j - pixelMean ) * frequency ) / pixelVariance;
+        inverseDifferenceMoment += frequency / ( 1.0 + difference * difference );
+        inertia += difference * difference * frequency;
+        clusterShade += std::pow( ( i - pixelMean ) + ( j - pixelMean ), 3 ) * frequency;
+        clusterProminence += std::pow( ( i - pixelMean ) + ( j - pixelMean ), 4 ) * frequency;
+        haralickCorrelation += i * j * frequency;
+        }
+      }
+    haralickCorrelation = ( haralickCorrelation - marginalMean * marginalMean ) / marginalDevSquared;
+
+    output[0] = static_cast< float >( energy );
+    output[1] = static_cast< float >( entropy );
+    output[2] = static_cast< float >( correlation );
+    output[3] = static_cast< float >( inverseDifferenceMoment );
+    output[4] = static_cast< float >( inertia );
+    output[5] = static_cast< float >( clusterShade );
+    output[6] = static_cast< float >( clusterProminence );
+    output[7] = static_cast< float >( haralickCorrelation );
+  }
+
+  unsigned int          m_Radius;
+  unsigned int          m_NumberOfBins;
+  TPixel                m_HistogramMinimum;
+  TPixel                m_HistogramMaximum;
+  TMask                 m_InsidePixelValue;
+  std::vector< Offset > m_Offsets;
+};
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,267 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef StreamingNrrdWriter_h
+#define StreamingNrrdWriter_h
+
+#include "itk_zlib.h"
+
+#include "FeatureMapEncoding.h"
+
+#include <algorithm>
+#include <fstream>
+#include <map>
+#include <sstream>
+#include <string>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Writes a 3D image of float vectors as a NRRD file, slab after slab.
+// Slabs are ranges of slices along the last axis, given in the memory layout of
+// an itk::VectorImage (components, then i, j, k), so that they can be appended
+// to the file as soon as they are computed, without holding the whole image.
+// A ".nhdr" file name gives a detached header and a ".raw" (".raw.gz" if compressed)
+// data file, any other name a single file with the data following the header.
+// The values can be stored as half precision floats (see FeatureMapEncoding.h) and
+// compressed with gzip.
+class StreamingNrrdWriter
+{
+public:
+  // direction is the 3x3 direction matrix in row-major order (LPS, as in ITK),
+  // keyValues are written as "key:=value" fields (e.g. the DWMRI fields).
+  StreamingNrrdWriter( const std::string & fileName,
+                       unsigned int numberOfComponents,
+                       const unsigned long size[3],
+                       const double spacing[3],
+                       const double origin[3],
+                       const double direction[9],
+                       const std::map< std::string, std::string > & keyValues )
+    : m_FileName( fileName ),
+      m_NumberOfComponents( numberOfComponents ),
+      m_KeyValues( keyValues ),
+      m_HalfPrecision( false ),
+      m_CompressionLevel( 0 ),
+      m_NumberOfWrittenSlices( 0 ),
+      m_CompressedDataFile( 0 )
+  {
+    for( unsigned int d = 0; d < 3; ++d )
+      {
+      m_Size[d] = size[d];
+      m_Spacing[d] = spacing[d];
+      m_Origin[d] = origin[d];
+      }
+    for( unsigned int i = 0; i < 9; ++i )
+      {
+      m_Direction[i] = direction[i];
+      }
+    m_Detached = fileName.size() > 5 && fileName.compare( fileName.size() - 5, 5, ".nhdr" ) == 0;
+  }
+
+  ~StreamingNrrdWriter()
+  {
+    if( m_CompressedDataFile )
+      {
+      gzclose( m_CompressedDataFile );
+      }
+  }
+
+  StreamingNrrdWriter( const StreamingNrrdWriter & ) = delete;
+  StreamingNrrdWriter & operator=( const StreamingNrrdWriter & ) = delete;
+
+  // Stores the values as half precision floats. To call before Open.
+  void SetHalfPrecision( bool halfPrecision )
+  {
+    m_HalfPrecision = halfPrecision;
+  }
+
+  // gzip compression level of the data, from 1 (fastest) to 9 (smallest), 0 writing
+  // the raw data. To call before Open.
+  void SetCompressionLevel( int compressionLevel )
+  {
+    m_CompressionLevel = std::min( std::max( compressionLevel, 0 ), 9 );
+  }
+
+  // Writes the header and opens the data file
+  bool Open()
+  {
+    if( m_Detached )
+      {
+      m_DataFileName = m_FileName.substr( 0, m_FileName.size() - 5 ) + ( m_CompressionLevel > 0 ? ".raw.gz" : ".raw" );
+      }
+    std::ofstream header( m_FileName.c_str(), std::ios::out | std::ios::binary | std::ios::trunc );
+    if( !header )
+      {
+      return false;
+      }
+    const unsigned int one = 1;
+    const bool littleEndian = *reinterpret_cast< const unsigned char * >( &one ) == 1;
+
+    std::ostringstream text;
+    text.precision( 17 );
+    text << "NRRD0004\n";
+    text << "# Complete NRRD file format specification at:\n";
+    text << "# http://teem.sourceforge.net/nrrd/format.html\n";
+    text << "type: " << ( m_HalfPrecision ? "unsigned short" : "float" ) << "\n";
+    text << "dimension: 4\n";
+    text << "space: left-posterior-superior\n";
+    text << "sizes: " << m_NumberOfComponents << " " << m_Size[0] << " " << m_Size[1] << " " << m_Size[2] << "\n";
+    text << "space directions: none";
+    for( unsigned int axis = 0; axis < 3; ++axis )
+      {
+      // Column 'axis' of the direction matrix, scaled by the spacing
+      text << " (" << m_Direction[axis] * m_Spacing[axis]
+           << "," << m_Direction[3 + axis] * m_Spacing[axis]
+           << "," << m_Direction[6 + axis] * m_Spacing[axis] << ")";
+      }
+    text << "\n";
+    text << "kinds: list domain domain domain\n";
+    text << "endian: " << ( littleEndian ? "little" : "big" ) << "\n";
+    text << "encoding: " << ( m_CompressionLevel > 0 ? "gzip" : "raw" ) << "\n";
+    text << "space origin: (" << m_Origin[0] << "," << m_Origin[1] << "," << m_Origin[2] << ")\n";
+    for( std::map< std::string, std::string >::const_iterator it = m_KeyValues.begin(); it != m_KeyValues.end(); ++it )
+      {
+      text << it->first << ":=" << it->second << "\n";
+      }
+    if( m_HalfPrecision )
+      {
+      text << FeatureMapEncodingKey << ":=float16\n";
+      }
+    if( m_Detached )
+      {
+      std::string dataFileName = m_DataFileName;
+      std::string::size_type separator = dataFileName.find_last_of( "/\\" );
+      if( separator != std::string::npos )
+        {
+        dataFileName = dataFileName.substr( separator + 1 );
+        }
+      text << "data file: " << dataFileName << "\n";
+      }
+    else
+      {
+      // An empty line separates the header from the attached data
+      text << "\n";
+      }
+    header << text.str();
+    if( !header )
+      {
+      return false;
+      }
+
+    header.close();
+
+    const std::string dataFileName = m_Detached ? m_DataFileName : m_FileName;
+    if( m_CompressionLevel > 0 )
+      {
+      // The attached data is a gzip stream appended to the header
+      std::ostringstream mode;
+      mode << ( m_Detached ? "wb" : "ab" ) << m_CompressionLevel;
+      m_CompressedDataFile = gzopen( dataFileName.c_str(), mode.str().c_str() );
+      return m_CompressedDataFile != 0;
+      }
+    if( m_Detached )
+      {
+      m_DataFile.open( m_DataFileName.c_str(), std::ios::out | std::ios::binary | std::ios::trunc );
+      }
+    else
+      {
+      m_DataFile.open( m_FileName.c_str(), std::ios::out | std::ios::binary | std::ios::app );
+      }
+    return m_DataFile.good();
+  }
+
+  // Appends numberOfSlices slices, i.e. numberOfSlices * size[0] * size[1] vectors
+  bool WriteSlab( const float * values, unsigned long numberOfSlices )
+  {
+    if( m_NumberOfWrittenSlices + numberOfSlices > m_Size[2] )
+      {
+      return false;
+      }
+    const unsigned long numberOfValues = numberOfSlices * m_Size[0] * m_Size[1] * m_NumberOfComponents;
+    m_NumberOfWrittenSlices += numberOfSlices;
+    if( !m_HalfPrecision )
+      {
+      return this->WriteData( reinterpret_cast< const char * >( values ), numberOfValues * sizeof( float ) );
+      }
+    m_HalfBuffer.resize( numberOfValues );
+    for( unsigned long i = 0; i < numberOfValues; ++i )
+      {
+      m_HalfBuffer[i] = FloatToHalf( values[i] );
+      }
+    return this->WriteData( reinterpret_cast< const char * >( &m_HalfBuffer[0] ), numberOfValues * sizeof( unsigned short ) );
+  }
+
+  // Closes the data file. Fails if some slices were not written.
+  bool Close()
+  {
+    bool success = m_NumberOfWrittenSlices == m_Size[2];
+    if( m_CompressedDataFile )
+      {
+      success = gzclose( m_CompressedDataFile ) == Z_OK && success;
+      m_CompressedDataFile = 0;
+      }
+    else
+      {
+      success = m_DataFile.good() && success;
+      m_DataFile.close();
+      }
+    return success;
+  }
+
+private:
+  bool WriteData( const char * data, unsigned long numberOfBytes )
+  {
+    if( !m_CompressedDataFile )
+      {
+      m_DataFile.write( data, static_cast< std::streamsize >( numberOfBytes ) );
+      return m_DataFile.good();
+      }
+    // gzwrite takes the number of bytes as an unsigned int
+    const unsigned long chunkSize = 1ul << 30;
+    for( unsigned long offset = 0; offset < numberOfBytes; offset += chunkSize )
+      {
+      const unsigned int length = static_cast< unsigned int >( std::min( chunkSize, numberOfBytes - offset ) );
+      if( gzwrite( m_CompressedDataFile, data + offset, length ) != static_cast< int >( length ) )
+        {
+        return false;
+        }
+      }
+    return true;
+  }
+
+  std::string                          m_FileName;
+  std::string                          m_DataFileName;
+  bool                                 m_Detached;
+  unsigned int                         m_NumberOfComponents;
+  unsigned long                        m_Size[3];
+  double                               m_Spacing[3];
+  double                               m_Origin[3];
+  double                               m_Direction[9];
+  std::map< std::string, std::string > m_KeyValues;
+  bool                                 m_HalfPrecision;
+  int                                  m_CompressionLevel;
+  unsigned long                        m_NumberOfWrittenSlices;
+  std::ofstream                        m_DataFile;
+  gzFile                               m_CompressedDataFile;
+  std::vector< unsigned short >        m_HalfBuffer;
+};
+
+} // end of namespace BoneTexture
+
+#endif
@@ -0,0 +1,390 @@
+/*=========================================================================
+ *
+ *  Copyright Insight Software Consortium
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *         http://www.apache.org/licenses/LICENSE-2.0.txt
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ *
+ *=========================================================================*/
+
+#ifndef StridedFeatureMaps_h
+#define StridedFeatureMaps_h
+
+// Feature maps evaluated on a coarser grid, every 'stride' voxels along each axis, for
+// exploratory runs: neighborhoods of adjacent voxels overlap so much that their features
+// are close. The coarse map can be interpolated back to the grid of the input.
+
+#include "itkImage.h"
+#include "itkRegionOfInterestImageFilter.h"
+
+#include <algorithm>
+#include <cmath>
+#include <vector>
+
+namespace BoneTexture
+{
+
+// Index, in the input, of the first voxel of the sampling grid along each axis. The grid is
+// anchored to the whole image, whose first voxel is at gridOrigin: its samples are the voxels
+// whose index in the whole image is a multiple of the stride, so that the crops and the slabs
+// of an image are sampled on the same grid. An axis of the input shorter than the stride
+// holding no such voxel is sampled from its first voxel.
+template< typename TImage >
+void
+ComputeStridedGridStart( const TImage * input,
+                         const typename TImage::PointType & gridOrigin,
+                         unsigned int stride,
+                         unsigned long start[3] )
+{
+  itk::ContinuousIndex< double, 3 > originIndex;
+  input->TransformPhysicalPointToContinuousIndex( gridOrigin, originIndex );
+  const typename TImage::RegionType region = input->GetLargestPossibleRegion();
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    // Index in the whole image of the first voxel of the input
+    const long first = region.GetIndex()[d] - static_cast< long >( std::floor( originIndex[d] + 0.5 ) );
+    const long remainder = first % static_cast< long >( stride );
+    start[d] = remainder > 0 ? stride - remainder : static_cast< unsigned long >( -remainder );
+    if( start[d] >= region.GetSize()[d] )
+      {
+      start[d] = 0;
+      }
+    }
+}
+
+// Trilinear interpolation of a coarse vector map, whose voxel i is the voxel start + i * stride
+// of the fine map. Both buffers are in the memory layout of an itk::VectorImage (components,
+// then i, j, k). Voxels before the first or past the last coarse voxel take the value of the
+// nearest one. When a fine mask is given (in the layout of the fine map), only the samples
+// inside the mask are interpolated, their weights being normalized, and the voxels outside
+// of the mask are set to zero, as in the maps computed at every voxel. The rare voxels of the
+// mask whose 8 surrounding samples are all outside of it take the value of the nearest sample
+// inside the mask (zero when no sample is inside the mask).
+inline void
+UpsampleStridedBuffer( const float * coarse,
+                       const unsigned long coarseSize[3],
+                       unsigned int numberOfComponents,
+                       unsigned int stride,
+                       const unsigned long start[3],
+                       const unsigned char * fineMask,
+                       float * fine,
+                       const unsigned long fineSize[3] )
+{
+  // Coarse neighbors and weight of the upper one, for each fine index along each axis
+  std::vector< unsigned long > lower[3];
+  std::vector< unsigned long > upper[3];
+  std::vector< float > weight[3];
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    lower[d].resize( fineSize[d] );
+    upper[d].resize( fineSize[d] );
+    weight[d].resize( fineSize[d] );
+    for( unsigned long i = 0; i < fineSize[d]; ++i )
+      {
+      const unsigned long q = i < start[d] ? 0 : ( i - start[d] ) / stride;
+      const unsigned long l = std::min( q, coarseSize[d] - 1 );
+      lower[d][i] = l;
+      upper[d][i] = std::min( l + 1, coarseSize[d] - 1 );
+      weight[d][i] = i >= start[d] && l == q ? static_cast< float >( ( i - start[d] ) % stride ) / stride : 0.0f;
+      }
+    }
+
+  // Whether each coarse voxel is inside the mask
+  std::vector< unsigned char > coarseInside;
+  bool anyInside = false;
+  if( fineMask )
+    {
+    coarseInside.resize( coarseSize[0] * coarseSize[1] * coarseSize[2] );
+    for( unsigned long k = 0, c = 0; k < coarseSize[2]; ++k )
+      {
+      for( unsigned long j = 0; j < coarseSize[1]; ++j )
+        {
+        const unsigned long fineRow = ( ( start[2] + k * stride ) * fineSize[1] + start[1] + j * stride ) * fineSize[0];
+        for( unsigned long i = 0; i < coarseSize[0]; ++i, ++c )
+          {
+          coarseInside[c] = fineMask[fineRow + start[0] + i * stride] != 0;
+          anyInside = anyInside || coarseInside[c];
+          }
+        }
+      }
+    }
+
+  const unsigned long coarseRow = coarseSize[0] * numberOfComponents;
+  const unsigned long coarseSlice = coarseSize[1] * coarseRow;
+  float * out = fine;
+  const unsigned char * inside = fineMask;
+  for( unsigned long k = 0; k < fineSize[2]; ++k )
+    {
+    const float wk = weight[2][k];
+    for( unsigned long j = 0; j < fineSize[1]; ++j )
+      {
+      const float wj = weight[1][j];
+      const float * c00 = coarse + lower[2][k] * coarseSlice + lower[1][j] * coarseRow;
+      const float * c01 = coarse + lower[2][k] * coarseSlice + upper[1][j] * coarseRow;
+      const float * c10 = coarse + upper[2][k] * coarseSlice + lower[1][j] * coarseRow;
+      const float * c11 = coarse + upper[2][k] * coarseSlice + upper[1][j] * coarseRow;
+      for( unsigned long i = 0; i < fineSize[0]; ++i, out += numberOfComponents )
+        {
+        const float wi = weight[0][i];
+        const unsigned long i0 = lower[0][i] * numberOfComponents;
+        const unsigned long i1 = upper[0][i] * numberOfComponents;
+        if( !fineMask )
+          {
+          for( unsigned int c = 0; c < numberOfComponents; ++c )
+            {
+            const float v00 = c00[i0 + c] + wi * ( c00[i1 + c] - c00[i0 + c] );
+            const float v01 = c01[i0 + c] + wi * ( c01[i1 + c] - c01[i0 + c] );
+            const float v10 = c10[i0 + c] + wi * ( c10[i1 + c] - c10[i0 + c] );
+            const float v11 = c11[i0 + c] + wi * ( c11[i1 + c] - c11[i0 + c] );
+            const float v0 = v00 + wj * ( v01 - v00 );
+            const float v1 = v10 + wj * ( v11 - v10 );
+            out[c] = v0 + wk * ( v1 - v0 );
+            }
+          continue;
+          }
+
+        std::fill( out, out + numberOfComponents, 0.0f );
+        if( !*inside++ )
+          {
+          continue;
+          }
+        // Weighted mean of the samples around the voxel that are inside the mask
+        const unsigned long corners[8][3] = {
+          { lower[0][i], lower[1][j], lower[2][k] }, { upper[0][i], lower[1][j], lower[2][k] },
+          { lower[0][i], upper[1][j], lower[2][k] }, { upper[0][i], upper[1][j], lower[2][k] },
+          { lower[0][i], lower[1][j], upper[2][k] }, { upper[0][i], lower[1][j], upper[2][k] },
+          { lower[0][i], upper[1][j], upper[2][k] }, { upper[0][i], upper[1][j], upper[2][k] } };
+        float totalWeight = 0.0f;
+        for( unsigned int corner = 0; corner < 8; ++corner )
+          {
+          const unsigned long * index = corners[corner];
+          const unsigned long sample = ( index[2] * coarseSize[1] + index[1] ) * coarseSize[0] + index[0];
+          if( !coarseInside[sample] )
+            {
+            continue;
+            }
+          const float w = ( corner & 1 ? wi : 1.0f - wi ) * ( corner & 2 ? wj : 1.0f - wj ) * ( corner & 4 ? wk : 1.0f - wk );
+          const float * value = coarse + sample * numberOfComponents;
+          for( unsigned int c = 0; c < numberOfComponents; ++c )
+            {
+            out[c] += w * value[c];
+            }
+          totalWeight += w;
+          }
+        if( totalWeight > 0.0f )
+          {
+          for( unsigned int c = 0; c < numberOfComponents; ++c )
+            {
+            out[c] /= totalWeight;
+            }
+          continue;
+          }
+        if( !anyInside )
+          {
+          continue;
+          }
+
+        // Nearest sample inside the mask, searched in growing cubes around the voxel
+        const unsigned long position[3] = { i, j, k };
+        unsigned long nearest = 0;
+        double nearestDistance = -1.0;
+        const unsigned long maximumRadius = std::max( coarseSize[0], std::max( coarseSize[1], coarseSize[2] ) );
+        for( unsigned long radius = 0; radius <= maximumRadius && nearestDistance < 0.0; ++radius )
+          {
+          unsigned long first[3];
+          unsigned long last[3];
+          for( unsigned int d = 0; d < 3; ++d )
+            {
+            const unsigned long center = corners[0][d];
+            first[d] = center > radius ? center - radius : 0;
+            last[d] = std::min( center + radius + 1, coarseSize[d] - 1 );
+            }
+          for( unsigned long z = first[2]; z <= last[2]; ++z )
+            {
+            for( unsigned long y = first[1]; y <= last[1]; ++y )
+              {
+              for( unsigned long x = first[0]; x <= last[0]; ++x )
+                {
+                const unsigned long sample = ( z * coarseSize[1] + y ) * coarseSize[0] + x;
+                if( !coarseInside[sample] )
+                  {
+                  continue;
+                  }
+                const unsigned long samplePosition[3] = { start[0] + x * stride, start[1] + y * stride, start[2] + z * stride };
+                double distance = 0.0;
+                for( unsigned int d = 0; d < 3; ++d )
+                  {
+                  const double difference = static_cast< double >( samplePosition[d] ) - static_cast< double >( position[d] );
+                  distance += difference * difference;
+                  }
+                if( nearestDistance < 0.0 || distance < nearestDistance )
+                  {
+                  nearest = sample;
+                  nearestDistance = distance;
+                  }
+                }
+              }
+            }
+          }
+        if( nearestDistance >= 0.0 )
+          {
+          std::copy( coarse + nearest * numberOfComponents, coarse + ( nearest + 1 ) * numberOfComponents, out );
+          }
+        }
+      }
+    }
+}
+
+// Computes the feature map of the input on a grid of samples every 'stride' voxels along
+// each axis, anchored to the whole image whose first voxel is at gridOrigin (see
+// ComputeStridedGridStart). The map has the direction of the input, a spacing 'stride'
+// times larger, and its origin at the first sample.
+// computeFeatureMap( input, mask, region ) returns the feature map (an itk::VectorImage)
+// of the given region of an image and of its mask. The rows of the coarse grid are
+// computed one at a time, from the rows around them up to 'padding' voxels away, so the
+// computation is 'stride' squared times faster (the voxels of a row are all computed).
+template< typename TInputImage, typename TOutputImage, typename TMaskImage, typename TFeatureMapFunctor >
+typename TOutputImage::Pointer
+ComputeStridedFeatureMap( const TInputImage * input,
+                          const TMaskImage * mask,
+                          unsigned int stride,
+                          unsigned int padding,
+                          const typename TInputImage::PointType & gridOrigin,
+                          TFeatureMapFunctor computeFeatureMap )
+{
+  typedef typename TInputImage::RegionType RegionType;
+  typedef itk::RegionOfInterestImageFilter< TInputImage, TInputImage > ExtractFilterType;
+  typedef itk::RegionOfInterestImageFilter< TMaskImage, TMaskImage >   ExtractMaskFilterType;
+
+  const RegionType largestRegion = input->GetLargestPossibleRegion();
+  unsigned long start[3];
+  ComputeStridedGridStart< TInputImage >( input, gridOrigin, stride, start );
+  typename TOutputImage::SizeType coarseSize;
+  typename TOutputImage::SpacingType coarseSpacing;
+  typename TInputImage::IndexType firstSample;
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    coarseSize[d] = ( largestRegion.GetSize()[d] - start[d] + stride - 1 ) / stride;
+    coarseSpacing[d] = input->GetSpacing()[d] * stride;
+    firstSample[d] = largestRegion.GetIndex()[d] + start[d];
+    }
+  typename TOutputImage::PointType coarseOrigin;
+  input->TransformIndexToPhysicalPoint( firstSample, coarseOrigin );
+
+  typename TOutputImage::Pointer coarseMap = TOutputImage::New();
+  coarseMap->SetRegions( coarseSize );
+  coarseMap->SetOrigin( coarseOrigin );
+  coarseMap->SetSpacing( coarseSpacing );
+  coarseMap->SetDirection( input->GetDirection() );
+
+  typename RegionType::SizeType radius;
+  radius[0] = 0;
+  radius[1] = padding;
+  radius[2] = padding;
+
+  unsigned int numberOfComponents = 0;
+  for( itk::SizeValueType k = 0; k < coarseSize[2]; ++k )
+    {
+    for( itk::SizeValueType j = 0; j < coarseSize[1]; ++j )
+      {
+      RegionType row = largestRegion;
+      row.SetIndex( 1, firstSample[1] + j * stride );
+      row.SetIndex( 2, firstSample[2] + k * stride );
+      row.SetSize( 1, 1 );
+      row.SetSize( 2, 1 );
+      RegionType neighbors = row;
+      neighbors.PadByRadius( radius );
+      neighbors.Crop( largestRegion );
+
+      typename ExtractFilterType::Pointer extract = ExtractFilterType::New();
+      extract->SetInput( input );
+      extract->SetRegionOfInterest( neighbors );
+      extract->Update();
+      typename TInputImage::Pointer rowInput = extract->GetOutput();
+      rowInput->DisconnectPipeline();
+
+      typename TMaskImage::Pointer rowMask;
+      if( mask )
+        {
+        typename ExtractMaskFilterType::Pointer extractMask = ExtractMaskFilterType::New();
+        extractMask->SetInput( mask );
+        extractMask->SetRegionOfInterest( neighbors );
+        extractMask->Update();
+        rowMask = extractMask->GetOutput();
+        rowMask->DisconnectPipeline();
+        }
+
+      // The extracted images start at index 0
+      RegionType rowRegion = row;
+      for( unsigned int d = 0; d < 3; ++d )
+        {
+        rowRegion.SetIndex( d, row.GetIndex()[d] - neighbors.GetIndex()[d] );
+        }
+      typename TOutputImage::Pointer rowFeatureMap = computeFeatureMap( rowInput.GetPointer(), rowMask.GetPointer(), rowRegion );
+
+      if( numberOfComponents == 0 )
+        {
+        numberOfComponents = rowFeatureMap->GetNumberOfComponentsPerPixel();
+        coarseMap->SetNumberOfComponentsPerPixel( numberOfComponents );
+        coarseMap->Allocate();
+        }
+
+      // Every 'stride' voxels of the row, from the first sample
+      const float * in = rowFeatureMap->GetBufferPointer()
+                       + ( rowFeatureMap->ComputeOffset( rowRegion.GetIndex() ) + start[0] ) * numberOfComponents;
+      float * out = coarseMap->GetBufferPointer() + ( k * coarseSize[1] + j ) * coarseSize[0] * numberOfComponents;
+      for( itk::SizeValueType i = 0; i < coarseSize[0]; ++i )
+        {
+        std::copy( in + i * stride * numberOfComponents, in + ( i * stride + 1 ) * numberOfComponents, out );
+        out += numberOfComponents;
+        }
+      }
+    }
+  return coarseMap;
+}
+
+// Interpolates a map computed by ComputeStridedFeatureMap, with the same stride and grid
+// origin, at every voxel of the input. The voxels outside of the mask, if any, are zero,
+// and those inside of it are only interpolated from the samples inside of it.
+template< typename TInputImage, typename TOutputImage, typename TMaskImage >
+typename TOutputImage::Pointer
+InterpolateStridedFeatureMap( const TOutputImage * coarseMap,
+                              const TInputImage * input,
+                              const TMaskImage * mask,
+                              unsigned int stride,
+                              const typename TInputImage::PointType & gridOrigin )
+{
+  typename TOutputImage::Pointer featureMap = TOutputImage::New();
+  featureMap->CopyInformation( input );
+  featureMap->SetRegions( input->GetLargestPossibleRegion() );
+  featureMap->SetNumberOfComponentsPerPixel( coarseMap->GetNumberOfComponentsPerPixel() );
+  featureMap->Allocate();
+
+  unsigned long start[3];
+  ComputeStridedGridStart< TInputImage >( input, gridOrigin, stride, start );
+  unsigned long coarseSize[3];
+  unsigned long fineSize[3];
+  for( unsigned int d = 0; d < 3; ++d )
+    {
+    coarseSize[d] = coarseMap->GetLargestPossibleRegion().GetSize()[d];
+    fineSize[d] = input->GetLargestPossibleRegion().GetSize()[d];
+    }
+  // The mask has the extent of the input (a compact mask of unsigned char)
+  const unsigned char * fineMask = mask ? mask->GetBufferPointer() : nullptr;
+  UpsampleStridedBuffer( coarseMap->GetBufferPointer(), coarseSize, coarseMap->GetNumberOfComponentsPerPixel(),
+                         stride, start, fineMask, featureMap->GetBufferPointer(), fineSize );
+  return featureMap;
+}
+
+} // end of namespace BoneTexture
+
+#endif